@@ -3,6 +3,9 @@ ASGI config for Pereval project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Под ASGI (uvicorn Pereval.asgi:application) работают асинхронные представления /api/async/...,
+в том числе поток событий о смене статусов перевалов /api/async/events/ (project.events)
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
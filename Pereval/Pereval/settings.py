@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'drf_yasg',
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'project.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +92,20 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'pereval'),
+    }
+}
+
+# Кэш представлений перевалов для GET /submitData/<id>/
+PEREVAL_CACHE_ALIAS = 'default'
+PEREVAL_CACHE_TIMEOUT = int(os.getenv('PEREVAL_CACHE_TIMEOUT', 300))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -126,17 +142,79 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Хранилище изображений перевалов (контентно-адресуемое, по SHA-256)
+
+IMAGE_STORAGE = {
+    'BACKEND': 'project.storage.FileSystemBlobStorage',
+    'OPTIONS': {
+        'location': os.getenv('IMAGE_STORAGE_ROOT', str(BASE_DIR / 'media' / 'images')),
+    },
+}
+
+# Максимальный размер одного файла при загрузке (multipart/form-data и сессии загрузки), байт
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+# Через сколько секунд без записи удаляется незавершенная сессия возобновляемой загрузки
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 3600))
+
+# Уменьшенные копии изображений: вариант -> наибольшая сторона, px
+IMAGE_VARIANTS = {
+    'thumbnail': 256,
+    'medium': 1024,
+}
+# process - в пуле процессов после коммита, inline - сразу в том же потоке, off - не строить
+IMAGE_VARIANTS_MODE = os.getenv('IMAGE_VARIANTS_MODE', 'process')
+IMAGE_VARIANTS_WORKERS = int(os.getenv('IMAGE_VARIANTS_WORKERS', 2))
+
+# Документы перевалов (готовые ответы API): thread - пересборка после коммита в фоновом потоке,
+# inline - сразу в том же потоке. Устаревший документ в любом случае пересобирается при чтении
+PASS_DOCUMENTS_MODE = os.getenv('PASS_DOCUMENTS_MODE', 'thread')
+
+# Сколько бит из 64 может отличаться у перцептивных хэшей, чтобы при редактировании перевала
+# присланное изображение считалось повторно сжатой копией уже сохраненного
+IMAGE_PHASH_DISTANCE = int(os.getenv('IMAGE_PHASH_DISTANCE', 4))
+
+# Поиск перевалов: доля триграмм запроса, которые должны найтись в названии, чтобы оно считалось
+# написанием с опечатками
+SEARCH_SIMILARITY_THRESHOLD = float(os.getenv('SEARCH_SIMILARITY_THRESHOLD', 0.5))
+
+# Через сколько секунд перевал, взятый модератором и оставшийся без решения, снова можно взять из очереди
+MODERATION_CLAIM_TIMEOUT = int(os.getenv('MODERATION_CLAIM_TIMEOUT', 30 * 60))
+
+# Поток событий о смене статусов перевалов (GET /api/async/events/, только под ASGI):
+# postgres - через LISTEN/NOTIFY, события получают все процессы; local - pub/sub внутри одного процесса.
+# Выбор бэкенда - настройка, а не автоматическое переключение: при postgres, пока соединение LISTEN
+# процесса оборвано, события из этого процесса раздаются его подписчикам напрямую, а после переподключения
+# все подписчики получают снимок статусов
+PASS_EVENTS_BACKEND = os.getenv('PASS_EVENTS_BACKEND', 'postgres')
+# Интервал пинга в потоке событий, с, и задержка переподключения клиента (поле retry), мс
+PASS_EVENTS_HEARTBEAT = int(os.getenv('PASS_EVENTS_HEARTBEAT', 15))
+PASS_EVENTS_RETRY_MS = int(os.getenv('PASS_EVENTS_RETRY_MS', 5000))
+
+# Сколько секунд хранятся записи об удаленных перевалах для ленты изменений; курсор старше - полная синхронизация
+CHANGES_TOMBSTONE_TTL = int(os.getenv('CHANGES_TOMBSTONE_TTL', 30 * 24 * 3600))
+
+# Перевалов в одной пачке выгрузки каталога (GET /submitData/export/, команда export_perevals)
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+
+# Сколько секунд хранится ответ на запрос с заголовком Idempotency-Key (повтор с тем же ключом его получает)
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+
+# Бюджет запроса к API: превысившие его запросы записываются в журнал вместе с SQL
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', 20))
+REQUEST_TIME_BUDGET_MS = int(os.getenv('REQUEST_TIME_BUDGET_MS', 500))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
+    # orjson, если установлен; без него - стандартные JSONRenderer и JSONParser
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'project.renderers.ORJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'project.parsers.ORJSONParser',
     ],
 }
 
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import User, Coords, Level, MountainPass, Image
+from .models import User, Coords, Level, MountainPass, Image, ImageVariant
+from .events import publish_status_changes
+from .moderation import QUEUE_STATUSES, transition_passes
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -16,16 +18,61 @@ class LevelAdmin(admin.ModelAdmin):
 
 class ImageInline(admin.TabularInline):
     model = Image
-    extra = 1
+    extra = 0
+    fields = ('title', 'sha256', 'size', 'mime_type', 'width', 'height')
+    readonly_fields = ('sha256', 'size', 'mime_type', 'width', 'height')
 
 @admin.register(MountainPass)
 class MountainPassAdmin(admin.ModelAdmin):
-    list_display = ('title', 'user', 'status', 'add_time')
+    list_display = ('title', 'user', 'status', 'moderator', 'add_time')
     list_filter = ('status', 'add_time')
     search_fields = ('title', 'user__email')
+    list_select_related = ('user', 'moderator')
+    readonly_fields = ('moderator', 'claimed_at')
     inlines = [ImageInline]
+    actions = ['accept_passes', 'reject_passes']
+
+    @admin.action(description='Принять выбранные перевалы')
+    def accept_passes(self, request, queryset):
+        self.transition(request, queryset, 'accepted')
+
+    @admin.action(description='Отклонить выбранные перевалы')
+    def reject_passes(self, request, queryset):
+        self.transition(request, queryset, 'rejected')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'status' in form.changed_data:
+            publish_status_changes([(obj.pk, obj.user_id)], obj.status)
+
+    def transition(self, request, queryset, target):
+        # По UPDATE на статус: перевалы, которые уже обработаны, не меняются
+        pks = list(queryset.values_list('pk', flat=True))
+        updated = sum(len(transition_passes(pks, source, target, request.user)) for source in QUEUE_STATUSES)
+        self.message_user(request, f"Статус изменен у перевалов: {updated} из {len(pks)}")
+
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE по title и email: поиск по индексам названий или точное совпадение email
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if '@' in search_term:
+            return queryset.filter(user__email=search_term), False
+        return queryset.search(search_term), False
+
+class ImageVariantInline(admin.TabularInline):
+    model = ImageVariant
+    extra = 0
+    fields = ('kind', 'sha256', 'size', 'mime_type', 'width', 'height')
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 @admin.register(Image)
 class ImageAdmin(admin.ModelAdmin):
-    list_display = ('title', 'mountain_pass')
-    search_fields = ('title', 'mountain_pass__title')
\ No newline at end of file
+    list_display = ('title', 'mountain_pass', 'mime_type', 'size')
+    search_fields = ('title', 'mountain_pass__title')
+    readonly_fields = ('sha256', 'size', 'mime_type', 'width', 'height')
+    inlines = [ImageVariantInline]
\ No newline at end of file
@@ -0,0 +1,210 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from . import idempotency
+from .cache import aget_pass_payload, astore_pass_payload
+from .events import event_stream
+from .documents import render_passes
+from .metrics import measure_serialization
+from .models import MountainPass, User
+from .parsers import loads
+from .renderers import dumps
+from .uploads import BlobStorageUploadHandler
+from .views import get_list_representation, get_multipart_data, submit_mountain_pass, update_mountain_pass
+
+
+def json_response(data, status=200, **kwargs):
+    """JSON-ответ в том же виде, что и у DRF (ORJSONRenderer)"""
+    return HttpResponse(dumps(data), status=status, content_type='application/json', **kwargs)
+
+
+def parse_json_body(request):
+    """Тело запроса как JSON-объект; ValueError, если это не так"""
+    data = loads(request.body or b'null')
+    if not isinstance(data, dict):
+        raise ValueError("Ожидается JSON-объект")
+    return data
+
+
+def submit_json(request):
+    """Добавление перевала из JSON-тела запроса: (код ответа, тело ответа)"""
+    try:
+        data = parse_json_body(request)
+    except ValueError:
+        return 400, {"status": 400, "message": "Некорректный JSON в теле запроса", "id": None}
+    return submit_mountain_pass(data)
+
+
+async def render(mountain_passes, kind, request=None):
+    """
+    Ответ из документов перевалов вне цикла событий: полное представление читает изображения из хранилища,
+    устаревшие документы пересобираются запросами к БД
+    """
+    return await sync_to_async(measure_serialization)(render_passes, mountain_passes, kind, request)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSubmitDataView(View):
+    """
+    POST /async/submitData/ - Добавление нового перевала (асинхронный вариант POST /submitData/)
+    Создание выполняется одной транзакцией в потоке, цикл событий в это время обслуживает другие запросы
+    """
+
+    async def post(self, request):
+        try:
+            key = idempotency.get_key(request)
+        except ValueError as e:
+            return json_response({"status": 400, "message": str(e), "id": None}, status=400)
+
+        try:
+            if request.content_type == 'multipart/form-data':
+                # Разбор multipart пишет файлы в хранилище - выполняем его вне цикла событий
+                upload_handler = BlobStorageUploadHandler(request)
+                request.upload_handlers = [upload_handler]
+                metadata = await sync_to_async(lambda: request.POST.get('metadata', ''))()
+                if upload_handler.error:
+                    return json_response({"status": 413, "message": upload_handler.error, "id": None}, status=413)
+                data, error = await sync_to_async(get_multipart_data)(metadata, request.FILES)
+                if error:
+                    return json_response({"status": 400, "message": error, "id": None}, status=400)
+                fingerprint = idempotency.multipart_fingerprint(metadata, request.FILES) if key else None
+                submit = partial(submit_mountain_pass, data)
+            else:
+                fingerprint = idempotency.body_fingerprint(request.body) if key else None
+                submit = partial(submit_json, request)
+
+            status_code, payload, replayed = await sync_to_async(idempotency.run_once)(
+                'submit-data', key, fingerprint, submit
+            )
+            headers = {idempotency.REPLAYED_HEADER: 'true'} if replayed else None
+            return json_response(payload, status=status_code, headers=headers)
+
+        except idempotency.KeyReusedError as e:
+            return json_response({"status": 422, "message": str(e), "id": None}, status=422)
+        except Exception as e:
+            return json_response({
+                "status": 500,
+                "message": f"Внутренняя ошибка сервера: {str(e)}",
+                "id": None
+            }, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSubmitDataDetailView(View):
+    """
+    GET /async/submitData/<id>/ - Получение перевала по ID
+    PATCH /async/submitData/<id>/ - Редактирование перевала
+    """
+
+    async def get(self, request, pk):
+        payload = await aget_pass_payload(pk)
+        if payload is None:
+            mountain_pass = await MountainPass.objects.with_document('full').filter(pk=pk).afirst()
+            data = await render([mountain_pass], 'full') if mountain_pass else []
+            if not data:
+                return json_response({"status": 0, "message": f"Перевал с id {pk} не найден"}, status=404)
+            payload = await astore_pass_payload(pk, data[0], mountain_pass.updated_at)
+
+        headers = {
+            'ETag': payload['etag'],
+            'Last-Modified': http_date(payload['last_modified']),
+        }
+        response = get_conditional_response(
+            request, etag=payload['etag'], last_modified=payload['last_modified']
+        )
+        if response is None:
+            response = json_response(payload['data'])
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    async def patch(self, request, pk):
+        try:
+            mountain_pass = await MountainPass.objects.select_related('coords', 'level').aget(pk=pk)
+        except MountainPass.DoesNotExist:
+            return json_response({"state": 0, "message": f"Перевал с id {pk} не найден"}, status=404)
+
+        try:
+            data = parse_json_body(request)
+        except ValueError:
+            return json_response({"state": 0, "message": "Некорректный JSON в теле запроса"}, status=400)
+
+        try:
+            error = await sync_to_async(update_mountain_pass)(mountain_pass, data)
+        except Exception as e:
+            return json_response({"state": 0, "message": f"Ошибка при обновлении: {str(e)}"}, status=500)
+        if error:
+            return json_response({"state": 0, "message": error}, status=400)
+
+        return json_response({"state": 1, "message": "Запись успешно обновлена"})
+
+
+class AsyncSubmitDataListView(View):
+    """
+    GET /async/submitData/list/?user__email=<email> - Список перевалов по email пользователя
+    view=summary - краткое представление без содержимого изображений
+    """
+
+    async def get(self, request):
+        email = request.GET.get('user__email')
+        if not email:
+            return json_response({"status": 0, "message": "Не указан параметр user__email"}, status=400)
+
+        try:
+            queryset, kind = get_list_representation(request.GET)
+        except ValueError as e:
+            return json_response({"status": 0, "message": str(e)}, status=400)
+
+        try:
+            mountain_passes = [mountain_pass async for mountain_pass in queryset.filter(user__email=email)]
+
+            if not mountain_passes and not await User.objects.filter(email=email).aexists():
+                return json_response({
+                    "status": 0,
+                    "message": f"Пользователь с email {email} не найден"
+                }, status=404)
+
+            data = await render(mountain_passes, kind, request)
+            return json_response(data)
+
+        except Exception as e:
+            return json_response({
+                "status": 0,
+                "message": f"Ошибка при получении данных: {str(e)}"
+            }, status=500)
+
+
+class AsyncPassEventsView(View):
+    """
+    GET /async/events/?user__email=<email> - Поток событий (text/event-stream) о смене статусов перевалов
+    пользователя вместо периодических запросов GET /submitData/<id>/: сначала snapshot со статусами
+    всех перевалов, затем status при каждой смене. Соединение держится открытым - только под ASGI
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return json_response({
+                "status": 0,
+                "message": "Поток событий доступен только под ASGI (Pereval.asgi:application)"
+            }, status=501)
+
+        email = request.GET.get('user__email')
+        if not email:
+            return json_response({"status": 0, "message": "Не указан параметр user__email"}, status=400)
+        user_id = await User.objects.filter(email=email).values_list('pk', flat=True).afirst()
+        if user_id is None:
+            return json_response({"status": 0, "message": f"Пользователь с email {email} не найден"}, status=404)
+
+        response = StreamingHttpResponse(event_stream(user_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # nginx не должен буферизовать поток
+        response['X-Accel-Buffering'] = 'no'
+        return response
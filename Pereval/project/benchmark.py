@@ -0,0 +1,170 @@
+import random
+import statistics
+import struct
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+from django.db import connection, transaction
+
+from .models import Coords, Image, Level, MountainPass, User
+from .storage import StoredBlob, get_image_storage
+
+# Горные районы для координат тестовых перевалов: (мин. широта, макс. широта, мин. долгота, макс. долгота)
+REGIONS = [
+    (42.0, 44.0, 74.0, 80.0),   # Тянь-Шань
+    (42.0, 44.0, 40.0, 46.0),   # Кавказ
+    (49.0, 51.0, 85.0, 89.0),   # Алтай
+    (37.0, 39.5, 71.0, 75.0),   # Памир
+]
+STATUSES = ['new'] * 4 + ['pending'] * 2 + ['accepted'] * 3 + ['rejected']
+LEVELS = ['', '1A', '1B', '2A', '2B', '3A', '3B']
+NAMES = ['Ак', 'Кара', 'Кок', 'Сары', 'Тал', 'Гар', 'Таш', 'Бел', 'Су', 'Тор', 'Ала', 'Кель', 'Жол', 'Мус']
+IMAGE_TITLES = ['Вид на перевал', 'Седловина', 'Подъем', 'Спуск', 'Тур на перевале', 'Ледник', 'Осыпь']
+
+
+def make_png(size: int, rng: random.Random) -> bytes:
+    """
+    PNG из случайного шума размером около size байт (шум не сжимается)
+    Нужен без Pillow: отдельные изображения для тестовых данных и запросов
+    """
+    width = max(1, int((size / 3) ** 0.5))
+    height = max(1, size // (3 * width + 1))
+    raw = b''.join(b'\x00' + rng.randbytes(3 * width) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(raw, 0))
+        + chunk(b'IEND', b'')
+    )
+
+
+def random_title(rng: random.Random) -> str:
+    return rng.choice(NAMES) + rng.choice(NAMES).lower() + rng.choice(['', '-Ашу', '-Бель', ' Северный', ' Южный'])
+
+
+def random_coords(rng: random.Random) -> Dict[str, float]:
+    min_lat, max_lat, min_lon, max_lon = rng.choice(REGIONS)
+    return {
+        'latitude': round(rng.uniform(min_lat, max_lat), 6),
+        'longitude': round(rng.uniform(min_lon, max_lon), 6),
+        'height': rng.randint(2500, 6000),
+    }
+
+
+def random_level(rng: random.Random) -> Dict[str, str]:
+    return {season: rng.choice(LEVELS) for season in ('winter', 'summer', 'autumn', 'spring')}
+
+
+def seed_perevals(count: int, images_per_pass: int = 3, users: int = 1000, distinct_images: int = 32,
+                  image_size: int = 100 * 1024, batch_size: int = 5000, seed: int = 1, days: int = 730,
+                  progress: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+    """
+    Быстрое заполнение базы тестовыми перевалами: bulk_create пачками по batch_size, по транзакции на пачку
+    Изображения берутся из набора distinct_images файлов (хранилище хранит одинаковое содержимое один раз),
+    время добавления равномерно распределяется за последние days дней
+    Сигналы post_save не вызываются: кэш и варианты изображений для тестовых данных не нужны
+    """
+    rng = random.Random(seed)
+    storage = get_image_storage()
+    blobs: List[StoredBlob] = [
+        storage.save(make_png(rng.randint(image_size // 2, image_size * 3 // 2), rng))
+        for _ in range(distinct_images if images_per_pass else 0)
+    ]
+
+    emails = [f'bench-{seed}-{number}@example.com' for number in range(users)]
+    User.objects.bulk_create([
+        User(email=email, fam=rng.choice(NAMES) + 'ов', name=rng.choice(NAMES), phone=f'+7999{number:07d}')
+        for number, email in enumerate(emails)
+    ], batch_size=batch_size, ignore_conflicts=True)
+    user_ids = list(User.objects.filter(email__in=emails).values_list('pk', flat=True))
+
+    created = {'passes': 0, 'images': 0, 'users': len(user_ids)}
+    first_id = None
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        with transaction.atomic():
+            coords = [Coords(**random_coords(rng)) for _ in range(size)]
+            for item in coords:
+                item.refresh_geohash()
+            Coords.objects.bulk_create(coords)
+            levels = Level.objects.bulk_create([Level(**random_level(rng)) for _ in range(size)])
+            passes = MountainPass.objects.bulk_create([
+                MountainPass(
+                    beauty_title='пер. ',
+                    title=random_title(rng),
+                    connect=f'{random_title(rng)} - {random_title(rng)}',
+                    user_id=rng.choice(user_ids),
+                    coords=coords[number],
+                    level=levels[number],
+                    status=rng.choice(STATUSES),
+                )
+                for number in range(size)
+            ])
+            Image.objects.bulk_create([
+                Image(mountain_pass=mountain_pass, title=rng.choice(IMAGE_TITLES), **rng.choice(blobs).as_fields())
+                for mountain_pass in passes
+                for _ in range(images_per_pass)
+            ], batch_size=batch_size)
+
+        first_id = passes[0].pk if first_id is None else first_id
+        created['passes'] += size
+        created['images'] += size * images_per_pass
+        if progress:
+            progress(created['passes'])
+
+    if first_id is not None:
+        # auto_now_add не дает задать время в bulk_create - сдвигаем его одним запросом
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {MountainPass._meta.db_table} '
+                "SET add_time = add_time - random() * %s * interval '1 day' WHERE id >= %s",
+                [days, first_id]
+            )
+            cursor.execute(
+                f'UPDATE {MountainPass._meta.db_table} SET updated_at = add_time WHERE id >= %s', [first_id]
+            )
+    return created
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Перцентили задержки, мс"""
+    if len(latencies) < 2:
+        value = round(latencies[0], 2) if latencies else 0.0
+        return {'p50': value, 'p95': value, 'p99': value, 'max': value, 'mean': value}
+    points = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'p50': round(points[49], 2),
+        'p95': round(points[94], 2),
+        'p99': round(points[98], 2),
+        'max': round(max(latencies), 2),
+        'mean': round(statistics.fmean(latencies), 2),
+    }
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Регрессии текущего отчета относительно базового: рост p95/p99 или падение пропускной способности
+    больше чем на threshold (доля), любой рост числа запросов к БД на запрос, появление ошибок
+    """
+    regressions = []
+    for name, before in baseline['scenarios'].items():
+        after = current['scenarios'].get(name)
+        if after is None:
+            continue
+        for percentile in ('p95', 'p99'):
+            old, new = before['latency_ms'][percentile], after['latency_ms'][percentile]
+            if old and new > old * (1 + threshold):
+                regressions.append(f"{name}: {percentile} {old} -> {new} мс (+{(new / old - 1) * 100:.0f}%)")
+        old, new = before['throughput_rps'], after['throughput_rps']
+        if old and new < old * (1 - threshold):
+            regressions.append(f"{name}: пропускная способность {old} -> {new} запр/с ({(new / old - 1) * 100:.0f}%)")
+        old, new = before['queries_per_request'], after['queries_per_request']
+        if old is not None and new is not None and new > old + 0.5:
+            regressions.append(f"{name}: SQL-запросов на запрос {old} -> {new}")
+        if after['errors'] and not before['errors']:
+            regressions.append(f"{name}: ошибок {after['errors']}")
+    return regressions
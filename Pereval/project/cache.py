@@ -0,0 +1,66 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def get_cache():
+    """Кэш ответов API, настроенный в settings.PEREVAL_CACHE_ALIAS"""
+    return caches[settings.PEREVAL_CACHE_ALIAS]
+
+
+def pass_cache_key(pk: int) -> str:
+    return f'pereval:pass:{pk}'
+
+
+def get_pass_payload(pk: int) -> Optional[Dict[str, Any]]:
+    """
+    Закэшированное представление перевала:
+    {'data': ..., 'etag': ..., 'last_modified': timestamp} или None
+    """
+    return get_cache().get(pass_cache_key(pk))
+
+
+async def aget_pass_payload(pk: int) -> Optional[Dict[str, Any]]:
+    """Асинхронный вариант get_pass_payload"""
+    return await get_cache().aget(pass_cache_key(pk))
+
+
+def build_pass_payload(data: Dict[str, Any], last_modified) -> Dict[str, Any]:
+    """Представление перевала вместе с ETag и временем изменения"""
+    body = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return {
+        'data': data,
+        'etag': '"%s"' % hashlib.sha1(body.encode('utf-8')).hexdigest(),
+        'last_modified': int(last_modified.timestamp()),
+    }
+
+
+def store_pass_payload(pk: int, data: Dict[str, Any], last_modified) -> Dict[str, Any]:
+    """Сохранение представления перевала в кэш вместе с ETag и временем изменения"""
+    payload = build_pass_payload(data, last_modified)
+    # add, а не set: не перетираем запись, которую уже успели сбросить и пересобрать
+    get_cache().add(pass_cache_key(pk), payload, settings.PEREVAL_CACHE_TIMEOUT)
+    return payload
+
+
+async def astore_pass_payload(pk: int, data: Dict[str, Any], last_modified) -> Dict[str, Any]:
+    """Асинхронный вариант store_pass_payload"""
+    payload = build_pass_payload(data, last_modified)
+    await get_cache().aadd(pass_cache_key(pk), payload, settings.PEREVAL_CACHE_TIMEOUT)
+    return payload
+
+
+def invalidate_passes(pks: Iterable[int]):
+    """
+    Сброс кэша перевалов: сразу и еще раз после коммита транзакции,
+    чтобы не осталась запись, собранная параллельным запросом из старых данных
+    """
+    keys = [pass_cache_key(pk) for pk in pks]
+    if not keys:
+        return
+    get_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
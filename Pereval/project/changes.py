@@ -0,0 +1,119 @@
+import base64
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import MountainPass, PassTombstone
+
+
+class CursorExpiredError(Exception):
+    """Курсор старше срока хранения записей об удалении: клиенту нужна полная синхронизация"""
+
+
+@dataclass(frozen=True)
+class ChangesCursor:
+    """
+    Позиция клиента в ленте изменений
+    Изменения перевалов упорядочены по номеру транзакции (change_txid) и id. Номера выдаются при старте
+    транзакции, а видны изменения после коммита - в другом порядке, поэтому проход по ленте запоминает
+    horizon: xmin снимка в начале прохода (все транзакции с меньшими номерами завершены). Следующий проход
+    начинается с horizon: изменения транзакций, которые еще шли, не теряются, повторно могут прийти только они
+    """
+    # Проход выдает изменения транзакций с номером >= since
+    since: int
+    # since следующего прохода; 0 - проход еще не начат
+    horizon: int
+    # Ключ (change_txid, id) последней выданной записи
+    after: Tuple[int, int]
+    # Время начала предыдущего прохода (unix): записи об удалении хранятся CHANGES_TOMBSTONE_TTL
+    issued: float
+
+    def encode(self) -> str:
+        raw = f"{self.since}|{self.horizon}|{self.after[0]}|{self.after[1]}|{self.issued!r}"
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    @classmethod
+    def decode(cls, cursor: str) -> 'ChangesCursor':
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii')
+            since, horizon, after_txid, after_id, issued = raw.split('|')
+            return cls(int(since), int(horizon), (int(after_txid), int(after_id)), float(issued))
+        except (ValueError, UnicodeError):
+            raise ValueError("Некорректный курсор")
+
+
+def current_horizon() -> int:
+    """xmin текущего снимка: номер самой старой незавершенной транзакции"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def changes_page(cursor: Optional[ChangesCursor], limit: int,
+                 user_id: Optional[int] = None) -> Tuple[List[int], List[int], ChangesCursor, bool]:
+    """
+    Страница ленты изменений после cursor (None - первая синхронизация: все перевалы, без удаленных)
+    Возвращает (id измененных перевалов, id удаленных, следующий курсор, есть ли еще изменения).
+    Оба запроса идут по индексам (change_txid, id): стоимость зависит от числа изменений, а не от числа перевалов
+    """
+    if cursor is not None and cursor.issued < time.time() - settings.CHANGES_TOMBSTONE_TTL:
+        raise CursorExpiredError("Курсор устарел: выполните полную синхронизацию (запрос без cursor)")
+
+    if cursor is None:
+        cursor = ChangesCursor(since=0, horizon=0, after=(0, 0), issued=0.0)
+    if not cursor.horizon:
+        # Начало прохода; horizon берется до чтения изменений - ничего из того, что закоммитят позже, не теряется
+        cursor = ChangesCursor(cursor.since, current_horizon(), cursor.after, time.time())
+
+    passes = MountainPass._meta.db_table
+    tombstones = PassTombstone._meta.db_table
+    user_filter, user_params = ('AND user_id = %s', [user_id]) if user_id is not None else ('', [])
+    query = f"""
+        (SELECT id, change_txid, false AS deleted FROM {passes}
+         WHERE (change_txid, id) > (%s, %s) {user_filter}
+         ORDER BY change_txid, id LIMIT %s)
+    """
+    params = [*cursor.after, *user_params, limit + 1]
+    if cursor.since:
+        # При первой синхронизации удалять у клиента нечего
+        query += f"""
+            UNION ALL
+            (SELECT mountain_pass_id, change_txid, true FROM {tombstones}
+             WHERE (change_txid, mountain_pass_id) > (%s, %s) {user_filter}
+             ORDER BY change_txid, mountain_pass_id LIMIT %s)
+        """
+        params += [*cursor.after, *user_params, limit + 1]
+    query = f"SELECT id, change_txid, deleted FROM ({query}) AS feed ORDER BY change_txid, id LIMIT %s"
+    params.append(limit + 1)
+
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changed = [pk for pk, _, deleted in rows if not deleted]
+    deleted = [pk for pk, _, deleted in rows if deleted]
+
+    if has_more:
+        next_cursor = ChangesCursor(cursor.since, cursor.horizon, (rows[-1][1], rows[-1][0]), cursor.issued)
+    else:
+        # Проход закончен: следующий начнется с horizon
+        next_cursor = ChangesCursor(cursor.horizon, 0, (cursor.horizon, 0), cursor.issued)
+    return changed, deleted, next_cursor, has_more
+
+
+def purge_tombstones(batch_size: int = 10000) -> int:
+    """Удаление записей об удалении старше CHANGES_TOMBSTONE_TTL пачками, возвращает число удаленных"""
+    expired = timezone.now() - timedelta(seconds=settings.CHANGES_TOMBSTONE_TTL)
+    deleted = 0
+    while True:
+        pks = list(PassTombstone.objects.filter(deleted_at__lt=expired).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += PassTombstone.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,229 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeoutError(ConnectionError):
+    """Не удалось получить подключение из пула за отведенное время"""
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection, now: float):
+        self.connection = connection
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул подключений к PostgreSQL
+
+    min_size       - сколько подключений открыть сразу и держать даже без нагрузки
+    max_size       - верхняя граница открытых подключений; остальные потоки ждут
+    max_lifetime   - подключение старше этого (секунды) закрывается при возврате или выдаче
+    idle_timeout   - простаивающее дольше этого подключение закрывается (сверх min_size)
+    timeout        - сколько ждать свободного подключения, затем PoolTimeoutError
+    health_check   - проверять подключение запросом SELECT 1 перед выдачей
+    """
+
+    def __init__(self, connect: Callable[[], Any], min_size: int = 1, max_size: int = 10,
+                 max_lifetime: float = 3600, idle_timeout: float = 600, timeout: float = 30,
+                 health_check: bool = True):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Некорректные размеры пула: требуется 0 <= min_size <= max_size, max_size >= 1")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.health_check = health_check
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_closed': 0,
+            'health_check_failures': 0,
+        }
+
+        try:
+            for _ in range(min_size):
+                self._idle.append(self._open())
+                self._size += 1
+        except Exception:
+            self.close()
+            raise
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Выдача подключения на время блока with
+        При исключении незавершенная транзакция откатывается, подключение возвращается в пул
+        """
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Получение подключения; его обязательно нужно вернуть через putconn"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        wait_started = None
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise ConnectionError("Пул подключений закрыт")
+                entry = self._pop_idle()
+                while entry is None and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Нет свободного подключения за {timeout} с (max_size={self.max_size})"
+                        )
+                    if wait_started is None:
+                        wait_started = time.monotonic()
+                        self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                    entry = self._pop_idle()
+                if entry is None:
+                    # Резервируем место под новое подключение, само подключение - вне блокировки
+                    self._size += 1
+                if wait_started is not None:
+                    self._stats['wait_time'] += time.monotonic() - wait_started
+                    wait_started = None
+
+            if entry is None:
+                try:
+                    entry = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif self.health_check and not self._is_alive(entry.connection):
+                with self._cond:
+                    self._stats['health_check_failures'] += 1
+                self._discard(entry)
+                continue
+
+            with self._cond:
+                self._in_use[id(entry.connection)] = entry
+                self._stats['checkouts'] += 1
+            return entry.connection
+
+    def putconn(self, conn, close: bool = False):
+        """Возврат подключения в пул; close=True - закрыть его вместо возврата"""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise ValueError("Подключение не принадлежит пулу")
+
+        now = time.monotonic()
+        if close or self._closed or conn.closed or now - entry.created_at > self.max_lifetime:
+            self._discard(entry)
+            return
+
+        try:
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            self._discard(entry)
+            return
+
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние и счетчики пула"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                **self._stats,
+            }
+
+    def close(self):
+        """Закрытие всех свободных подключений; занятые закрываются при возврате"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+    def _open(self) -> _PooledConnection:
+        conn = self._connect()
+        with self._cond:
+            self._stats['connections_created'] += 1
+        return _PooledConnection(conn, time.monotonic())
+
+    def _pop_idle(self) -> Optional[_PooledConnection]:
+        # Вызывается под блокировкой. Слева в очереди - дольше всех простаивающие: лишние закрываем
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0].last_used > self.idle_timeout:
+            self._close_idle(self._idle.popleft())
+
+        # Выдаем последнее возвращенное (LIFO), чтобы остальные могли простоять и закрыться
+        while self._idle:
+            entry = self._idle.pop()
+            if now - entry.created_at <= self.max_lifetime and not entry.connection.closed:
+                return entry
+            self._close_idle(entry)
+        return None
+
+    def _close_idle(self, entry: _PooledConnection):
+        # Вызывается под блокировкой
+        self._size -= 1
+        self._stats['connections_closed'] += 1
+        self._close_quietly(entry.connection)
+
+    def _discard(self, entry: _PooledConnection):
+        self._close_quietly(entry.connection)
+        with self._cond:
+            self._size -= 1
+            self._stats['connections_closed'] += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -1,11 +1,22 @@
 import os
+import threading
 import psycopg2
 import json
-from typing import Dict, Any, Optional
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
 
+from psycopg2.extras import execute_values
+
+from .connection_pool import ConnectionPool
+
 
 class DatabaseManager:
+    # Пулы общие для всех экземпляров с одинаковыми параметрами подключения
+    _pools: Dict[tuple, ConnectionPool] = {}
+    _pools_lock = threading.Lock()
+
     def __init__(self):
         self.db_config = {
             'host': os.getenv('FSTR_DB_HOST', 'localhost'),
@@ -14,26 +25,64 @@ class DatabaseManager:
             'password': os.getenv('FSTR_DB_PASS', 'password'),
             'database': os.getenv('FSTR_DB_NAME', 'fstr_db')
         }
-        self.connection = None
+        self.pool_config = {
+            'min_size': int(os.getenv('FSTR_DB_POOL_MIN', '1')),
+            'max_size': int(os.getenv('FSTR_DB_POOL_MAX', '10')),
+            'max_lifetime': float(os.getenv('FSTR_DB_POOL_MAX_LIFETIME', '3600')),
+            'idle_timeout': float(os.getenv('FSTR_DB_POOL_IDLE_TIMEOUT', '600')),
+            'timeout': float(os.getenv('FSTR_DB_POOL_TIMEOUT', '30')),
+        }
+        self.pool = None
 
     def connect(self):
-        """Установка подключения к PostgreSQL"""
-        try:
-            self.connection = psycopg2.connect(**self.db_config)
-        except Exception as e:
-            raise ConnectionError(f"Ошибка подключения к базе данных: {e}")
+        """Подключение к общему пулу PostgreSQL (пул создается при первом обращении)"""
+        key = tuple(sorted(self.db_config.items()))
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                try:
+                    pool = ConnectionPool(lambda: psycopg2.connect(**self.db_config), **self.pool_config)
+                except Exception as e:
+                    raise ConnectionError(f"Ошибка подключения к базе данных: {e}")
+                self._pools[key] = pool
+        self.pool = pool
 
     def disconnect(self):
-        """Закрытие подключения"""
-        if self.connection:
-            self.connection.close()
+        """Отключение от пула; сами подключения остаются в пуле для других экземпляров"""
+        self.pool = None
+
+    @classmethod
+    def close_all_pools(cls):
+        """Закрытие всех пулов (при остановке процесса)"""
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for pool in pools:
+            pool.close()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Подключение из пула на время блока with
+        Незакоммиченная транзакция откатывается при возврате подключения
+        """
+        if not self.pool:
+            self.connect()
+        with self.pool.connection(timeout) as conn:
+            yield conn
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Статистика пула: size, idle, in_use, waits, wait_time, timeouts и др."""
+        if not self.pool:
+            self.connect()
+        return self.pool.stats()
 
     def submit_pereval_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Основной метод для добавления данных о перевале
         Возвращает словарь с результатом операции
         """
-        if not self.connection:
+        if not self.pool:
             self.connect()
 
         try:
@@ -46,24 +95,10 @@ class DatabaseManager:
                     'id': None
                 }
 
-            # Формируем структуру raw_data согласно примеру
-            raw_data = {
-                "beauty_title": data.get("beauty_title", ""),
-                "title": data.get("title", ""),
-                "other_titles": data.get("other_titles", ""),
-                "connect": data.get("connect", ""),
-                "add_time": data.get("add_time", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-                "user": data.get("user", {}),
-                "coords": data.get("coords", {}),
-                "level": data.get("level", {})
-            }
-
-            # Формируем images
-            images_data = None
-            if "images" in data and data["images"]:
-                images_data = {"images": data["images"]}
+            raw_data, images_data = self._build_row(data)
 
-            with self.connection.cursor() as cursor:
+            # При ошибке транзакция откатывается при возврате подключения в пул
+            with self.connection() as conn, conn.cursor() as cursor:
                 # Вставляем данные в таблицу pereval_added
                 query = """
                     INSERT INTO pereval_added (date_added, raw_data, images)
@@ -71,13 +106,10 @@ class DatabaseManager:
                     RETURNING id;
                 """
 
-                cursor.execute(query, (
-                    json.dumps(raw_data, ensure_ascii=False),
-                    json.dumps(images_data, ensure_ascii=False) if images_data else None
-                ))
+                cursor.execute(query, (raw_data, images_data))
 
                 new_id = cursor.fetchone()[0]
-                self.connection.commit()
+                conn.commit()
 
                 return {
                     'status': 200,
@@ -86,22 +118,147 @@ class DatabaseManager:
                 }
 
         except psycopg2.Error as e:
-            if self.connection:
-                self.connection.rollback()
             return {
                 'status': 500,
                 'message': f'Ошибка базы данных: {str(e)}',
                 'id': None
             }
         except Exception as e:
-            if self.connection:
-                self.connection.rollback()
             return {
                 'status': 500,
                 'message': f'Ошибка при выполнении операции: {str(e)}',
                 'id': None
             }
 
+    def submit_many(self, submissions: Iterable[Dict[str, Any]], batch_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Пакетное добавление перевалов
+        Возвращает результат по каждой записи: {'index', 'status', 'message', 'id'}
+        """
+        return list(self.iter_submit_many(submissions, batch_size))
+
+    def iter_submit_many(self, submissions: Iterable[Dict[str, Any]],
+                         batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Потоковое добавление перевалов для загрузки больших объемов
+        Записи читаются из итератора пачками по batch_size, каждая пачка вставляется
+        одним INSERT и коммитится отдельно. Ошибка в записи не останавливает загрузку:
+        результат по каждой записи выдается сразу после коммита ее пачки
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size должен быть больше 0")
+        if not self.pool:
+            self.connect()
+
+        iterator = iter(submissions)
+        offset = 0
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            yield from self._submit_batch(batch, offset)
+            offset += len(batch)
+
+    def _submit_batch(self, batch: List[Dict[str, Any]], offset: int) -> List[Dict[str, Any]]:
+        results = []
+        rows = []
+        for index, data in enumerate(batch, start=offset):
+            result = {'index': index, 'status': 200, 'message': 'Отправлено успешно', 'id': None}
+            results.append(result)
+            if not isinstance(data, dict):
+                result.update(status=400, message='Ожидается объект')
+                continue
+            # Неверные типы вложенных полей (например, user - число) - ошибка только этой записи
+            try:
+                validation_result = self._validate_data(data)
+                if not validation_result['valid']:
+                    result.update(
+                        status=400,
+                        message=f"Не хватает полей: {', '.join(validation_result['missing_fields'])}"
+                    )
+                    continue
+                rows.append((result, self._build_row(data)))
+            except (TypeError, ValueError, KeyError) as e:
+                result.update(status=400, message=f'Некорректные данные: {e}')
+
+        if not rows:
+            return results
+
+        try:
+            with self.connection() as conn:
+                for (result, _), outcome in zip(rows, self._insert_rows(conn, [row for _, row in rows])):
+                    if isinstance(outcome, Exception):
+                        result.update(status=500, message=f'Ошибка базы данных: {outcome}')
+                    else:
+                        result['id'] = outcome
+        except Exception as e:
+            # Пачка не записана целиком (например, потеряно подключение)
+            for result, _ in rows:
+                result.update(status=500, message=f'Ошибка при выполнении операции: {e}', id=None)
+
+        return results
+
+    @staticmethod
+    def _insert_rows(conn, rows: List[Tuple[str, Optional[str]]]) -> List[Any]:
+        """
+        Вставка пачки строк pereval_added одним запросом и коммит
+        Если пачка не прошла, строки вставляются по одной через SAVEPOINT, чтобы отсеять
+        ошибочные. Возвращает id или исключение для каждой строки
+        """
+        try:
+            with conn.cursor() as cursor:
+                ids = execute_values(
+                    cursor,
+                    "INSERT INTO pereval_added (date_added, raw_data, images) VALUES %s RETURNING id",
+                    rows, template="(NOW(), %s, %s)", page_size=len(rows), fetch=True
+                )
+            conn.commit()
+            return [row[0] for row in ids]
+        except psycopg2.Error:
+            conn.rollback()
+
+        outcomes = []
+        with conn.cursor() as cursor:
+            for row in rows:
+                cursor.execute("SAVEPOINT pereval_row")
+                try:
+                    cursor.execute(
+                        "INSERT INTO pereval_added (date_added, raw_data, images) VALUES (NOW(), %s, %s) RETURNING id",
+                        row
+                    )
+                    outcomes.append(cursor.fetchone()[0])
+                    cursor.execute("RELEASE SAVEPOINT pereval_row")
+                except psycopg2.Error as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT pereval_row")
+                    outcomes.append(e)
+        conn.commit()
+        return outcomes
+
+    @staticmethod
+    def _build_row(data: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Значения raw_data и images для строки pereval_added"""
+        # Формируем структуру raw_data согласно примеру
+        raw_data = {
+            "beauty_title": data.get("beauty_title", ""),
+            "title": data.get("title", ""),
+            "other_titles": data.get("other_titles", ""),
+            "connect": data.get("connect", ""),
+            "add_time": data.get("add_time", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            "user": data.get("user", {}),
+            "coords": data.get("coords", {}),
+            "level": data.get("level", {})
+        }
+
+        # Формируем images
+        images_data = None
+        if "images" in data and data["images"]:
+            images_data = {"images": data["images"]}
+
+        return (
+            json.dumps(raw_data, ensure_ascii=False),
+            json.dumps(images_data, ensure_ascii=False) if images_data else None
+        )
+
     def _validate_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Валидация входящих данных
@@ -136,11 +293,11 @@ class DatabaseManager:
         """
         Получение данных перевала по ID
         """
-        if not self.connection:
+        if not self.pool:
             self.connect()
 
         try:
-            with self.connection.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 query = "SELECT * FROM pereval_added WHERE id = %s;"
                 cursor.execute(query, (pereval_id,))
                 result = cursor.fetchone()
@@ -0,0 +1,179 @@
+import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List
+
+from django.conf import settings
+from django.db import DatabaseError, connection, models, transaction
+
+from .models import Image, ImageVariant, MountainPass, PassDocument
+from .storage import get_image_storage
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('full', 'summary')
+
+# Больше перевалов за раз фоновый поток не собирает
+BATCH_SIZE = 500
+
+# Перевалы, документы которых нужно пересобрать после коммита текущей транзакции (по потоку)
+_pending = threading.local()
+
+# Очередь фонового потока: перевалы, изменившиеся за время предыдущей пересборки, собираются одной пачкой
+_queue_lock = threading.Lock()
+_queued = set()
+_draining = False
+
+
+def build_documents(pks: Iterable[int]) -> List[PassDocument]:
+    """
+    Сборка документов перевалов теми же сериализаторами, что и ответы API: три запроса на всю пачку
+    Ссылки на изображения сохраняются относительными, содержимое изображений не включается
+    """
+    from .serializers import MountainPassSerializer, MountainPassSummarySerializer
+
+    passes = list(
+        MountainPass.objects.filter(pk__in=list(pks))
+        .select_related('user', 'coords', 'level')
+        .defer(*MountainPass.SEARCH_FIELDS)
+        .prefetch_related(
+            models.Prefetch('images', queryset=Image.objects.order_by('pk').prefetch_related(
+                models.Prefetch('variants', queryset=ImageVariant.objects.order_by('pk'))
+            ))
+        )
+    )
+    full = MountainPassSerializer(passes, many=True, context={'embed_images': False}).data
+    summary = MountainPassSummarySerializer(passes, many=True).data
+    return [
+        PassDocument(
+            mountain_pass_id=mountain_pass.pk,
+            full=full_data,
+            summary=summary_data,
+            image_digests=[image.sha256 for image in mountain_pass.images.all()],
+            updated_at=mountain_pass.updated_at,
+        )
+        for mountain_pass, full_data, summary_data in zip(passes, full, summary)
+    ]
+
+
+def save_documents(documents: List[PassDocument]):
+    if documents:
+        PassDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['mountain_pass'],
+            update_fields=['full', 'summary', 'image_digests', 'updated_at'],
+        )
+
+
+def rebuild_documents(pks: Iterable[int]) -> List[PassDocument]:
+    """Сборка и сохранение документов; удаленные перевалы пропускаются"""
+    documents = build_documents(pks)
+    save_documents(documents)
+    return documents
+
+
+def refresh_documents(pks: Iterable[int]):
+    """
+    Пересборка документов после коммита текущей транзакции (сразу, если транзакции нет)
+    Режим задается settings.PASS_DOCUMENTS_MODE: thread - в фоновом потоке, inline - в том же потоке.
+    Повторные вызовы в одной транзакции объединяются: документ собирается один раз
+    """
+    pending = getattr(_pending, 'pks', None)
+    if pending is None:
+        pending = _pending.pks = set()
+    pending.update(pks)
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    pks = getattr(_pending, 'pks', None)
+    if not pks:
+        return
+    _pending.pks = set()
+    if settings.PASS_DOCUMENTS_MODE == 'inline':
+        _rebuild(sorted(pks))
+        return
+
+    global _draining
+    with _queue_lock:
+        _queued.update(pks)
+        if _draining:
+            return
+        _draining = True
+    get_executor().submit(_drain_queue)
+
+
+def _rebuild(pks: List[int]):
+    try:
+        rebuild_documents(pks)
+    except DatabaseError:
+        # Ответы при этом остаются верными: устаревший или отсутствующий документ собирается при чтении
+        logger.exception("Не удалось пересобрать документы перевалов %s", pks)
+
+
+def _drain_queue():
+    global _draining
+    try:
+        while True:
+            with _queue_lock:
+                pks = sorted(_queued)[:BATCH_SIZE]
+                _queued.difference_update(pks)
+                if not pks:
+                    _draining = False
+                    return
+            _rebuild(pks)
+    except BaseException:
+        with _queue_lock:
+            _draining = False
+        raise
+    finally:
+        # Поток фоновый: подключение к БД не закроется само по окончании запроса
+        connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_executor() -> ThreadPoolExecutor:
+    """Фоновый поток сборки документов: запись перевала не ждет сериализации"""
+    return ThreadPoolExecutor(1, thread_name_prefix='pass-documents')
+
+
+def render_document(data: Dict[str, Any], image_digests: List[str], kind: str, request=None) -> Dict[str, Any]:
+    """
+    Ответ API из документа: в полное представление подставляется содержимое изображений,
+    в кратком ссылки становятся абсолютными, если известен запрос
+    """
+    if kind == 'full':
+        storage = get_image_storage()
+        for image, digest in zip(data['images'], image_digests):
+            image['data'] = base64.b64encode(storage.read(digest)).decode('ascii')
+    elif request is not None:
+        for image in data['images']:
+            image['url'] = request.build_absolute_uri(image['url'])
+            for variant in image['variants'].values():
+                variant['url'] = request.build_absolute_uri(variant['url'])
+    return data
+
+
+def render_passes(passes: List[MountainPass], kind: str, request=None) -> List[Dict[str, Any]]:
+    """
+    Ответы API для перевалов, выбранных через MountainPassQuerySet.with_document(kind)
+    Отсутствующие и устаревшие документы собираются и сохраняются одной пачкой
+    """
+    documents = {}
+    stale = []
+    for mountain_pass in passes:
+        document = getattr(mountain_pass, 'document', None)
+        if document is None or document.updated_at != mountain_pass.updated_at:
+            stale.append(mountain_pass.pk)
+        else:
+            documents[mountain_pass.pk] = document
+    if stale:
+        documents.update((document.mountain_pass_id, document) for document in rebuild_documents(stale))
+
+    return [
+        render_document(getattr(document, kind), document.image_digests, kind, request)
+        for document in (documents[mountain_pass.pk] for mountain_pass in passes if mountain_pass.pk in documents)
+    ]
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .models import MountainPass
+from .parsers import loads
+from .renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+# Канал LISTEN/NOTIFY со сменой статусов перевалов
+CHANNEL = 'pereval_status'
+
+# Сколько событий ждет отправки клиенту; при переполнении вместо них отправляется снимок статусов
+QUEUE_SIZE = 100
+
+# Маркер в очереди подписчика: события потеряны, нужно отправить снимок
+_RESET = object()
+
+
+class Subscription:
+    """Подписка потока событий (цикл событий ASGI) на изменения перевалов пользователя"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, event):
+        """Вызывается в цикле событий подписчика"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать: заменяем очередь снимком
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_RESET)
+
+    async def get(self, timeout: Optional[float] = None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Broker:
+    """
+    Pub/sub внутри процесса: события о перевалах раздаются подпискам их пользователя
+    publish можно вызывать из любого потока - события передаются в цикл событий подписчика
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[int, Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, events: Iterable[Dict[str, Any]]):
+        for event in events:
+            with self._lock:
+                subscriptions = list(self._subscriptions.get(event['user_id'], ()))
+            for subscription in subscriptions:
+                self._deliver(subscription, event)
+
+    def reset_all(self):
+        """События могли быть потеряны (например, при переподключении LISTEN): всем подпискам - снимок статусов"""
+        with self._lock:
+            subscriptions = [subscription for group in self._subscriptions.values() for subscription in group]
+        for subscription in subscriptions:
+            self._deliver(subscription, _RESET)
+
+    def _deliver(self, subscription: Subscription, event):
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+        except RuntimeError:
+            # Цикл событий уже закрыт
+            self.unsubscribe(subscription)
+
+
+broker = Broker()
+
+
+def publish_status_changes(rows: Iterable[Tuple[int, int]], status: str):
+    """
+    Событие о смене статуса перевалов rows = [(id перевала, id пользователя), ...] после коммита транзакции
+    PASS_EVENTS_BACKEND = 'postgres' - NOTIFY в той же транзакции (получат все процессы ASGI, откат отменяет
+    уведомления), 'local' - только подписчики этого процесса.
+    Если поток LISTEN этого процесса запущен, но сейчас не подключен, событие вдобавок к NOTIFY раздается
+    подписчикам процесса напрямую: уведомление до них не дойдет
+    """
+    updated_at = timezone.now().isoformat()
+    display = dict(MountainPass.STATUS_CHOICES).get(status, status)
+    events = [
+        {'id': pk, 'user_id': user_id, 'status': status, 'status_display': display, 'updated_at': updated_at}
+        for pk, user_id in rows
+    ]
+    if not events:
+        return
+    if settings.PASS_EVENTS_BACKEND == 'postgres':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                [CHANNEL, [dumps(event).decode('utf-8') for event in events]]
+            )
+        listener = _listener
+        if listener is None or listener.listening.is_set():
+            return
+    transaction.on_commit(partial(broker.publish, events))
+
+
+class Listener(threading.Thread):
+    """
+    Поток, который слушает канал CHANNEL (LISTEN) своим соединением и передает уведомления в broker
+    При обрыве соединения переподключается. Уведомления, отправленные за это время, теряются, поэтому
+    после каждого LISTEN все подписки получают снимок статусов (broker.reset_all)
+    """
+
+    def __init__(self):
+        super().__init__(name='pass-events-listener', daemon=True)
+        self.stopping = threading.Event()
+        self.listening = threading.Event()
+
+    def run(self):
+        delay = 0
+        # Пауза перед переподключением - после закрытия соединения: на это время listening снят
+        while not self.stopping.wait(delay):
+            try:
+                self.listen()
+            except DatabaseError:
+                # Оборвалось работавшее соединение - переподключаемся через секунду, иначе пауза растет
+                delay = 1 if self.listening.is_set() else min(max(delay * 2, 1), 30)
+                logger.exception("Ошибка соединения LISTEN %s, переподключение через %s с", CHANNEL, delay)
+            finally:
+                self.listening.clear()
+                connection.close()
+
+    def listen(self):
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        # До LISTEN (при первом подключении - до подписки на канал) смены статусов могли пройти мимо
+        broker.reset_all()
+        self.listening.set()
+        raw = connection.connection
+        while not self.stopping.is_set():
+            # Ждем с таймаутом, чтобы заметить остановку
+            if select.select([raw], [], [], 1)[0]:
+                # Ошибки psycopg2 (обрыв соединения) - как DatabaseError Django
+                with connection.wrap_database_errors:
+                    raw.poll()
+                notifies = raw.notifies[:]
+                del raw.notifies[:]
+                events = []
+                for notify in notifies:
+                    try:
+                        events.append(loads(notify.payload))
+                    except ValueError:
+                        logger.warning("Некорректное уведомление %s: %s", CHANNEL, notify.payload)
+                broker.publish(events)
+
+
+_listener: Optional[Listener] = None
+_listener_lock = threading.Lock()
+
+
+def start_listener() -> Optional[Listener]:
+    """Запуск потока LISTEN при первой подписке (PASS_EVENTS_BACKEND = 'postgres')"""
+    global _listener
+    if settings.PASS_EVENTS_BACKEND != 'postgres':
+        return None
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = Listener()
+            _listener.start()
+        return _listener
+
+
+def stop_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stopping.set()
+            _listener.join()
+            _listener = None
+
+
+def current_statuses(user_id: int) -> List[Dict[str, Any]]:
+    """Снимок статусов перевалов пользователя для начала потока"""
+    statuses = dict(MountainPass.STATUS_CHOICES)
+    return [
+        {'id': pk, 'status': status, 'status_display': statuses.get(status, status), 'updated_at': updated_at}
+        for pk, status, updated_at in MountainPass.objects.filter(user_id=user_id).order_by('pk')
+        .values_list('pk', 'status', 'updated_at')
+    ]
+
+
+def format_event(event: str, data) -> str:
+    """Событие в формате text/event-stream; JSON в одну строку"""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+async def event_stream(user_id: int, heartbeat: Optional[float] = None):
+    """
+    Поток text/event-stream: снимок статусов перевалов пользователя (snapshot), затем смены статусов (status)
+    Подписка оформляется до чтения снимка - смена статуса между ними не теряется (может прийти дважды).
+    Комментарий-пинг раз в PASS_EVENTS_HEARTBEAT секунд держит соединение через прокси и выявляет отключение
+    """
+    heartbeat = settings.PASS_EVENTS_HEARTBEAT if heartbeat is None else heartbeat
+    start_listener()
+    subscription = broker.subscribe(user_id)
+    try:
+        yield f"retry: {settings.PASS_EVENTS_RETRY_MS}\n\n"
+        yield format_event('snapshot', await sync_to_async(current_statuses)(user_id))
+        while True:
+            try:
+                event = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                yield f": ping {int(time.time())}\n\n"
+                continue
+            if event is _RESET:
+                yield format_event('snapshot', await sync_to_async(current_statuses)(user_id))
+            else:
+                yield format_event('status', {key: value for key, value in event.items() if key != 'user_id'})
+    finally:
+        broker.unsubscribe(subscription)
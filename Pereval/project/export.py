@@ -0,0 +1,142 @@
+import csv
+import io
+import zlib
+from typing import Iterable, Iterator, List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .documents import render_passes
+from .renderers import dumps
+
+# Форматы выгрузки: тип содержимого и расширение файла
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+# Колонки CSV: плоские поля перевала, координаты и категории по сезонам (без данных пользователя)
+CSV_COLUMNS = [
+    ('id', 'id'),
+    ('beauty_title', 'beauty_title'),
+    ('title', 'title'),
+    ('other_titles', 'other_titles'),
+    ('connect', 'connect'),
+    ('add_time', 'add_time'),
+    ('status', 'status'),
+    ('latitude', 'coords__latitude'),
+    ('longitude', 'coords__longitude'),
+    ('height', 'coords__height'),
+    ('level_winter', 'level__winter'),
+    ('level_summer', 'level__summer'),
+    ('level_autumn', 'level__autumn'),
+    ('level_spring', 'level__spring'),
+]
+
+
+def ndjson_chunks(queryset, chunk_size: int, request=None) -> Iterator[bytes]:
+    """
+    Перевалы в кратком представлении (как view=summary), по одному JSON в строке
+    Документы берутся пачками по chunk_size: в памяти одновременно не больше одной пачки
+    """
+    batch = []
+    for mountain_pass in queryset.with_document('summary').order_by('pk').iterator(chunk_size=chunk_size):
+        batch.append(mountain_pass)
+        if len(batch) == chunk_size:
+            yield _ndjson_lines(batch, request)
+            batch = []
+    if batch:
+        yield _ndjson_lines(batch, request)
+
+
+def _ndjson_lines(passes: List, request) -> bytes:
+    return b''.join(dumps(data) + b'\n' for data in render_passes(passes, 'summary', request))
+
+
+def csv_chunks(queryset, chunk_size: int) -> Iterator[bytes]:
+    """Перевалы строками CSV с заголовком; строки собираются пачками по chunk_size"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in CSV_COLUMNS])
+    rows = (
+        queryset.order_by('pk')
+        .values_list(*[field for _, field in CSV_COLUMNS])
+        .iterator(chunk_size=chunk_size)
+    )
+    for number, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if number % chunk_size == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def _drain(buffer: io.StringIO) -> bytes:
+    content = buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    return content
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Принимает ли клиент gzip по заголовку Accept-Encoding: кодировка gzip (или *) с q больше 0
+    Явно указанный gzip важнее *: "gzip;q=0, *" - gzip не принимается
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.lower()] = weight
+    return weights.get('gzip', weights.get('*', 0.0)) > 0
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Сжатие потока частей в gzip без накопления всего содержимого"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(queryset, output: str, compress: bool = False, chunk_size: int = None,
+                  request=None) -> Iterator[bytes]:
+    """
+    Выгрузка перевалов queryset в формате output ('ndjson' или 'csv'), при compress - в gzip
+    Строки читаются серверным курсором (iterator): память не зависит от числа перевалов. Вне транзакции
+    курсор объявляется WITH HOLD - выгрузка медленному клиенту не держит транзакцию открытой
+    """
+    if output not in FORMATS:
+        raise ValueError(f"Некорректный формат выгрузки: {output}")
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    if output == 'ndjson':
+        chunks = ndjson_chunks(queryset, chunk_size, request)
+    else:
+        chunks = csv_chunks(queryset, chunk_size)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    return (chunk for chunk in chunks if chunk)
+
+
+async def async_chunks(chunks: Iterator[bytes]):
+    """
+    Синхронный поток частей для StreamingHttpResponse под ASGI: иначе Django прочитает его целиком.
+    Части читаются по одной в потоке представления (thread_sensitive) - в том же подключении к БД, где открыт курсор
+    """
+    read = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await read(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
@@ -0,0 +1,140 @@
+import math
+from typing import List, Set, Tuple
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+
+# Точность, с которой geohash хранится в Coords (~5 м)
+GEOHASH_PRECISION = 9
+
+# Сколько ячеек допускается в покрытии прямоугольника, прежде чем перейти к более крупным
+MAX_BBOX_CELLS = 32
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash точки заданной длины"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    result = []
+    bit = 0
+    value = 0
+    even = True
+
+    while len(result) < precision:
+        if even:
+            middle = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= middle:
+                value = (value << 1) | 1
+                lon_range[0] = middle
+            else:
+                value <<= 1
+                lon_range[1] = middle
+        else:
+            middle = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= middle:
+                value = (value << 1) | 1
+                lat_range[0] = middle
+            else:
+                value <<= 1
+                lat_range[1] = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            result.append(BASE32[value])
+            bit = 0
+            value = 0
+
+    return ''.join(result)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Размер ячейки geohash в градусах: (по широте, по долготе)"""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def _cell_index(value: float, origin: float, size: float, count: int) -> int:
+    return min(max(int((value - origin) // size), 0), count - 1)
+
+
+def _cells_in_range(min_lat, min_lon, max_lat, max_lon, precision) -> Set[str]:
+    height, width = cell_size(precision)
+    lat_count = round(180.0 / height)
+    lon_count = round(360.0 / width)
+    cells = set()
+    for i in range(_cell_index(min_lat, -90.0, height, lat_count), _cell_index(max_lat, -90.0, height, lat_count) + 1):
+        for j in range(_cell_index(min_lon, -180.0, width, lon_count), _cell_index(max_lon, -180.0, width, lon_count) + 1):
+            # Центр ячейки однозначно задает ее geohash
+            cells.add(encode(-90.0 + (i + 0.5) * height, -180.0 + (j + 0.5) * width, precision))
+    return cells
+
+
+def _count_cells(min_lat, min_lon, max_lat, max_lon, precision) -> int:
+    height, width = cell_size(precision)
+    lat_cells = int((max_lat + 90.0) // height) - int((min_lat + 90.0) // height) + 1
+    lon_cells = int((max_lon + 180.0) // width) - int((min_lon + 180.0) // width) + 1
+    return lat_cells * lon_cells
+
+
+def bbox_cells(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+               max_cells: int = MAX_BBOX_CELLS) -> List[str]:
+    """
+    Префиксы geohash, покрывающие прямоугольник
+    Выбирается самая мелкая ячейка, при которой их не больше max_cells.
+    min_lon > max_lon означает прямоугольник через 180-й меридиан
+    """
+    ranges = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180.0), (-180.0, max_lon)]
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        count = sum(_count_cells(min_lat, west, max_lat, east, precision) for west, east in ranges)
+        if count <= max_cells or precision == 1:
+            cells = set()
+            for west, east in ranges:
+                cells |= _cells_in_range(min_lat, west, max_lat, east, precision)
+            return sorted(cells)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по большому кругу, км"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def neighborhood(latitude: float, longitude: float, precision: int) -> Tuple[List[str], float]:
+    """
+    Ячейка точки и 8 соседних, а также радиус (км), внутри которого все точки
+    гарантированно попадают в эти ячейки
+    """
+    height, width = cell_size(precision)
+    south = -90.0 + ((latitude + 90.0) // height) * height
+    west = -180.0 + ((longitude + 180.0) // width) * width
+
+    cells = set()
+    for d_lat in (-1, 0, 1):
+        center_lat = south + (d_lat + 0.5) * height
+        if not -90.0 < center_lat < 90.0:
+            continue
+        for d_lon in (-1, 0, 1):
+            center_lon = (west + (d_lon + 0.5) * width + 180.0) % 360.0 - 180.0
+            cells.add(encode(center_lat, center_lon, precision))
+
+    # Расстояние до границы блока 3x3 по широте; за полюсом границы нет
+    radius = math.inf
+    if south - height > -90.0:
+        radius = min(radius, math.radians(latitude - (south - height)) * EARTH_RADIUS_KM)
+    if south + 2 * height < 90.0:
+        radius = min(radius, math.radians(south + 2 * height - latitude) * EARTH_RADIUS_KM)
+
+    # ... и по долготе: кратчайшее расстояние до меридиана границы
+    if 3 * width < 360.0:
+        d_lon = min(longitude - (west - width), west + 2 * width - longitude)
+        if d_lon < 90.0:
+            sine = math.sin(math.radians(d_lon)) * math.cos(math.radians(latitude))
+            radius = min(radius, math.asin(min(1.0, sine)) * EARTH_RADIUS_KM)
+
+    return sorted(cells), radius
@@ -0,0 +1,104 @@
+import hashlib
+import re
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# Видимые символы ASCII: UUID, ULID и т.п.
+_KEY_RE = re.compile(r'[\x21-\x7e]{1,255}')
+
+Result = Tuple[int, Dict[str, Any]]
+
+
+class KeyReusedError(Exception):
+    """Ключ уже использован для запроса с другими данными"""
+
+
+def get_key(request) -> Optional[str]:
+    """Ключ из заголовка Idempotency-Key; None, если его нет; ValueError, если он некорректен"""
+    key = request.headers.get(HEADER)
+    if key is None:
+        return None
+    if not _KEY_RE.fullmatch(key):
+        raise ValueError(f"Заголовок {HEADER} должен содержать от 1 до 255 видимых символов ASCII")
+    return key
+
+
+def body_fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def multipart_fingerprint(metadata: str, files: MultiValueDict) -> str:
+    """Хэш multipart-запроса: metadata и SHA-256 уже записанных в хранилище файлов по именам частей"""
+    digest = hashlib.sha256(metadata.encode('utf-8'))
+    for name, uploads in sorted(files.lists()):
+        for upload in uploads:
+            digest.update(f'\0{name}\0{upload.blob.sha256}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def run_once(scope: str, key: Optional[str], fingerprint: str, handler: Callable[[], Result]) -> Tuple[int, Dict[str, Any], bool]:
+    """
+    Выполнение handler (-> (код ответа, данные)) не больше одного раза на ключ
+    Возвращает (код ответа, данные, True для сохраненного ответа)
+
+    Строка ключа вставляется в начале транзакции, в которой выполняется handler. Параллельный запрос
+    с тем же ключом ждет на уникальном индексе, пока первый не завершится, и получает его ответ;
+    если первый откатился, выполняется сам. Ответы 5xx не сохраняются - такой запрос можно повторить.
+    Ключ старше IDEMPOTENCY_KEY_TTL занимается заново
+    """
+    if key is None:
+        return (*handler(), False)
+
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    table = IdempotencyKey._meta.db_table
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (scope, key, fingerprint, status_code, response, created_at)
+                VALUES (%s, %s, %s, NULL, NULL, %s)
+                ON CONFLICT (scope, key) DO UPDATE
+                    SET fingerprint = EXCLUDED.fingerprint, status_code = NULL, response = NULL,
+                        created_at = EXCLUDED.created_at
+                    WHERE {table}.created_at < %s
+                RETURNING id
+                """,
+                [scope, key, fingerprint, now, expired]
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            stored = IdempotencyKey.objects.only('fingerprint', 'status_code', 'response').get(scope=scope, key=key)
+            if stored.fingerprint != fingerprint:
+                raise KeyReusedError(f"Ключ {HEADER} уже использован для другого запроса")
+            return stored.status_code, stored.response, True
+
+        status_code, data = handler()
+        if status_code >= 500:
+            # Вместе с ключом откатывается и все, что успел записать handler
+            transaction.set_rollback(True)
+        else:
+            IdempotencyKey.objects.filter(pk=row[0]).update(status_code=status_code, response=data)
+        return status_code, data, False
+
+
+def purge_expired(batch_size: int = 10000) -> int:
+    """Удаление ключей старше IDEMPOTENCY_KEY_TTL пачками, возвращает число удаленных"""
+    expired = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    deleted = 0
+    while True:
+        pks = list(IdempotencyKey.objects.filter(created_at__lt=expired).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,150 @@
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+
+from . import imaging
+from .cache import invalidate_passes
+from .documents import refresh_documents
+from .models import Image, ImageVariant
+from .storage import StoredBlob, get_image_storage
+
+logger = logging.getLogger(__name__)
+
+
+def schedule_variants(image_ids: Iterable[int]):
+    """
+    Построение вариантов изображений после коммита текущей транзакции
+    Режим задается settings.IMAGE_VARIANTS_MODE: process - в фоне в пуле процессов,
+    inline - сразу в том же потоке (тесты, отладка), off - не строить
+    """
+    image_ids = list(image_ids)
+    mode = settings.IMAGE_VARIANTS_MODE
+    if not image_ids or mode == 'off':
+        return
+    if not imaging.is_available():
+        logger.warning("Pillow не установлен, варианты изображений не строятся")
+        return
+
+    if mode == 'inline':
+        transaction.on_commit(lambda: build_variants(image_ids))
+    else:
+        transaction.on_commit(lambda: get_executors()[0].submit(_build_in_background, image_ids))
+
+
+def build_variants(image_ids: Iterable[int], pool: Optional[Executor] = None) -> int:
+    """
+    Построение недостающих вариантов и перцептивных хэшей изображений,
+    возвращает число созданных вариантов (без тех, что успела создать параллельная сборка)
+    Одинаковое содержимое обрабатывается один раз, готовые варианты других изображений
+    с тем же содержимым переиспользуются
+    """
+    sizes = settings.IMAGE_VARIANTS
+    images = [
+        image for image in Image.objects.filter(pk__in=list(image_ids)).only('id', 'mountain_pass_id', 'sha256', 'phash')
+        .prefetch_related('variants')
+        if not image.phash or set(sizes) - {variant.kind for variant in image.variants.all()}
+    ]
+    if not images:
+        return 0
+
+    # Содержимое -> готовые варианты и перцептивный хэш
+    blobs: Dict[str, Dict[str, StoredBlob]] = {}
+    hashes: Dict[str, str] = {}
+    for variant in ImageVariant.objects.filter(
+        image__sha256__in={image.sha256 for image in images}, kind__in=list(sizes)
+    ).values('image__sha256', 'image__phash', 'kind', 'sha256', 'size', 'mime_type', 'width', 'height'):
+        source, phash, kind = variant.pop('image__sha256'), variant.pop('image__phash'), variant.pop('kind')
+        blobs.setdefault(source, {})[kind] = StoredBlob(**variant)
+        if phash:
+            hashes[source] = phash
+
+    to_render = sorted({
+        image.sha256 for image in images
+        if set(sizes) - set(blobs.get(image.sha256, {})) or image.sha256 not in hashes
+    })
+    storage = get_image_storage()
+    results = (pool.map if pool else map)(imaging.render_variants_safely, repeat(storage), to_render, repeat(sizes))
+    for digest, result in zip(to_render, results):
+        if isinstance(result, str):
+            logger.warning("Не удалось построить варианты изображения %s: %s", digest, result)
+        else:
+            blobs[digest], hashes[digest] = result
+
+    for digest, phash in hashes.items():
+        pks = [image.pk for image in images if image.sha256 == digest and not image.phash]
+        if pks:
+            Image.objects.filter(pk__in=pks).update(phash=phash)
+
+    variants = [
+        (image.pk, kind, blob.sha256, blob.size, blob.mime_type, blob.width, blob.height)
+        for image in images
+        for kind, blob in blobs.get(image.sha256, {}).items()
+        if kind in sizes
+    ]
+    created = _insert_variants(variants)
+    # Варианты есть в представлениях перевала: массовая вставка не отправляет post_save,
+    # кэш ответов и документы перевалов обновляем сами
+    passes = {image.pk: image.mountain_pass_id for image in images}
+    pass_ids = {passes[image_id] for image_id in created}
+    invalidate_passes(pass_ids)
+    refresh_documents(pass_ids)
+    return len(created)
+
+
+def _insert_variants(rows: List[tuple]) -> List[int]:
+    """
+    Вставка вариантов (image_id, kind, sha256, size, mime_type, width, height) одним запросом
+    Варианты, которые уже создала параллельная сборка, пропускаются (ON CONFLICT DO NOTHING).
+    Возвращает image_id каждого действительно вставленного варианта
+    """
+    if not rows:
+        return []
+    columns = ['image_id', 'kind', 'sha256', 'size', 'mime_type', 'width', 'height']
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {ImageVariant._meta.db_table} ({', '.join(columns)}) VALUES {placeholders} "
+            f"ON CONFLICT (image_id, kind) DO NOTHING RETURNING image_id",
+            [value for row in rows for value in row]
+        )
+        return [image_id for image_id, in cursor.fetchall()]
+
+
+def _build_in_background(image_ids):
+    try:
+        build_variants(image_ids, get_executors()[1])
+    except Exception:
+        logger.exception("Ошибка при построении вариантов изображений %s", image_ids)
+    finally:
+        # Поток фоновый: подключение к БД не закроется само по окончании запроса
+        connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_executors() -> Tuple[ThreadPoolExecutor, ProcessPoolExecutor]:
+    """
+    Фоновые потоки, которые забирают задачи из очереди и работают с БД,
+    и пул процессов, в котором декодируются и сжимаются изображения
+    """
+    workers = settings.IMAGE_VARIANTS_WORKERS
+    return (
+        ThreadPoolExecutor(workers, thread_name_prefix='image-variants'),
+        # spawn: процессы пула не наследуют подключения к БД и потоки родителя
+        ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')),
+    )
+
+
+@receiver(setting_changed)
+def _reset_executors(*, setting, **kwargs):
+    if setting == 'IMAGE_VARIANTS_WORKERS' and get_executors.cache_info().currsize:
+        for executor in get_executors():
+            executor.shutdown(wait=False)
+        get_executors.cache_clear()
@@ -0,0 +1,99 @@
+import io
+from typing import Dict, Optional, Tuple, Union
+
+from .storage import FileSystemBlobStorage, StoredBlob
+
+# Модуль не обращается к моделям и настройкам Django: функции выполняются в процессах пула
+
+JPEG_QUALITY = 85
+
+# Перцептивный хэш (dHash): 8x8 сравнений яркости соседних пикселей, 64 бита
+HASH_SIZE = 8
+
+
+def is_available() -> bool:
+    """Установлен ли Pillow"""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def render_variants(storage: FileSystemBlobStorage, digest: str,
+                    sizes: Dict[str, int]) -> Tuple[Dict[str, StoredBlob], str]:
+    """
+    Уменьшенные копии изображения из хранилища и его перцептивный хэш: ({вариант: файл}, dhash)
+    Поворот из EXIF применяется к пикселям, сами метаданные (в том числе GPS) не переносятся.
+    Изображения с прозрачностью сохраняются в PNG, остальные - в JPEG
+    """
+    from PIL import Image
+
+    with storage.open(digest) as source:
+        # JPEG декодируется сразу в уменьшенном масштабе, не меньше самого крупного варианта
+        picture = _open_picture(source, max(sizes.values()))
+
+    has_alpha = picture.mode in ('RGBA', 'LA', 'PA') or 'transparency' in picture.info
+    picture = picture.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {}
+    for kind, max_side in sizes.items():
+        copy = picture.copy()
+        copy.thumbnail((max_side, max_side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if has_alpha:
+            copy.save(buffer, 'PNG', optimize=True)
+        else:
+            copy.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        variants[kind] = storage.save(buffer.getvalue())
+    return variants, _dhash(picture)
+
+
+def render_variants_safely(storage: FileSystemBlobStorage, digest: str,
+                           sizes: Dict[str, int]) -> Union[Tuple[Dict[str, StoredBlob], str], str]:
+    """render_variants для пула: вместо исключения возвращает текст ошибки"""
+    try:
+        return render_variants(storage, digest, sizes)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def perceptual_hash(content: bytes) -> Optional[str]:
+    """
+    dHash изображения (16 hex-символов): у повторно сжатых и уменьшенных копий он совпадает
+    или отличается на несколько бит. None, если это не изображение или нет Pillow
+    """
+    if not is_available():
+        return None
+    try:
+        return _dhash(_open_picture(io.BytesIO(content), 8 * HASH_SIZE))
+    except Exception:
+        return None
+
+
+def hash_distance(first: str, second: str) -> int:
+    """Число различающихся бит двух перцептивных хэшей"""
+    return bin(int(first, 16) ^ int(second, 16)).count('1')
+
+
+def _open_picture(source, min_side: int):
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as original:
+        original.draft('RGB', (min_side, min_side))
+        picture = ImageOps.exif_transpose(original)
+        picture.load()
+    return picture
+
+
+def _dhash(picture) -> str:
+    from PIL import Image
+
+    small = picture.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            offset = row * (HASH_SIZE + 1) + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return f'{bits:0{HASH_SIZE * HASH_SIZE // 4}x}'
@@ -0,0 +1,249 @@
+import base64
+import json
+import logging
+import random
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from project import metrics
+from project.benchmark import compare_reports, latency_summary, make_png, random_coords, random_level, random_title
+from project.models import Image, MountainPass, User
+
+# Сценарий -> представление, по метрикам которого считается число SQL-запросов
+SCENARIOS = {
+    'submit': 'SubmitDataAPIView',
+    'get': 'SubmitDataDetailAPIView',
+    'list': 'SubmitDataListAPIView',
+    'patch': 'SubmitDataDetailAPIView',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест API перевалов: добавление, получение, список и редактирование с заданной '
+        'параллельностью. Пишет JSON-отчет (p50/p95/p99, запросов в секунду, SQL-запросов на запрос) '
+        'и сравнивает его с базовым. Изменяет данные - запускать на тестовой базе (seed_perevals)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Через запятую: submit,get,list,patch')
+        parser.add_argument('--requests', type=int, default=500, help='Запросов в каждом сценарии')
+        parser.add_argument('--warmup', type=int, default=20, help='Запросов прогрева (не учитываются)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Одновременных клиентов (потоков)')
+        parser.add_argument('--list-view', choices=['full', 'summary'], default='summary')
+        parser.add_argument('--submit-images', type=int, default=1, help='Изображений в добавляемом перевале')
+        parser.add_argument('--image-size', type=int, default=100, help='Размер изображения при добавлении, КБ')
+        parser.add_argument('--no-cache', action='store_true', help='Отключить кэш ответов GET /submitData/<id>/')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Файл для JSON-отчета')
+        parser.add_argument('--compare', help='Базовый JSON-отчет: при регрессиях команда завершается с ошибкой')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимое ухудшение задержки и пропускной способности (доля, 0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests и --concurrency должны быть больше 0")
+        if not MountainPass.objects.exists():
+            raise CommandError("Нет перевалов: заполните базу командой seed_perevals")
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if options['no_cache']:
+            overrides['CACHES'] = {
+                **settings.CACHES,
+                'bench-dummy': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+            }
+            overrides['PEREVAL_CACHE_ALIAS'] = 'bench-dummy'
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'commit': self.git_commit(),
+            'dataset': {
+                'passes': MountainPass.objects.count(),
+                'images': Image.objects.count(),
+                'users': User.objects.count(),
+            },
+            'options': {
+                name: options[name]
+                for name in ('requests', 'warmup', 'concurrency', 'list_view', 'submit_images', 'image_size', 'no_cache')
+            },
+            'scenarios': {},
+        }
+        # Превышения бюджета запроса под нагрузкой ожидаемы - журнал с SQL только при --verbosity 2
+        metrics_logger = logging.getLogger(metrics.__name__)
+        disabled = metrics_logger.disabled
+        metrics_logger.disabled = options['verbosity'] < 2
+        try:
+            with override_settings(**overrides):
+                for name in scenarios:
+                    report['scenarios'][name] = self.run_scenario(name)
+        finally:
+            metrics_logger.disabled = disabled
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Отчет записан в {options['output']}")
+
+        if baseline is not None:
+            regressions = compare_reports(baseline, report, options['threshold'])
+            self.stdout.write(f"Сравнение с {options['compare']} (коммит {baseline.get('commit') or '-'}):")
+            for name, result in report['scenarios'].items():
+                before = baseline['scenarios'].get(name)
+                if before:
+                    self.stdout.write(
+                        f"  {name:<8} p95 {before['latency_ms']['p95']} -> {result['latency_ms']['p95']} мс, "
+                        f"{before['throughput_rps']} -> {result['throughput_rps']} запр/с, "
+                        f"SQL {before['queries_per_request']} -> {result['queries_per_request']}"
+                    )
+            if regressions:
+                raise CommandError("Найдены регрессии:\n" + '\n'.join(regressions))
+            self.stdout.write("Регрессий нет")
+
+    def run_scenario(self, name):
+        total, warmup = self.options['requests'], self.options['warmup']
+        request = getattr(self, f'prepare_{name}')(total + warmup)
+        self.run_requests(request, range(warmup))
+
+        view = SCENARIOS[name]
+        before = metrics.registry.totals('pereval_request_db_queries').get(view, (0, 0))
+        elapsed, latencies, errors = self.run_requests(request, range(warmup, warmup + total))
+        after = metrics.registry.totals('pereval_request_db_queries').get(view, (0, 0))
+        measured = after[1] - before[1]
+
+        return {
+            'requests': total,
+            'errors': errors,
+            'throughput_rps': round(total / elapsed, 1),
+            'latency_ms': latency_summary(latencies),
+            'queries_per_request': round((after[0] - before[0]) / measured, 2) if measured else None,
+        }
+
+    def run_requests(self, request, numbers):
+        numbers = list(numbers)
+        concurrency = min(self.options['concurrency'], len(numbers)) or 1
+
+        def worker(chunk):
+            client = Client()
+            latencies, errors = [], 0
+            for number in chunk:
+                started = time.perf_counter()
+                response = request(client, number)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+            return latencies, errors
+
+        def threaded_worker(chunk):
+            try:
+                return worker(chunk)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        if concurrency == 1:
+            results = [worker(numbers)]
+        else:
+            with ThreadPoolExecutor(concurrency) as executor:
+                results = list(executor.map(threaded_worker, [numbers[i::concurrency] for i in range(concurrency)]))
+        elapsed = time.perf_counter() - started
+        return elapsed, [value for latencies, _ in results for value in latencies], sum(e for _, e in results)
+
+    def prepare_submit(self, count):
+        path = reverse('submit-data')
+        size = self.options['image_size'] * 1024
+        pictures = [base64.b64encode(make_png(size, self.rng)).decode() for _ in range(8)]
+        payloads = [
+            json.dumps({
+                'beauty_title': 'пер. ',
+                'title': random_title(self.rng),
+                'user': {
+                    'email': f'bench-submit-{number % 50}@example.com',
+                    'fam': 'Иванов', 'name': 'Иван', 'phone': '+79990000000',
+                },
+                'coords': random_coords(self.rng),
+                'level': random_level(self.rng),
+                'images': [
+                    {'data': self.rng.choice(pictures), 'title': 'Вид на перевал'}
+                    for _ in range(self.options['submit_images'])
+                ],
+            })
+            for number in range(count)
+        ]
+        return lambda client, number: client.post(path, payloads[number], content_type='application/json')
+
+    def prepare_get(self, count):
+        pks = self.sample_pks(MountainPass.objects.all(), count)
+        return lambda client, number: client.get(reverse('submit-data-detail', kwargs={'pk': pks[number % len(pks)]}))
+
+    def prepare_list(self, count):
+        pks = self.sample_pks(MountainPass.objects.all(), count)
+        emails = list(MountainPass.objects.filter(pk__in=pks).values_list('user__email', flat=True).distinct())
+        path, view = reverse('submit-data-list'), self.options['list_view']
+        return lambda client, number: client.get(path, {'user__email': emails[number % len(emails)], 'view': view})
+
+    def prepare_patch(self, count):
+        pks = self.sample_pks(MountainPass.objects.filter(status='new'), count)
+        if not pks:
+            raise CommandError("Нет перевалов в статусе 'new' для сценария patch")
+        payloads = [json.dumps({'title': random_title(self.rng), 'connect': f'Правка {number}'}) for number in range(count)]
+        return lambda client, number: client.patch(
+            reverse('submit-data-detail', kwargs={'pk': pks[number % len(pks)]}),
+            payloads[number], content_type='application/json',
+        )
+
+    def sample_pks(self, queryset, count):
+        """Случайные существующие id без ORDER BY random() по всей таблице"""
+        bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return []
+        candidates = [self.rng.randint(bounds['low'], bounds['high']) for _ in range(min(count, 5000) * 3)]
+        pks = list(queryset.filter(pk__in=candidates).values_list('pk', flat=True))
+        if not pks:
+            pks = list(queryset.values_list('pk', flat=True)[:count])
+        self.rng.shuffle(pks)
+        return pks
+
+    def print_report(self, report):
+        dataset = report['dataset']
+        self.stdout.write(
+            f"Данные: {dataset['passes']} перевалов, {dataset['images']} изображений, {dataset['users']} пользователей; "
+            f"параллельность {report['options']['concurrency']}"
+        )
+        for name, result in report['scenarios'].items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{name:<8} {result['throughput_rps']:8.1f} запр/с  "
+                f"p50 {latency['p50']:7.1f}  p95 {latency['p95']:7.1f}  p99 {latency['p99']:7.1f} мс  "
+                f"SQL/запрос {result['queries_per_request']}  ошибок {result['errors']}"
+            )
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,115 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from project.models import MountainPass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает синхронные (WSGI, пул потоков) и асинхронные (ASGI) представления /submitData/ '
+        'на одних и тех же данных: запросы в секунду и задержки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=['detail', 'list'], default='list')
+        parser.add_argument('--pk', type=int, help='Перевал для detail (по умолчанию - последний добавленный)')
+        parser.add_argument('--email', help='Пользователь для list (по умолчанию - автор последнего перевала)')
+        parser.add_argument('--view', choices=['full', 'summary'], default='summary', help='Представление для list')
+        parser.add_argument('--requests', type=int, default=500, help='Число запросов в каждом режиме')
+        parser.add_argument('--threads', type=int, default=8, help='Потоков WSGI-воркера')
+        parser.add_argument('--concurrency', type=int, default=100, help='Одновременных запросов к ASGI')
+        parser.add_argument('--no-cache', action='store_true', help='Отключить кэш ответов detail')
+
+    def handle(self, *args, **options):
+        latest = MountainPass.objects.select_related('user').first()
+        if latest is None:
+            raise CommandError("Нет перевалов: добавьте данные (например, через /submitData/bulk/)")
+
+        if options['endpoint'] == 'detail':
+            pk = options['pk'] or latest.pk
+            paths = {
+                'sync': reverse('submit-data-detail', kwargs={'pk': pk}),
+                'async': reverse('async-submit-data-detail', kwargs={'pk': pk}),
+            }
+            query = {}
+        else:
+            paths = {'sync': reverse('submit-data-list'), 'async': reverse('async-submit-data-list')}
+            query = {'user__email': options['email'] or latest.user.email, 'view': options['view']}
+
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if options['no_cache']:
+            overrides['CACHES'] = {
+                **settings.CACHES,
+                'bench-dummy': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+            }
+            overrides['PEREVAL_CACHE_ALIAS'] = 'bench-dummy'
+
+        total = options['requests']
+        with override_settings(**overrides):
+            results = [
+                (f"WSGI, {options['threads']} потоков", self.run_wsgi(paths['sync'], query, total, options['threads'])),
+                (f"ASGI sync-представление, {options['concurrency']} одновременно",
+                 asyncio.run(self.run_asgi(paths['sync'], query, total, options['concurrency']))),
+                (f"ASGI async-представление, {options['concurrency']} одновременно",
+                 asyncio.run(self.run_asgi(paths['async'], query, total, options['concurrency']))),
+            ]
+
+        self.stdout.write(f"{options['endpoint']}: {total} запросов в каждом режиме")
+        for name, (elapsed, latencies) in results:
+            self.stdout.write(
+                f"{name:<45} {total / elapsed:8.1f} запр/с  "
+                f"p50 {self.percentile(latencies, 50):7.1f} мс  "
+                f"p95 {self.percentile(latencies, 95):7.1f} мс  "
+                f"max {max(latencies):7.1f} мс"
+            )
+
+    def run_wsgi(self, path, query, total, threads):
+        def worker(count):
+            client = Client()
+            latencies = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = client.get(path, query)
+                latencies.append((time.perf_counter() - started) * 1000)
+                self.check_response(response)
+            return latencies
+
+        counts = [total // threads + (1 if i < total % threads else 0) for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            latencies = [value for chunk in executor.map(worker, counts) for value in chunk]
+        return time.perf_counter() - started, latencies
+
+    async def run_asgi(self, path, query, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path, query)
+                latencies.append((time.perf_counter() - started) * 1000)
+                self.check_response(response)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(total)))
+        return time.perf_counter() - started, latencies
+
+    @staticmethod
+    def check_response(response):
+        if response.status_code != 200:
+            raise CommandError(f"Ответ {response.status_code}: {response.content[:200]!r}")
+
+    @staticmethod
+    def percentile(values, percent):
+        if len(values) < 2:
+            return values[0]
+        return statistics.quantiles(values, n=100)[percent - 1]
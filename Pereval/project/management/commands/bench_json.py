@@ -0,0 +1,110 @@
+import base64
+import io
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from project import renderers
+from project.benchmark import IMAGE_TITLES, make_png, random_coords, random_level, random_title
+from project.parsers import ORJSONParser
+from project.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает JSONRenderer/JSONParser DRF (стандартный json) и ORJSONRenderer/ORJSONParser (orjson) '
+        'на списке перевалов с изображениями в base64: время, МБ/с и совпадение результата'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--passes', type=int, default=20, help='Перевалов в ответе')
+        parser.add_argument('--images', type=int, default=3, help='Изображений у перевала')
+        parser.add_argument('--image-size', type=int, default=100, help='Размер изображения, КБ')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов каждого измерения')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not renderers.is_available():
+            raise CommandError("orjson не установлен: сравнивать не с чем")
+        if min(options['passes'], options['images'], options['repeat']) < 1:
+            raise CommandError("--passes, --images и --repeat должны быть больше 0")
+
+        data = self.make_payload(options)
+        expected = JSONRenderer().render(data)
+        rendered = ORJSONRenderer().render(data)
+        if rendered != expected:
+            raise CommandError("Вывод ORJSONRenderer отличается от JSONRenderer")
+        # Разбор проверяется на теле запроса добавления: данные перевалов без Decimal, UUID и дат
+        body = JSONRenderer().render(data['results'])
+        if ORJSONParser().parse(io.BytesIO(body)) != JSONParser().parse(io.BytesIO(body)):
+            raise CommandError("Результат ORJSONParser отличается от JSONParser")
+
+        megabytes = len(expected) / 1024 / 1024
+        self.stdout.write(
+            f"Ответ: {options['passes']} перевалов по {options['images']} изображения "
+            f"по {options['image_size']} КБ, {megabytes:.1f} МБ JSON; повторов {options['repeat']}"
+        )
+        for operation, baseline, current in (
+            ('render', lambda: JSONRenderer().render(data), lambda: ORJSONRenderer().render(data)),
+            ('parse', lambda: JSONParser().parse(io.BytesIO(body)), lambda: ORJSONParser().parse(io.BytesIO(body))),
+        ):
+            before = self.measure(baseline, options['repeat'])
+            after = self.measure(current, options['repeat'])
+            self.stdout.write(
+                f"{operation:<7} json {before * 1000:8.2f} мс ({megabytes / before:7.1f} МБ/с)   "
+                f"orjson {after * 1000:8.2f} мс ({megabytes / after:7.1f} МБ/с)   быстрее в {before / after:.1f} раза"
+            )
+
+    @staticmethod
+    def make_payload(options):
+        """Полное представление перевалов, как в GET /submitData/, плюс типы, которые кодирует encoder DRF"""
+        rng = random.Random(options['seed'])
+        pictures = [
+            base64.b64encode(make_png(options['image_size'] * 1024, rng)).decode('ascii') for _ in range(4)
+        ]
+        now = timezone.now()
+        results = [
+            {
+                'id': number,
+                'beauty_title': 'пер. ',
+                'title': random_title(rng),
+                'other_titles': 'Перевал «Северный» — Ашу',
+                'connect': '',
+                'add_time': (now - timedelta(days=number)).isoformat(),
+                'user': {'email': f'user{number}@example.com', 'fam': 'Иванов', 'name': 'Иван', 'otc': '', 'phone': '+79990000000'},
+                'coords': random_coords(rng),
+                'level': random_level(rng),
+                'images': [
+                    {'data': rng.choice(pictures), 'title': rng.choice(IMAGE_TITLES), 'size': 1024, 'mime_type': 'image/png',
+                     'width': 100, 'height': 100}
+                    for _ in range(options['images'])
+                ],
+                'status': 'Новый',
+            }
+            for number in range(options['passes'])
+        ]
+        return {
+            'generated': now,
+            'request_id': uuid.UUID(int=rng.getrandbits(128)),
+            'elapsed': timedelta(milliseconds=12),
+            'rating': Decimal('4.50'),
+            'results': results,
+        }
+
+    @staticmethod
+    def measure(function, repeat):
+        """Лучшее время из repeat запусков, с"""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+from django.conf import settings
+
+from project import imaging
+from project.image_variants import build_variants, get_executors
+from project.models import Image
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит недостающие уменьшенные варианты и перцептивные хэши изображений '
+        '(например, для загруженных до их появления)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Изображений в одной пачке')
+        parser.add_argument('--inline', action='store_true', help='Без пула процессов, в текущем процессе')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size должен быть больше 0")
+        if not imaging.is_available():
+            raise CommandError("Для построения вариантов нужен Pillow")
+
+        kinds = list(settings.IMAGE_VARIANTS)
+        image_ids = list(
+            Image.objects.annotate(ready=Count('variants', filter=Q(variants__kind__in=kinds)))
+            .filter(Q(ready__lt=len(kinds)) | Q(phash='')).order_by('pk').values_list('pk', flat=True)
+        )
+        pool = None if options['inline'] else get_executors()[1]
+
+        created = 0
+        for start in range(0, len(image_ids), options['batch_size']):
+            created += build_variants(image_ids[start:start + options['batch_size']], pool)
+            self.stdout.write(f"Обработано изображений: {min(start + options['batch_size'], len(image_ids))} из {len(image_ids)}")
+
+        self.stdout.write(f"Создано вариантов: {created}")
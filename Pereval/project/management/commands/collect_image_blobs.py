@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from project.models import Image, ImageVariant
+from project.storage import get_image_storage
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из хранилища изображения, на которые не ссылается ни одна запись Image или ImageVariant'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Не трогать файлы, записанные позже указанного числа часов назад'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        storage = get_image_storage()
+        threshold = time.time() - options['grace_hours'] * 3600
+        removed = 0
+
+        # Свежие файлы пропускаем: их запись в БД может быть еще не закоммичена
+        candidates = [digest for digest, mtime in storage.iter_blobs() if mtime < threshold]
+        for start in range(0, len(candidates), 1000):
+            batch = candidates[start:start + 1000]
+            referenced = set(
+                Image.objects.filter(sha256__in=batch).values_list('sha256', flat=True)
+            ) | set(
+                ImageVariant.objects.filter(sha256__in=batch).values_list('sha256', flat=True)
+            )
+            for digest in batch:
+                if digest in referenced:
+                    continue
+                if not options['dry_run']:
+                    storage.delete(digest)
+                removed += 1
+
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(f"{action} файлов: {removed}")
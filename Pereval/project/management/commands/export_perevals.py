@@ -0,0 +1,53 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from project.export import FORMATS, export_chunks
+from project.models import MountainPass
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает каталог перевалов в NDJSON (краткое представление API) или CSV потоком: '
+        'память не зависит от числа перевалов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson', help='Формат выгрузки')
+        parser.add_argument(
+            '--status', default='accepted',
+            help="Статус перевалов (new, pending, accepted, rejected) или all - все перевалы"
+        )
+        parser.add_argument('--gzip', action='store_true', help='Сжать выгрузку в gzip')
+        parser.add_argument('--output', help='Файл выгрузки (по умолчанию - стандартный вывод)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.EXPORT_CHUNK_SIZE, help='Перевалов в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size должен быть больше 0")
+
+        queryset = MountainPass.objects.all()
+        if options['status'] != 'all':
+            if options['status'] not in dict(MountainPass.STATUS_CHOICES):
+                raise CommandError(f"Некорректный статус: {options['status']}")
+            queryset = queryset.filter(status=options['status'])
+
+        chunks = export_chunks(queryset, options['format'], options['gzip'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                size = self.write(chunks, f)
+            self.stderr.write(f"Выгружено в {options['output']}: {size} байт")
+        else:
+            self.write(chunks, sys.stdout.buffer)
+
+    @staticmethod
+    def write(chunks, f) -> int:
+        size = 0
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+        f.flush()
+        return size
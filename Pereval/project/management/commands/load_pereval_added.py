@@ -0,0 +1,53 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from project.database_manager import DatabaseManager
+
+
+class Command(BaseCommand):
+    help = 'Загружает перевалы в pereval_added из файла JSON Lines (одна запись в строке)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к файлу или '-' для чтения из stdin")
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей в одном INSERT и транзакции')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size должен быть больше 0")
+
+        source = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        loaded = failed = 0
+        # Номер строки файла по index записи (пустые строки пропускаются); хранятся только записи текущей пачки
+        line_numbers = {}
+        try:
+            records = self._read(source, line_numbers)
+            for result in DatabaseManager().iter_submit_many(records, options['batch_size']):
+                line = line_numbers.pop(result['index'])
+                if result['status'] == 200:
+                    loaded += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f"Строка {line}: {result['message']}")
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        self.stdout.write(f"Загружено: {loaded}, с ошибками: {failed}")
+
+    @staticmethod
+    def _read(source, line_numbers):
+        """Записи из непустых строк; номер строки записи сохраняется в line_numbers[index записи]"""
+        index = 0
+        for number, line in enumerate(source, 1):
+            line = line.strip()
+            if not line:
+                continue
+            line_numbers[index] = number
+            index += 1
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Некорректная строка получит ошибку валидации
+                yield None
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from project.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет ключи Idempotency-Key старше IDEMPOTENCY_KEY_TTL вместе с сохраненными ответами '
+        '(запускать по расписанию, например раз в сутки)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Ключей в одном DELETE')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size должен быть больше 0")
+
+        deleted = purge_expired(options['batch_size'])
+        self.stdout.write(f"Удалено ключей старше {settings.IDEMPOTENCY_KEY_TTL} с: {deleted}")
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from project.changes import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет записи об удаленных перевалах старше CHANGES_TOMBSTONE_TTL: клиенты с более старым курсором '
+        'ленты изменений получают код 410 и выполняют полную синхронизацию (запускать по расписанию)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Записей в одном DELETE')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size должен быть больше 0")
+
+        deleted = purge_tombstones(options['batch_size'])
+        self.stdout.write(f"Удалено записей об удалении старше {settings.CHANGES_TOMBSTONE_TTL} с: {deleted}")
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from project.upload_sessions import purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет сессии возобновляемой загрузки без записи дольше UPLOAD_SESSION_TTL вместе с файлами, '
+        'а также файлы сессий, оставшиеся без записи в БД (запускать по расписанию)'
+    )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(f"Удалено сессий без записи дольше {settings.UPLOAD_SESSION_TTL} с: {deleted}")
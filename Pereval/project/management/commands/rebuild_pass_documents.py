@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from project.documents import rebuild_documents
+from project.models import MountainPass
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает документы перевалов (готовые ответы API в PassDocument): после изменения '
+        'сериализаторов, восстановления базы или для перевалов, добавленных в обход API'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Перевалов в одной пачке')
+        parser.add_argument('--missing', action='store_true', help='Только отсутствующие и устаревшие документы')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size должен быть больше 0")
+
+        queryset = MountainPass.objects.all()
+        if options['missing']:
+            queryset = queryset.exclude(document__updated_at=F('updated_at'))
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+
+        for start in range(0, len(pks), options['batch_size']):
+            rebuild_documents(pks[start:start + options['batch_size']])
+            self.stdout.write(f"Обработано перевалов: {min(start + options['batch_size'], len(pks))} из {len(pks)}")
+
+        self.stdout.write(f"Пересобрано документов: {len(pks)}")
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from project.benchmark import seed_perevals
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу тестовыми перевалами для нагрузочного тестирования (bench_api): '
+        'пользователи, координаты в горных районах, уровни сложности и изображения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Число перевалов')
+        parser.add_argument('--images', type=int, default=3, help='Изображений у каждого перевала')
+        parser.add_argument('--users', type=int, default=1000, help='Число пользователей')
+        parser.add_argument('--distinct-images', type=int, default=32, help='Разных файлов изображений')
+        parser.add_argument('--image-size', type=int, default=100, help='Средний размер изображения, КБ')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Перевалов в одной транзакции')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора (повторяемые данные)')
+
+    def handle(self, *args, **options):
+        for name in ('count', 'users', 'batch_size', 'distinct_images'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} должен быть больше 0")
+
+        started = time.perf_counter()
+
+        def progress(done):
+            self.stdout.write(f"{done}/{options['count']} перевалов, {time.perf_counter() - started:.1f} с")
+
+        created = seed_perevals(
+            options['count'],
+            images_per_pass=options['images'],
+            users=options['users'],
+            distinct_images=options['distinct_images'],
+            image_size=options['image_size'] * 1024,
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            progress=progress,
+        )
+        self.stdout.write(
+            f"Добавлено перевалов: {created['passes']}, изображений: {created['images']}, "
+            f"пользователей: {created['users']} за {time.perf_counter() - started:.1f} с"
+        )
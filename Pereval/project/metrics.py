@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Имя метрики -> (описание, границы корзин)
+HISTOGRAMS = {
+    'pereval_request_duration_seconds': ("Время обработки запроса", TIME_BUCKETS),
+    'pereval_request_db_queries': ("Число SQL-запросов за запрос", QUERY_BUCKETS),
+    'pereval_request_db_duration_seconds': ("Время выполнения SQL-запросов за запрос", TIME_BUCKETS),
+    'pereval_request_serializer_duration_seconds': ("Время сериализации ответа", TIME_BUCKETS),
+    'pereval_response_size_bytes': ("Размер тела ответа", SIZE_BUCKETS),
+}
+
+# Сколько SQL-запросов одного HTTP-запроса запоминать для журнала превышений бюджета
+MAX_LOGGED_QUERIES = 100
+
+_current: ContextVar[Optional['RequestMetrics']] = ContextVar('pereval_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счетчики одного HTTP-запроса"""
+
+    __slots__ = ('view', 'queries', 'db_time', 'serializer_time', 'sql')
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.sql: List[Tuple[float, str]] = []
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus: накопительные корзины, сумма и число наблюдений"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Корзина - первая граница, не меньшая значения; значения больше всех границ попадают только в +Inf
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Метрики запросов процесса: гистограммы по представлениям и счетчик ответов"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._responses: Dict[Tuple[str, str, int], int] = {}
+
+    def record(self, view: str, method: str, status: int, values: Dict[str, float]):
+        with self._lock:
+            for name, value in values.items():
+                histogram = self._histograms.get((name, view))
+                if histogram is None:
+                    histogram = self._histograms[(name, view)] = Histogram(HISTOGRAMS[name][1])
+                histogram.observe(value)
+            key = (view, method, status)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def totals(self, name: str) -> Dict[str, Tuple[float, int]]:
+        """Сумма и число наблюдений метрики по представлениям"""
+        with self._lock:
+            return {
+                view: (histogram.sum, histogram.count)
+                for (metric, view), histogram in self._histograms.items() if metric == name
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._responses.clear()
+
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, (description, _) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, view), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    label = f'view="{_escape(view)}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{label},le="{_format(bound)}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{label}}} {_format(histogram.sum)}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+            lines.append('# HELP pereval_responses_total Число ответов по представлениям, методам и кодам')
+            lines.append('# TYPE pereval_responses_total counter')
+            for (view, method, status), count in sorted(self._responses.items()):
+                lines.append(
+                    f'pereval_responses_total{{view="{_escape(view)}",method="{method}",status="{status}"}} {count}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def measure_serialization(function, *args, **kwargs):
+    """Вызов function с учетом его времени как времени сериализации в метриках текущего запроса"""
+    metrics = _current.get()
+    if metrics is None:
+        return function(*args, **kwargs)
+    started = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+
+
+def serializer_data(serializer):
+    """serializer.data с учетом времени сериализации в метриках текущего запроса"""
+    return measure_serialization(lambda: serializer.data)
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка выполнения SQL (connection.execute_wrapper): число и время запросов текущего HTTP-запроса"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += duration
+        if len(metrics.sql) < MAX_LOGGED_QUERIES:
+            metrics.sql.append((duration, sql))
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def _connection_created(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+class RequestMetricsMiddleware:
+    """
+    Метрики каждого запроса к представлению: время обработки, число и время SQL-запросов,
+    время сериализации и размер ответа. Агрегируются в гистограммы по имени представления
+    (GET /metrics); запросы сверх REQUEST_QUERY_BUDGET или REQUEST_TIME_BUDGET_MS
+    записываются в журнал вместе с SQL
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        # Подключения, открытые до загрузки модуля, не получили сигнал connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view = getattr(view_func, 'view_class', view_func).__name__
+
+    def finish(self, request, response, metrics, duration):
+        if metrics.view is None:
+            # Адрес не сопоставлен ни с одним представлением
+            return
+
+        values = {
+            'pereval_request_duration_seconds': duration,
+            'pereval_request_db_queries': metrics.queries,
+            'pereval_request_db_duration_seconds': metrics.db_time,
+            'pereval_request_serializer_duration_seconds': metrics.serializer_time,
+        }
+        size = response_size(response)
+        if size is not None:
+            values['pereval_response_size_bytes'] = size
+        registry.record(metrics.view, request.method, response.status_code, values)
+
+        query_budget = settings.REQUEST_QUERY_BUDGET
+        time_budget = settings.REQUEST_TIME_BUDGET_MS
+        if metrics.queries > query_budget or duration * 1000 > time_budget:
+            statements = '\n'.join(f'  {elapsed * 1000:8.2f} мс  {sql}' for elapsed, sql in metrics.sql)
+            if metrics.queries > len(metrics.sql):
+                statements += f'\n  ... и еще {metrics.queries - len(metrics.sql)}'
+            logger.warning(
+                "Превышен бюджет запроса %s %s (%s): %d SQL-запросов за %.1f мс (бюджет %d), "
+                "%.1f мс всего (бюджет %d мс)\n%s",
+                request.method, request.get_full_path(), metrics.view, metrics.queries,
+                metrics.db_time * 1000, query_budget, duration * 1000, time_budget, statements
+            )
+
+
+def response_size(response) -> Optional[int]:
+    """Размер тела ответа; для потоковых ответов - только если известен Content-Length"""
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+def metrics_view(request):
+    """GET /metrics - метрики запросов этого процесса в текстовом формате Prometheus"""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,76 @@
+import base64
+
+from django.db import migrations, transaction
+
+from project.storage import decode_base64_image, get_image_storage
+
+BATCH_SIZE = 200
+FIELDS = ['sha256', 'size', 'mime_type', 'width', 'height']
+
+
+def move_images_to_storage(apps, schema_editor):
+    """Перенос base64 из Image.data в хранилище пачками, каждая пачка в своей транзакции"""
+    Image = apps.get_model('project', 'Image')
+    db_alias = schema_editor.connection.alias
+    storage = get_image_storage()
+    last_pk = 0
+
+    while True:
+        with transaction.atomic(using=db_alias):
+            batch = list(
+                Image.objects.using(db_alias)
+                .filter(pk__gt=last_pk, sha256='')
+                .order_by('pk')
+                .only('pk', 'data')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+
+            for image in batch:
+                try:
+                    content = decode_base64_image(image.data)
+                except ValueError:
+                    # Не base64 - сохраняем как есть, чтобы ничего не потерять
+                    content = image.data.encode('utf-8')
+                for field, value in storage.save(content).as_fields().items():
+                    setattr(image, field, value)
+
+            Image.objects.using(db_alias).bulk_update(batch, FIELDS)
+            last_pk = batch[-1].pk
+
+
+def restore_images_from_storage(apps, schema_editor):
+    Image = apps.get_model('project', 'Image')
+    db_alias = schema_editor.connection.alias
+    storage = get_image_storage()
+    last_pk = 0
+
+    while True:
+        with transaction.atomic(using=db_alias):
+            batch = list(
+                Image.objects.using(db_alias)
+                .filter(pk__gt=last_pk)
+                .exclude(sha256='')
+                .order_by('pk')
+                .only('pk', 'sha256')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+
+            for image in batch:
+                image.data = base64.b64encode(storage.read(image.sha256)).decode('ascii')
+
+            Image.objects.using(db_alias).bulk_update(batch, ['data'])
+            last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('project', '0004_image_blob_metadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_images_to_storage, restore_images_from_storage),
+    ]
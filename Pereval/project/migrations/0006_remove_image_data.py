@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0005_move_image_data_to_blob_storage'),
+    ]
+
+    operations = [
+        # blank=True нужен только для отката: колонка вернется с пустым значением по умолчанию
+        migrations.AlterField(
+            model_name='image',
+            name='data',
+            field=models.TextField(blank=True, verbose_name='Данные изображения (base64)'),
+        ),
+        migrations.RemoveField(
+            model_name='image',
+            name='data',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0006_remove_image_data'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='mountainpass',
+            options={'ordering': ['-add_time', '-id'], 'verbose_name': 'Перевал', 'verbose_name_plural': 'Перевалы'},
+        ),
+        migrations.AddIndex(
+            model_name='mountainpass',
+            index=models.Index(fields=['-add_time', '-id'], name='pass_add_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mountainpass',
+            index=models.Index(fields=['status', '-add_time', '-id'], name='pass_status_add_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mountainpass',
+            index=models.Index(fields=['user', '-add_time', '-id'], name='pass_user_add_time_idx'),
+        ),
+    ]
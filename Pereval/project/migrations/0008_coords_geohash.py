@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:43
+
+from django.db import migrations, models, transaction
+
+from project import geo
+
+BATCH_SIZE = 2000
+
+
+def fill_geohash(apps, schema_editor):
+    """Заполнение geohash существующих координат пачками"""
+    Coords = apps.get_model('project', 'Coords')
+    db_alias = schema_editor.connection.alias
+    last_pk = 0
+
+    while True:
+        with transaction.atomic(using=db_alias):
+            batch = list(
+                Coords.objects.using(db_alias)
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('pk', 'latitude', 'longitude')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            # Одно UPDATE на пачку: bulk_update строит CASE на каждую строку и заметно медленнее
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {Coords._meta.db_table} AS c SET geohash = v.geohash
+                    FROM (SELECT unnest(%s::bigint[]) AS id, unnest(%s::text[]) AS geohash) AS v
+                    WHERE c.id = v.id
+                    """,
+                    [
+                        [coords.pk for coords in batch],
+                        [geo.encode(coords.latitude, coords.longitude) for coords in batch],
+                    ]
+                )
+            last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('project', '0007_mountainpass_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coords',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, verbose_name='Geohash'),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='coords',
+            index=models.Index(fields=['geohash'], name='coords_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
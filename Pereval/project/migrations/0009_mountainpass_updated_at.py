@@ -0,0 +1,23 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0008_coords_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mountainpass',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Время изменения'),
+            preserve_default=False,
+        ),
+        # Для существующих записей время изменения неизвестно - считаем его временем добавления
+        migrations.RunSQL(
+            'UPDATE project_mountainpass SET updated_at = add_time',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0009_mountainpass_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('thumbnail', 'Миниатюра'), ('medium', 'Средний размер')], max_length=20, verbose_name='Вариант')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 содержимого')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер, байт')),
+                ('mime_type', models.CharField(max_length=100, verbose_name='MIME-тип')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(verbose_name='Высота')),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='project.image', verbose_name='Изображение')),
+            ],
+            options={
+                'verbose_name': 'Вариант изображения',
+                'verbose_name_plural': 'Варианты изображений',
+                'constraints': [models.UniqueConstraint(fields=('image', 'kind'), name='image_variant_unique_kind')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0010_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='phash',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Перцептивный хэш'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:10
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+
+# Триграммы слов текста как tsvector: индекс GIN по ним заменяет pg_trgm, которого может не быть на сервере.
+# Нарезка должна совпадать с project.search.word_trigrams
+TRIGRAMS_FUNCTION = """
+CREATE OR REPLACE FUNCTION pereval_trigrams(value text) RETURNS tsvector AS $$
+    SELECT coalesce(array_to_tsvector(array_agg(DISTINCT substr(padded, position, 3))), ''::tsvector)
+    FROM (
+        SELECT '  ' || word || ' ' AS padded
+        FROM regexp_split_to_table(replace(lower(value), 'ё', 'е'), '[^[:alnum:]]+') AS word
+        WHERE word <> ''
+    ) AS words, generate_series(1, length(padded) - 2) AS position
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+"""
+
+SEARCH_TRIGGER = """
+CREATE OR REPLACE FUNCTION pereval_search_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.other_titles, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(NEW.beauty_title, '')), 'C');
+    NEW.search_trigrams := pereval_trigrams(concat_ws(' ', NEW.title, NEW.other_titles, NEW.beauty_title));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER pereval_search_update
+    BEFORE INSERT OR UPDATE OF title, beauty_title, other_titles ON project_mountainpass
+    FOR EACH ROW EXECUTE FUNCTION pereval_search_update();
+"""
+
+DROP_SEARCH_TRIGGER = """
+DROP TRIGGER IF EXISTS pereval_search_update ON project_mountainpass;
+DROP FUNCTION IF EXISTS pereval_search_update();
+DROP FUNCTION IF EXISTS pereval_trigrams(text);
+"""
+
+
+def fill_search_fields(apps, schema_editor):
+    """Заполнение поисковых полей существующих перевалов пачками: UPDATE OF title запускает триггер"""
+    MountainPass = apps.get_model('project', 'MountainPass')
+    db_alias = schema_editor.connection.alias
+    table = MountainPass._meta.db_table
+    last_pk = 0
+
+    while True:
+        with transaction.atomic(using=db_alias), schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET title = title
+                WHERE id IN (SELECT id FROM {table} WHERE id > %s ORDER BY id LIMIT %s)
+                RETURNING id
+                """,
+                [last_pk, BATCH_SIZE]
+            )
+            updated = [row[0] for row in cursor.fetchall()]
+        if not updated:
+            break
+        last_pk = max(updated)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('project', '0011_image_phash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mountainpass',
+            name='search_trigrams',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mountainpass',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(TRIGRAMS_FUNCTION + SEARCH_TRIGGER, DROP_SEARCH_TRIGGER),
+        migrations.RunPython(fill_search_fields, migrations.RunPython.noop),
+        # Индексы строятся после заполнения - так быстрее, чем обновлять их на каждой строке
+        migrations.AddIndex(
+            model_name='mountainpass',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='pass_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mountainpass',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_trigrams'], name='pass_search_trigrams_idx'),
+        ),
+    ]
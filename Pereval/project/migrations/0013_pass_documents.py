@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:12
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0012_mountainpass_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PassDocument',
+            fields=[
+                ('mountain_pass', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='project.mountainpass', verbose_name='Перевал')),
+                ('full', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Полное представление')),
+                ('summary', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Краткое представление')),
+                ('image_digests', models.JSONField(default=list, verbose_name='SHA-256 изображений полного представления')),
+                ('updated_at', models.DateTimeField(verbose_name='Время изменения перевала')),
+            ],
+            options={
+                'verbose_name': 'Документ перевала',
+                'verbose_name_plural': 'Документы перевалов',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0013_pass_documents'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mountainpass',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взят на модерацию'),
+        ),
+        migrations.AddField(
+            model_name='mountainpass',
+            name='moderator',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='moderated_passes', to=settings.AUTH_USER_MODEL, verbose_name='Модератор'),
+        ),
+        migrations.AddIndex(
+            model_name='mountainpass',
+            index=models.Index(condition=models.Q(('status__in', ['new', 'pending'])), fields=['add_time', 'id'], name='pass_moderation_queue_idx'),
+        ),
+    ]
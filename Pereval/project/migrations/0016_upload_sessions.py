@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:27
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0015_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255, verbose_name='Название изображения')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Размер файла, байт')),
+                ('offset', models.PositiveBigIntegerField(default=0, verbose_name='Получено байт')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='Ожидаемый SHA-256')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Время изменения')),
+                ('image', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='project.image', verbose_name='Изображение')),
+                ('mountain_pass', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='project.mountainpass', verbose_name='Перевал')),
+            ],
+            options={
+                'verbose_name': 'Сессия загрузки',
+                'verbose_name_plural': 'Сессии загрузки',
+            },
+        ),
+    ]
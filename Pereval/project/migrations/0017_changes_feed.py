@@ -0,0 +1,162 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:31
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 5000
+
+# Номер текущей транзакции (xid8) как bigint: 64 бита с эпохой, не переполняется
+CURRENT_TXID = "pg_current_xact_id()::text::bigint"
+
+CHANGE_TRIGGERS = f"""
+CREATE OR REPLACE FUNCTION pereval_change_mark() RETURNS trigger AS $$
+BEGIN
+    NEW.change_txid := {CURRENT_TXID};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER pereval_change_mark
+    BEFORE INSERT OR UPDATE ON project_mountainpass
+    FOR EACH ROW EXECUTE FUNCTION pereval_change_mark();
+
+CREATE OR REPLACE FUNCTION pereval_change_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO project_passtombstone (mountain_pass_id, user_id, change_txid, deleted_at)
+    SELECT id, user_id, {CURRENT_TXID}, now() FROM changed_rows
+    ON CONFLICT (mountain_pass_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, change_txid = EXCLUDED.change_txid, deleted_at = EXCLUDED.deleted_at;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER pereval_change_tombstone
+    AFTER DELETE ON project_mountainpass
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION pereval_change_tombstone();
+
+-- Изменение изображений и их вариантов - изменение перевала: один UPDATE на оператор,
+-- перевалы, уже измененные в этой транзакции (например, только что созданные), не трогаются
+CREATE OR REPLACE FUNCTION pereval_change_images() RETURNS trigger AS $$
+BEGIN
+    UPDATE project_mountainpass SET updated_at = now()
+    WHERE id IN (SELECT mountain_pass_id FROM changed_rows)
+        AND change_txid IS DISTINCT FROM {CURRENT_TXID};
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION pereval_change_image_variants() RETURNS trigger AS $$
+BEGIN
+    UPDATE project_mountainpass SET updated_at = now()
+    WHERE id IN (
+        SELECT image.mountain_pass_id FROM project_image AS image
+        WHERE image.id IN (SELECT image_id FROM changed_rows)
+    )
+        AND change_txid IS DISTINCT FROM {CURRENT_TXID};
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Триггер с таблицей переходов может обрабатывать только одно событие
+CREATE TRIGGER pereval_change_images_insert
+    AFTER INSERT ON project_image REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION pereval_change_images();
+CREATE TRIGGER pereval_change_images_update
+    AFTER UPDATE ON project_image REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION pereval_change_images();
+CREATE TRIGGER pereval_change_images_delete
+    AFTER DELETE ON project_image REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION pereval_change_images();
+CREATE TRIGGER pereval_change_image_variants_insert
+    AFTER INSERT ON project_imagevariant REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION pereval_change_image_variants();
+CREATE TRIGGER pereval_change_image_variants_update
+    AFTER UPDATE ON project_imagevariant REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION pereval_change_image_variants();
+"""
+
+DROP_CHANGE_TRIGGERS = """
+DROP TRIGGER IF EXISTS pereval_change_image_variants_update ON project_imagevariant;
+DROP TRIGGER IF EXISTS pereval_change_image_variants_insert ON project_imagevariant;
+DROP TRIGGER IF EXISTS pereval_change_images_delete ON project_image;
+DROP TRIGGER IF EXISTS pereval_change_images_update ON project_image;
+DROP TRIGGER IF EXISTS pereval_change_images_insert ON project_image;
+DROP TRIGGER IF EXISTS pereval_change_tombstone ON project_mountainpass;
+DROP TRIGGER IF EXISTS pereval_change_mark ON project_mountainpass;
+DROP FUNCTION IF EXISTS pereval_change_image_variants();
+DROP FUNCTION IF EXISTS pereval_change_images();
+DROP FUNCTION IF EXISTS pereval_change_tombstone();
+DROP FUNCTION IF EXISTS pereval_change_mark();
+"""
+
+
+def fill_change_txid(apps, schema_editor):
+    """Номер транзакции для существующих перевалов пачками: UPDATE запускает триггер pereval_change_mark"""
+    MountainPass = apps.get_model('project', 'MountainPass')
+    db_alias = schema_editor.connection.alias
+    table = MountainPass._meta.db_table
+    last_pk = 0
+
+    while True:
+        with transaction.atomic(using=db_alias), schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET change_txid = NULL
+                WHERE id IN (SELECT id FROM {table} WHERE id > %s ORDER BY id LIMIT %s)
+                RETURNING id
+                """,
+                [last_pk, BATCH_SIZE]
+            )
+            updated = [row[0] for row in cursor.fetchall()]
+        if not updated:
+            break
+        last_pk = max(updated)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('project', '0016_upload_sessions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PassTombstone',
+            fields=[
+                ('mountain_pass_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID перевала')),
+                ('user_id', models.BigIntegerField(verbose_name='ID пользователя')),
+                ('change_txid', models.BigIntegerField(verbose_name='Транзакция удаления')),
+                ('deleted_at', models.DateTimeField(db_index=True, verbose_name='Время удаления')),
+            ],
+            options={
+                'verbose_name': 'Удаленный перевал',
+                'verbose_name_plural': 'Удаленные перевалы',
+            },
+        ),
+        migrations.AddField(
+            model_name='mountainpass',
+            name='change_txid',
+            field=models.BigIntegerField(editable=False, null=True, verbose_name='Транзакция изменения'),
+        ),
+        migrations.AddIndex(
+            model_name='mountainpass',
+            index=models.Index(fields=['change_txid', 'id'], name='pass_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mountainpass',
+            index=models.Index(fields=['user', 'change_txid', 'id'], name='pass_user_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passtombstone',
+            index=models.Index(fields=['change_txid', 'mountain_pass_id'], name='tombstone_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passtombstone',
+            index=models.Index(fields=['user_id', 'change_txid', 'mountain_pass_id'], name='tombstone_user_change_idx'),
+        ),
+        migrations.RunSQL(CHANGE_TRIGGERS, DROP_CHANGE_TRIGGERS),
+        migrations.RunPython(fill_change_txid, migrations.RunPython.noop),
+    ]
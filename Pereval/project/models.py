@@ -1,5 +1,78 @@
-from django.db import models
+import uuid
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
 from django.core.validators import MinValueValidator, MaxValueValidator
+from . import geo, search
+from .storage import get_image_storage
+
+class UserQuerySet(models.QuerySet):
+    # Поля профиля, которые обновляются при повторной отправке данных с тем же email
+    PROFILE_FIELDS = ['fam', 'name', 'otc', 'phone']
+
+    def upsert(self, users_data):
+        """
+        Создание или обновление пользователей по email запросом INSERT ... ON CONFLICT DO UPDATE
+        Строка перезаписывается, только если данные профиля отличаются от сохраненных;
+        поля, которых нет в данных, не меняются. Безопасно при параллельных запросах с одним email.
+        Возвращает {email: (id, 'created' | 'updated' | 'unchanged')}
+        """
+        # Один email может встречаться несколько раз - берем последние данные
+        users_data = {user_data['email']: user_data for user_data in users_data}
+        result = {}
+
+        # Строки с разным набором полей обновляют разные колонки
+        groups = {}
+        for user_data in users_data.values():
+            fields = tuple(field for field in self.PROFILE_FIELDS if field in user_data)
+            groups.setdefault(fields, []).append(user_data)
+        for fields, rows in groups.items():
+            result.update(self._upsert_rows(rows, fields))
+
+        # Неизмененные строки INSERT ... RETURNING не возвращает
+        missing = [email for email in users_data if email not in result]
+        if missing:
+            for pk, email in self.filter(email__in=missing).values_list('pk', 'email'):
+                result[email] = (pk, 'unchanged')
+        return result
+
+    def _upsert_rows(self, rows, update_fields):
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        columns = ['email', *self.PROFILE_FIELDS]
+
+        if update_fields:
+            action = 'DO UPDATE SET {} WHERE ({}) IS DISTINCT FROM ({})'.format(
+                ', '.join(f'{quote(field)} = EXCLUDED.{quote(field)}' for field in update_fields),
+                ', '.join(f'{table}.{quote(field)}' for field in update_fields),
+                ', '.join(f'EXCLUDED.{quote(field)}' for field in update_fields),
+            )
+        else:
+            action = 'DO NOTHING'
+
+        values = ', '.join(['(%s)' % ', '.join(['%s'] * len(columns))] * len(rows))
+        params = [row.get(column, '') for row in rows for column in columns]
+        sql = (
+            f"INSERT INTO {table} ({', '.join(quote(column) for column in columns)}) VALUES {values} "
+            f"ON CONFLICT ({quote('email')}) {action} "
+            # xmax = 0 только у только что вставленной строки
+            f"RETURNING {quote('id')}, {quote('email')}, (xmax = 0)"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {
+                email: (pk, 'created' if created else 'updated')
+                for pk, email, created in cursor.fetchall()
+            }
+
 
 class User(models.Model):
     email = models.EmailField(unique=True, verbose_name='Email')
@@ -8,6 +81,8 @@ class User(models.Model):
     otc = models.CharField(max_length=255, verbose_name='Отчество', blank=True)
     phone = models.CharField(max_length=20, verbose_name='Телефон')
 
+    objects = UserQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
@@ -26,13 +101,30 @@ class Coords(models.Model):
     )
     height = models.IntegerField(verbose_name='Высота')
 
+    # Ячейка сетки для пространственных запросов: поиск по префиксу идет по B-tree индексу
+    geohash = models.CharField(max_length=12, blank=True, editable=False, verbose_name='Geohash')
+
     class Meta:
         verbose_name = 'Координаты'
         verbose_name_plural = 'Координаты'
+        indexes = [
+            models.Index(fields=['geohash'], name='coords_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"({self.latitude}, {self.longitude}, {self.height})"
 
+    def refresh_geohash(self):
+        """Пересчет geohash; bulk_create не вызывает save(), поэтому вызывается и там"""
+        self.geohash = geo.encode(float(self.latitude), float(self.longitude))
+
+    def save(self, *args, **kwargs):
+        self.refresh_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
 class Level(models.Model):
     DIFFICULTY_CHOICES = [
         ('', 'Не указано'),
@@ -61,6 +153,136 @@ class Level(models.Model):
         if self.spring: levels.append(f"Весна: {self.spring}")
         return ", ".join(levels) if levels else "Не указано"
 
+class MountainPassQuerySet(models.QuerySet):
+    def for_api(self):
+        """
+        Выборка для MountainPassSerializer: пользователь, координаты и уровень через JOIN,
+        изображения одним дополнительным запросом на всю выборку
+        """
+        return self.select_related('user', 'coords', 'level').defer(*MountainPass.SEARCH_FIELDS).prefetch_related(
+            models.Prefetch('images', queryset=Image.objects.order_by('pk'))
+        )
+
+    def for_summary(self):
+        """
+        Выборка для краткого представления списков: без описания перевала и пользователя,
+        из изображений и их вариантов - только метаданные
+        """
+        return self.select_related('coords', 'level').only(
+            'id', 'beauty_title', 'title', 'other_titles', 'add_time', 'status',
+            'coords__latitude', 'coords__longitude', 'coords__height',
+            'level__winter', 'level__summer', 'level__autumn', 'level__spring',
+        ).prefetch_related(
+            models.Prefetch('images', queryset=Image.objects.order_by('pk').only(
+                'id', 'mountain_pass', 'title', 'size', 'mime_type', 'width', 'height'
+            )),
+            models.Prefetch('images__variants', queryset=ImageVariant.objects.order_by('pk').only(
+                'id', 'image', 'kind', 'size', 'mime_type', 'width', 'height'
+            )),
+        )
+
+    def with_document(self, kind):
+        """
+        Перевалы вместе с готовым представлением kind ('full' или 'summary') из PassDocument одним запросом
+        Из самого перевала выбираются только ключ выдачи и время изменения (для проверки актуальности документа)
+        """
+        return self.select_related('document').only(
+            'id', 'add_time', 'updated_at',
+            f'document__{kind}', 'document__image_digests', 'document__updated_at',
+        )
+
+    def search(self, text, threshold=None):
+        """
+        Поиск по title, other_titles и beauty_title, у каждого перевала атрибут search_rank
+        Полнотекстовый поиск (tsvector, конфигурация russian) находит словоформы, поиск по триграммам -
+        написание с опечатками; запрос ищется и в транслитерации ("Talgar" -> "талгар").
+        threshold - доля триграмм запроса, которые должны быть в названиях (settings.SEARCH_SIMILARITY_THRESHOLD)
+        """
+        threshold = settings.SEARCH_SIMILARITY_THRESHOLD if threshold is None else threshold
+        variants = search.query_variants(text)
+        if not variants:
+            return self.none()
+
+        query = reduce(or_, (SearchQuery(variant, config='russian', search_type='websearch') for variant in variants))
+        table = self.model._meta.db_table
+        similarities = []
+        for variant in variants:
+            trigrams = sorted(search.trigrams(variant))
+            if trigrams:
+                similarities.append(RawSQL(
+                    f'(SELECT count(*) FROM unnest(tsvector_to_array("{table}"."search_trigrams")) AS trigram '
+                    'WHERE trigram = ANY(%s))::float / %s',
+                    (trigrams, len(trigrams)), output_field=models.FloatField()
+                ))
+        if not similarities:
+            return self.filter(search_vector=query).annotate(search_rank=SearchRank(models.F('search_vector'), query))
+
+        candidates = RawSQL(
+            f'"{table}"."search_trigrams" @@ %s::tsquery', (search.trigram_query(' '.join(variants)),),
+            output_field=models.BooleanField()
+        )
+        return self.alias(
+            search_similarity=Greatest(*similarities) if len(similarities) > 1 else similarities[0],
+        ).filter(
+            models.Q(search_vector=query) | models.Q(candidates, search_similarity__gte=threshold)
+        ).annotate(
+            search_rank=SearchRank(models.F('search_vector'), query) + models.F('search_similarity'),
+        )
+
+    def in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Перевалы внутри прямоугольника координат
+        Сначала отбор по префиксам geohash (индекс), затем точная проверка границ.
+        min_lon > max_lon - прямоугольник через 180-й меридиан
+        """
+        cells = models.Q()
+        for cell in geo.bbox_cells(min_lat, min_lon, max_lat, max_lon):
+            cells |= models.Q(coords__geohash__startswith=cell)
+
+        if min_lon <= max_lon:
+            longitude = models.Q(coords__longitude__gte=min_lon, coords__longitude__lte=max_lon)
+        else:
+            longitude = models.Q(coords__longitude__gte=min_lon) | models.Q(coords__longitude__lte=max_lon)
+
+        return self.filter(cells, longitude, coords__latitude__gte=min_lat, coords__latitude__lte=max_lat)
+
+    def nearest(self, latitude, longitude, k):
+        """
+        k ближайших к точке перевалов (список, у каждого атрибут distance_km)
+        Поиск идет по окрестности 3x3 ячейки geohash, которая расширяется, пока
+        k-й кандидат не окажется ближе гарантированного радиуса окрестности
+        """
+        candidates = None
+        for precision in range(7, 0, -1):
+            cells, radius = geo.neighborhood(latitude, longitude, precision)
+            condition = models.Q()
+            for cell in cells:
+                condition |= models.Q(coords__geohash__startswith=cell)
+            candidates = self._distances(self.filter(condition), latitude, longitude)
+            if len(candidates) >= k and candidates[k - 1][0] <= radius:
+                break
+        else:
+            # Даже самые крупные ячейки не дали k точек - считаем по всей выборке
+            candidates = self._distances(self, latitude, longitude)
+
+        nearest = candidates[:k]
+        passes = self.in_bulk([pk for _, pk in nearest])
+        result = []
+        for distance, pk in nearest:
+            mountain_pass = passes[pk]
+            mountain_pass.distance_km = distance
+            result.append(mountain_pass)
+        return result
+
+    @staticmethod
+    def _distances(queryset, latitude, longitude):
+        rows = queryset.order_by().values_list('pk', 'coords__latitude', 'coords__longitude')
+        return sorted(
+            (geo.haversine_km(latitude, longitude, row_lat, row_lon), pk)
+            for pk, row_lat, row_lon in rows
+        )
+
+
 class MountainPass(models.Model):
     STATUS_CHOICES = [
         ('new', 'Новый'),
@@ -74,6 +296,7 @@ class MountainPass(models.Model):
     other_titles = models.CharField(max_length=255, blank=True, verbose_name='Другие названия')
     connect = models.TextField(blank=True, verbose_name='Что соединяет')
     add_time = models.DateTimeField(auto_now_add=True, verbose_name='Время добавления')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Время изменения')
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь')
     coords = models.OneToOneField(Coords, on_delete=models.CASCADE, verbose_name='Координаты')
@@ -85,11 +308,44 @@ class MountainPass(models.Model):
         default='new',
         verbose_name='Статус модерации'
     )
+    # Модератор, который взял перевал из очереди (status = 'pending') или принял решение по нему
+    moderator = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='moderated_passes', verbose_name='Модератор'
+    )
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name='Взят на модерацию')
+
+    # Поисковые поля заполняет триггер pereval_search_update (миграция 0012) при записи названий
+    search_vector = SearchVectorField(null=True, editable=False)
+    search_trigrams = SearchVectorField(null=True, editable=False)
+    SEARCH_FIELDS = ['search_vector', 'search_trigrams']
+
+    # Номер транзакции (pg_current_xact_id), которая последней изменила перевал или его изображения,
+    # - ключ ленты изменений (project.changes). Заполняет триггер pereval_change_mark (миграция 0017)
+    change_txid = models.BigIntegerField(null=True, editable=False, verbose_name='Транзакция изменения')
+
+    objects = MountainPassQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Перевал'
         verbose_name_plural = 'Перевалы'
-        ordering = ['-add_time']
+        ordering = ['-add_time', '-id']
+        indexes = [
+            # Ключ постраничной выдачи (add_time, id) - общий список и выборки по статусу и пользователю
+            models.Index(fields=['-add_time', '-id'], name='pass_add_time_id_idx'),
+            models.Index(fields=['status', '-add_time', '-id'], name='pass_status_add_time_idx'),
+            models.Index(fields=['user', '-add_time', '-id'], name='pass_user_add_time_idx'),
+            # Очередь модерации: только необработанные перевалы, от старых к новым
+            models.Index(
+                fields=['add_time', 'id'], name='pass_moderation_queue_idx',
+                condition=models.Q(status__in=['new', 'pending'])
+            ),
+            # Лента изменений: общая и по пользователю
+            models.Index(fields=['change_txid', 'id'], name='pass_change_idx'),
+            models.Index(fields=['user', 'change_txid', 'id'], name='pass_user_change_idx'),
+            GinIndex(fields=['search_vector'], name='pass_search_vector_idx'),
+            GinIndex(fields=['search_trigrams'], name='pass_search_trigrams_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
@@ -101,12 +357,160 @@ class Image(models.Model):
         related_name='images',
         verbose_name='Перевал'
     )
-    data = models.TextField(verbose_name='Данные изображения (base64)')
     title = models.CharField(max_length=255, verbose_name='Название изображения')
 
+    # Само изображение лежит в хранилище (project.storage), в строке только метаданные
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name='SHA-256 содержимого')
+    size = models.PositiveIntegerField(verbose_name='Размер, байт')
+    mime_type = models.CharField(max_length=100, verbose_name='MIME-тип')
+    width = models.PositiveIntegerField(null=True, blank=True, verbose_name='Ширина')
+    height = models.PositiveIntegerField(null=True, blank=True, verbose_name='Высота')
+    # dHash для поиска повторно сжатых копий; заполняется при построении вариантов или при сравнении
+    phash = models.CharField(max_length=16, blank=True, editable=False, verbose_name='Перцептивный хэш')
+
     class Meta:
         verbose_name = 'Изображение'
         verbose_name_plural = 'Изображения'
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    def read_content(self) -> bytes:
+        """Содержимое изображения из хранилища"""
+        return get_image_storage().read(self.sha256)
+
+class ImageVariant(models.Model):
+    """Уменьшенная копия изображения (без EXIF), строится в фоне после загрузки"""
+    KIND_CHOICES = [
+        ('thumbnail', 'Миниатюра'),
+        ('medium', 'Средний размер'),
+    ]
+
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='variants', verbose_name='Изображение')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='Вариант')
+
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name='SHA-256 содержимого')
+    size = models.PositiveIntegerField(verbose_name='Размер, байт')
+    mime_type = models.CharField(max_length=100, verbose_name='MIME-тип')
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+
+    class Meta:
+        verbose_name = 'Вариант изображения'
+        verbose_name_plural = 'Варианты изображений'
+        constraints = [
+            models.UniqueConstraint(fields=['image', 'kind'], name='image_variant_unique_kind'),
+        ]
+
+    def __str__(self):
+        return f"{self.image} ({self.get_kind_display()})"
+
+class PassDocument(models.Model):
+    """
+    Готовое представление перевала для чтения (project.documents): ответ API без обращения к связанным
+    таблицам и сериализаторам. Содержимое изображений не хранится - только их SHA-256 в порядке выдачи
+    """
+    mountain_pass = models.OneToOneField(
+        MountainPass,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Перевал'
+    )
+    full = models.JSONField(encoder=DjangoJSONEncoder, verbose_name='Полное представление')
+    summary = models.JSONField(encoder=DjangoJSONEncoder, verbose_name='Краткое представление')
+    image_digests = models.JSONField(default=list, verbose_name='SHA-256 изображений полного представления')
+    # updated_at перевала, из которого собран документ
+    updated_at = models.DateTimeField(verbose_name='Время изменения перевала')
+
+    class Meta:
+        verbose_name = 'Документ перевала'
+        verbose_name_plural = 'Документы перевалов'
+
+    def __str__(self):
+        return f"Документ перевала {self.mountain_pass_id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ключ идемпотентности запроса (заголовок Idempotency-Key) и ответ на него (project.idempotency)
+    Повтор запроса с тем же ключом в течение IDEMPOTENCY_KEY_TTL получает сохраненный ответ
+    """
+    # Метод API, к которому относится ключ: ключи разных методов не пересекаются
+    scope = models.CharField(max_length=50, verbose_name='Метод')
+    key = models.CharField(max_length=255, verbose_name='Ключ')
+    # SHA-256 тела запроса: тот же ключ с другими данными - ошибка клиента
+    fingerprint = models.CharField(max_length=64, verbose_name='Хэш запроса')
+    status_code = models.PositiveSmallIntegerField(null=True, verbose_name='Код ответа')
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder, verbose_name='Ответ')
+    created_at = models.DateTimeField(db_index=True, verbose_name='Время запроса')
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}: {self.key}"
+
+
+class UploadSession(models.Model):
+    """
+    Возобновляемая загрузка изображения перевала (project.upload_sessions)
+    Байты приходят частями (PUT с Content-Range) и пишутся в файл на диске; offset - сколько уже получено.
+    После завершения файл переносится в хранилище и становится изображением перевала
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    mountain_pass = models.ForeignKey(
+        MountainPass,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name='Перевал'
+    )
+    title = models.CharField(max_length=255, verbose_name='Название изображения')
+    size = models.PositiveBigIntegerField(verbose_name='Размер файла, байт')
+    offset = models.PositiveBigIntegerField(default=0, verbose_name='Получено байт')
+    # SHA-256, который клиент посчитал у себя: проверяется при завершении
+    sha256 = models.CharField(max_length=64, blank=True, verbose_name='Ожидаемый SHA-256')
+    image = models.OneToOneField(
+        Image,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Изображение'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
+    # Время последней записи: сессии без активности дольше UPLOAD_SESSION_TTL удаляются
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Время изменения')
+
+    class Meta:
+        verbose_name = 'Сессия загрузки'
+        verbose_name_plural = 'Сессии загрузки'
+
+    def __str__(self):
+        return f"{self.title}: {self.offset} из {self.size} байт"
+
+
+class PassTombstone(models.Model):
+    """
+    Запись об удаленном перевале для ленты изменений (project.changes): клиент удаляет его у себя
+    Создается триггером pereval_change_tombstone при удалении перевала, хранится CHANGES_TOMBSTONE_TTL
+    """
+    mountain_pass_id = models.BigIntegerField(primary_key=True, verbose_name='ID перевала')
+    user_id = models.BigIntegerField(verbose_name='ID пользователя')
+    change_txid = models.BigIntegerField(verbose_name='Транзакция удаления')
+    deleted_at = models.DateTimeField(db_index=True, verbose_name='Время удаления')
+
+    class Meta:
+        verbose_name = 'Удаленный перевал'
+        verbose_name_plural = 'Удаленные перевалы'
+        indexes = [
+            models.Index(fields=['change_txid', 'mountain_pass_id'], name='tombstone_change_idx'),
+            models.Index(fields=['user_id', 'change_txid', 'mountain_pass_id'], name='tombstone_user_change_idx'),
+        ]
+
+    def __str__(self):
+        return f"Перевал {self.mountain_pass_id} удален {self.deleted_at}"
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import invalidate_passes
+from .documents import refresh_documents
+from .events import publish_status_changes
+from .models import MountainPass
+
+# Статусы перевалов в очереди модерации (частичный индекс pass_moderation_queue_idx)
+QUEUE_STATUSES = ('new', 'pending')
+
+# Из какого статуса в какие можно перевести перевал
+TRANSITIONS = {
+    'new': {'pending', 'accepted', 'rejected'},
+    'pending': {'new', 'accepted', 'rejected'},
+}
+
+
+def check_transition(source: str, target: str):
+    """ValueError, если переход между статусами не разрешен"""
+    statuses = dict(MountainPass.STATUS_CHOICES)
+    for value in (source, target):
+        if value not in statuses:
+            raise ValueError(f"Некорректный статус: {value}")
+    if target not in TRANSITIONS.get(source, ()):
+        raise ValueError(f"Переход из статуса '{source}' в '{target}' запрещен")
+
+
+def claimable_passes():
+    """
+    Перевалы, которые можно взять на модерацию: новые и взятые дольше
+    MODERATION_CLAIM_TIMEOUT секунд назад (модератор не принял решение), от старых к новым
+    """
+    expired = timezone.now() - timedelta(seconds=settings.MODERATION_CLAIM_TIMEOUT)
+    return MountainPass.objects.filter(
+        Q(status='new') | Q(status='pending') & (Q(claimed_at__lt=expired) | Q(claimed_at__isnull=True))
+    ).order_by('add_time', 'id')
+
+
+def claim_passes(moderator, limit: int) -> List[int]:
+    """
+    Взять на модерацию до limit перевалов: статус 'pending', модератор и время
+    Строки выбираются с FOR UPDATE SKIP LOCKED - модераторы, которые берут работу одновременно,
+    получают разные перевалы и не ждут друг друга. Возвращает id взятых перевалов
+    """
+    with transaction.atomic():
+        rows = list(claimable_passes().select_for_update(skip_locked=True).values_list('pk', 'user_id')[:limit])
+        pks = [pk for pk, _ in rows]
+        if pks:
+            now = timezone.now()
+            MountainPass.objects.filter(pk__in=pks).update(
+                status='pending', moderator=moderator, claimed_at=now, updated_at=now
+            )
+            passes_changed(pks)
+            publish_status_changes(rows, 'pending')
+    return pks
+
+
+def transition_passes(pks: Iterable[int], source: str, target: str, moderator=None,
+                      claimed_by: Optional[int] = None) -> List[int]:
+    """
+    Перевод перевалов из статуса source в target одним UPDATE ... WHERE id IN (...) AND status = source
+    Перевалы, статус которых уже изменил кто-то другой, не затрагиваются (оптимистичная блокировка).
+    claimed_by - id модератора, который должен был взять перевалы из статуса 'pending'.
+    Возвращает id измененных перевалов
+    """
+    check_transition(source, target)
+    pks = sorted(set(pks))
+    if not pks:
+        return []
+
+    now = timezone.now()
+    moderator_id = getattr(moderator, 'pk', None)
+    if target == 'new':
+        # Возврат в очередь: перевал снова свободен
+        assignments, values = 'moderator_id = NULL, claimed_at = NULL', []
+    elif target == 'pending':
+        assignments, values = 'moderator_id = %s, claimed_at = %s', [moderator_id, now]
+    else:
+        # Решение: модератор - тот, кто его принял
+        assignments, values = 'moderator_id = %s', [moderator_id]
+
+    conditions, params = 'id = ANY(%s) AND status = %s', [pks, source]
+    if claimed_by is not None and source == 'pending':
+        conditions += ' AND moderator_id = %s'
+        params.append(claimed_by)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {MountainPass._meta.db_table} SET status = %s, updated_at = %s, {assignments} "
+            f"WHERE {conditions} RETURNING id, user_id",
+            [target, now, *values, *params]
+        )
+        rows = sorted(cursor.fetchall())
+        updated = [pk for pk, _ in rows]
+        passes_changed(updated)
+        publish_status_changes(rows, target)
+    return updated
+
+
+def passes_changed(pks: List[int]):
+    """Массовый UPDATE не отправляет post_save: кэш и документы перевалов обновляем сами"""
+    if pks:
+        invalidate_passes(pks)
+        refresh_documents(pks)
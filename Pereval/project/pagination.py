@@ -0,0 +1,129 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничная выдача по ключу (add_time, id) в порядке убывания, без OFFSET
+    Курсор хранит ключ последней записи страницы, следующая страница - записи строго после него.
+    Запрос идет по индексу (add_time, id), поэтому стоимость не зависит от номера страницы
+    """
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = self.order_queryset(queryset)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self.filter_after(queryset, self.decode_cursor(cursor))
+
+        # Одна лишняя запись показывает, есть ли следующая страница
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def order_queryset(self, queryset):
+        return queryset.order_by('-add_time', '-id')
+
+    def filter_after(self, queryset, key):
+        """Записи строго после ключа последней записи предыдущей страницы"""
+        add_time, pk = key
+        # add_time <= X позволяет идти по индексу диапазоном, остальное - фильтр внутри диапазона
+        return queryset.filter(Q(add_time__lte=add_time) & (Q(add_time__lt=add_time) | Q(id__lt=pk)))
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            page_size = int(value)
+        except ValueError:
+            raise ValueError(f"Некорректный параметр {self.page_size_query_param}: {value}")
+        if page_size < 1:
+            raise ValueError(f"Параметр {self.page_size_query_param} должен быть больше 0")
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    @staticmethod
+    def encode_cursor(obj) -> str:
+        raw = f"{obj.add_time.isoformat()}|{obj.pk}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            add_time, pk = raw.rsplit('|', 1)
+            return datetime.fromisoformat(add_time), int(pk)
+        except (ValueError, UnicodeError):
+            raise ValueError("Некорректный курсор")
+
+
+class QueuePagination(KeysetPagination):
+    """Очередь модерации по ключу (add_time, id) в порядке возрастания: сначала давно ожидающие"""
+
+    def order_queryset(self, queryset):
+        return queryset.order_by('add_time', 'id')
+
+    def filter_after(self, queryset, key):
+        add_time, pk = key
+        return queryset.filter(Q(add_time__gte=add_time) & (Q(add_time__gt=add_time) | Q(id__gt=pk)))
+
+
+class RankPagination(KeysetPagination):
+    """
+    Постраничная выдача результатов поиска по ключу (search_rank, id) в порядке убывания
+    Все совпадения все равно ранжируются целиком, но страницы не сдвигаются при добавлении перевалов
+    """
+    page_size = 20
+    max_page_size = 100
+
+    def order_queryset(self, queryset):
+        return queryset.order_by('-search_rank', '-id')
+
+    def filter_after(self, queryset, key):
+        rank, pk = key
+        return queryset.filter(Q(search_rank__lt=rank) | Q(search_rank=rank, id__lt=pk))
+
+    @staticmethod
+    def encode_cursor(obj) -> str:
+        # repr float восстанавливается без потерь, сравнение с рангом в БД точное
+        raw = f"{obj.search_rank!r}|{obj.pk}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            rank, pk = raw.rsplit('|', 1)
+            return float(rank), int(pk)
+        except (ValueError, UnicodeError):
+            raise ValueError("Некорректный курсор")
+
+
+class ChangesPagination(KeysetPagination):
+    """Размер страницы ленты изменений (параметр limit); курсор ленты - project.changes.ChangesCursor"""
+    page_size = 100
+    max_page_size = 500
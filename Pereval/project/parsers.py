@@ -0,0 +1,43 @@
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import json
+
+from .renderers import ORJSONRenderer, orjson
+
+
+def loads(content):
+    """
+    JSON из bytes или str; ValueError при ошибке. Числа с дробной частью - float, как у json.loads
+    NaN и Infinity не принимаются (STRICT_JSON). Без orjson - через стандартный json
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Текст ошибки и редкие случаи, которых нет в orjson (целые больше 64 бит), - как у json
+            pass
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    return json.loads(content)
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser на orjson: тело запроса с base64 изображений разбирается в несколько раз быстрее
+    Тело не в UTF-8, STRICT_JSON = False или отсутствие orjson - разбор через JSONParser
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,80 @@
+import re
+from typing import List, Set
+
+# Транслитерация (упрощенная ГОСТ 7.79-2000, вариант Б): пользователи ищут "Talgar" вместо "Талгар"
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's',
+    'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+LATIN_TO_CYRILLIC = {
+    'shch': 'щ', 'zh': 'ж', 'kh': 'х', 'ts': 'ц', 'ch': 'ч', 'sh': 'ш', 'yu': 'ю', 'ya': 'я',
+    'yo': 'е', 'a': 'а', 'b': 'б', 'c': 'к', 'd': 'д', 'e': 'е', 'f': 'ф', 'g': 'г', 'h': 'х',
+    'i': 'и', 'j': 'й', 'k': 'к', 'l': 'л', 'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'q': 'к',
+    'r': 'р', 's': 'с', 't': 'т', 'u': 'у', 'v': 'в', 'w': 'в', 'x': 'кс', 'y': 'ы', 'z': 'з',
+}
+_LATIN_RE = re.compile('|'.join(sorted(LATIN_TO_CYRILLIC, key=len, reverse=True)))
+_WORD_SPLIT_RE = re.compile(r'[\W_]+')
+
+# Триграмма - три символа слова, дополненного двумя пробелами в начале и одним в конце (как в pg_trgm).
+# Та же нарезка выполняется в БД функцией pereval_trigrams (миграция 0012) - их нужно менять вместе
+TRIGRAM_PADDING = ('  ', ' ')
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е"""
+    return text.lower().replace('ё', 'е')
+
+
+def transliterate(text: str) -> str:
+    """
+    Вариант написания другим алфавитом: кириллица -> латиница, латиница -> кириллица
+    Текст без букв нужного алфавита возвращается как есть
+    """
+    text = normalize(text)
+    if any(char in CYRILLIC_TO_LATIN for char in text):
+        return ''.join(CYRILLIC_TO_LATIN.get(char, char) for char in text)
+    return _LATIN_RE.sub(lambda match: LATIN_TO_CYRILLIC[match.group()], text)
+
+
+def query_variants(text: str) -> List[str]:
+    """Варианты поискового запроса: как введен и в транслитерации"""
+    variants = [normalize(text).strip()]
+    translated = transliterate(text).strip()
+    if translated != variants[0]:
+        variants.append(translated)
+    return [variant for variant in variants if variant]
+
+
+def words(text: str) -> List[str]:
+    return [word for word in _WORD_SPLIT_RE.split(normalize(text)) if word]
+
+
+def word_trigrams(word: str) -> List[str]:
+    """Триграммы слова по порядку"""
+    padded = TRIGRAM_PADDING[0] + word + TRIGRAM_PADDING[1]
+    return [padded[start:start + 3] for start in range(len(padded) - 2)]
+
+
+def trigrams(text: str) -> Set[str]:
+    return {trigram for word in words(text) for trigram in word_trigrams(word)}
+
+
+def trigram_query(text: str) -> str:
+    """
+    tsquery для отбора кандидатов по индексу триграмм: любая пара соседних триграмм одного слова
+    Опечатка портит не больше трех триграмм подряд, поэтому у слов от четырех букв
+    хотя бы одна пара сохраняется, а строки с единственной общей частой триграммой не отбираются
+    """
+    groups = []
+    for word in words(text):
+        sequence = word_trigrams(word)
+        if len(sequence) == 1:
+            groups.append(_quote(sequence[0]))
+        groups.extend(f'{_quote(first)} & {_quote(second)}' for first, second in zip(sequence, sequence[1:]))
+    return ' | '.join(f'({group})' for group in dict.fromkeys(groups))
+
+
+def _quote(lexeme: str) -> str:
+    return "'" + lexeme.replace('\\', '\\\\').replace("'", "''") + "'"
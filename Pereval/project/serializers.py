@@ -1,10 +1,76 @@
+import base64
+import hashlib
+
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
+from . import imaging
+from .documents import refresh_documents
+from .image_variants import schedule_variants
 from .models import User, Coords, Level, MountainPass, Image
+from .signals import touch_passes
+from .storage import decode_base64_image, get_image_storage, store_image
+from .uploads import UploadedBlob
+
+
+class Base64ImageField(serializers.Field):
+    """
+    Изображение в base64: при записи декодируется в байты (ключ 'content'),
+    при чтении берется из хранилища по хэшу.
+    Файл из multipart-запроса уже лежит в хранилище и передается как есть (ключ 'blob')
+    """
+    default_error_messages = {
+        'invalid': 'Некорректные данные изображения: ожидается строка base64.',
+    }
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedBlob):
+            return {'blob': data.blob}
+        if not isinstance(data, str):
+            self.fail('invalid')
+        try:
+            return {'content': decode_base64_image(data)}
+        except ValueError:
+            self.fail('invalid')
+
+    def to_representation(self, image):
+        if not self.context.get('embed_images', True):
+            # Документ перевала (project.documents) хранит только хэш, содержимое подставляется при выдаче
+            return None
+        return base64.b64encode(image.read_content()).decode('ascii')
+
+
+def image_fields(image_data):
+    """Сохраняет содержимое изображения в хранилище и возвращает поля для модели Image"""
+    image_data = dict(image_data)
+    blob = image_data.pop('blob', None) or store_image(image_data.pop('content'))
+    return {**image_data, **blob.as_fields()}
+
+
+def image_digest(image_data):
+    """SHA-256 содержимого входящего изображения, без записи в хранилище"""
+    if 'blob' in image_data:
+        return image_data['blob'].sha256
+    return hashlib.sha256(image_data['content']).hexdigest()
+
+
+def image_content(image_data):
+    """Содержимое входящего изображения (файл из multipart уже лежит в хранилище)"""
+    if 'blob' in image_data:
+        return get_image_storage().read(image_data['blob'].sha256)
+    return image_data['content']
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['email', 'fam', 'name', 'otc', 'phone']
+        # Пользователь с существующим email обновляется при добавлении перевала, а не отклоняется
+        extra_kwargs = {'email': {'validators': []}}
 
 class CoordsSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,9 +83,77 @@ class LevelSerializer(serializers.ModelSerializer):
         fields = ['winter', 'summer', 'autumn', 'spring']
 
 class ImageSerializer(serializers.ModelSerializer):
+    data = Base64ImageField()
+
     class Meta:
         model = Image
-        fields = ['data', 'title']
+        fields = ['data', 'title', 'size', 'mime_type', 'width', 'height']
+        read_only_fields = ['size', 'mime_type', 'width', 'height']
+
+class ImageUpdateSerializer(ImageSerializer):
+    """
+    Изображение в PATCH: новое (data и title) или уже сохраненное у перевала (id),
+    содержимое которого передавать заново не нужно
+    """
+    id = serializers.IntegerField(required=False)
+    data = Base64ImageField(required=False)
+
+    class Meta(ImageSerializer.Meta):
+        fields = ['id'] + ImageSerializer.Meta.fields
+        extra_kwargs = {'title': {'required': False}}
+
+    def validate(self, attrs):
+        if 'id' not in attrs:
+            if 'content' not in attrs and 'blob' not in attrs:
+                raise serializers.ValidationError({'data': 'Обязательное поле, если не указан id.'})
+            if 'title' not in attrs:
+                raise serializers.ValidationError({'title': 'Обязательное поле, если не указан id.'})
+        return attrs
+
+class MountainPassBulkCreateSerializer(serializers.ListSerializer):
+    """Создание пачки перевалов: по одному bulk-запросу на каждую модель"""
+
+    def create(self, validated_data):
+        # Один запрос на всех пользователей пачки; неизмененные профили не перезаписываются
+        users = User.objects.upsert(item['user'] for item in validated_data)
+        user_ids = {email: pk for email, (pk, _) in users.items()}
+
+        coords = [Coords(**item['coords']) for item in validated_data]
+        for item_coords in coords:
+            item_coords.refresh_geohash()
+        coords = Coords.objects.bulk_create(coords)
+        levels = Level.objects.bulk_create([Level(**item['level']) for item in validated_data])
+
+        pass_fields = ['user', 'coords', 'level', 'images']
+        mountain_passes = MountainPass.objects.bulk_create([
+            MountainPass(
+                user_id=user_ids[item['user']['email']],
+                coords=item_coords,
+                level=item_level,
+                **{key: value for key, value in item.items() if key not in pass_fields}
+            )
+            for item, item_coords, item_level in zip(validated_data, coords, levels)
+        ])
+
+        images = Image.objects.bulk_create([
+            Image(mountain_pass=mountain_pass, **image_fields(image_data))
+            for item, mountain_pass in zip(validated_data, mountain_passes)
+            for image_data in item.get('images', [])
+        ])
+        # bulk_create не отправляет post_save, варианты изображений и документы перевалов ставим в очередь сами
+        schedule_variants(image.pk for image in images)
+        refresh_documents(mountain_pass.pk for mountain_pass in mountain_passes)
+
+        # upsert и bulk_create не отправляют сигналы: данные пользователей изменились и у их прежних перевалов
+        updated_users = [pk for pk, user_status in users.values() if user_status == 'updated']
+        if updated_users:
+            touch_passes(
+                MountainPass.objects.filter(user_id__in=updated_users)
+                .exclude(pk__in=[mountain_pass.pk for mountain_pass in mountain_passes])
+            )
+
+        return mountain_passes
+
 
 class MountainPassCreateSerializer(serializers.ModelSerializer):
     user = UserSerializer()
@@ -33,6 +167,7 @@ class MountainPassCreateSerializer(serializers.ModelSerializer):
             'beauty_title', 'title', 'other_titles', 'connect',
             'user', 'coords', 'level', 'images'
         ]
+        list_serializer_class = MountainPassBulkCreateSerializer
 
     def create(self, validated_data):
         user_data = validated_data.pop('user')
@@ -40,28 +175,25 @@ class MountainPassCreateSerializer(serializers.ModelSerializer):
         level_data = validated_data.pop('level')
         images_data = validated_data.pop('images', [])
 
-        user, created = User.objects.get_or_create(
-            email=user_data['email'],
-            defaults=user_data
-        )
-        if not created:
-            for attr, value in user_data.items():
-                setattr(user, attr, value)
-            user.save()
+        # Один запрос; профиль перезаписывается, только если он изменился
+        user_id, user_status = User.objects.upsert([user_data])[user_data['email']]
+        if user_status == 'updated':
+            # Сигналы не отправляются: сбрасываем кэш прежних перевалов пользователя сами
+            touch_passes(MountainPass.objects.filter(user_id=user_id))
 
         coords = Coords.objects.create(**coords_data)
 
         level = Level.objects.create(**level_data)
 
         mountain_pass = MountainPass.objects.create(
-            user=user,
+            user_id=user_id,
             coords=coords,
             level=level,
             **validated_data
         )
 
         for image_data in images_data:
-            Image.objects.create(mountain_pass=mountain_pass, **image_data)
+            Image.objects.create(mountain_pass=mountain_pass, **image_fields(image_data))
 
         return mountain_pass
 
@@ -80,10 +212,74 @@ class MountainPassSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'add_time', 'status', 'user']
 
+def image_url(image_id, context, variant=None):
+    """Ссылка на содержимое изображения (или его варианта); абсолютная, если известен запрос"""
+    url = reverse('image-content', kwargs={'pk': image_id})
+    if variant:
+        url = f'{url}?variant={variant}'
+    request = context.get('request')
+    return request.build_absolute_uri(url) if request else url
+
+
+class ImageSummarySerializer(serializers.ModelSerializer):
+    """
+    Изображение без содержимого: метаданные и ссылка на файл,
+    а также уже построенные уменьшенные варианты (thumbnail, medium)
+    """
+    url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Image
+        fields = ['id', 'title', 'size', 'mime_type', 'width', 'height', 'url', 'variants']
+
+    def get_url(self, image):
+        return image_url(image.pk, self.context)
+
+    def get_variants(self, image):
+        return {
+            variant.kind: {
+                'url': image_url(image.pk, self.context, variant.kind),
+                'size': variant.size,
+                'mime_type': variant.mime_type,
+                'width': variant.width,
+                'height': variant.height,
+            }
+            for variant in image.variants.all()
+        }
+
+
+class MountainPassSummarySerializer(serializers.ModelSerializer):
+    """Краткое представление перевала для списков (view=summary)"""
+    coords = CoordsSerializer(read_only=True)
+    level = LevelSerializer(read_only=True)
+    images = ImageSummarySerializer(many=True, read_only=True)
+    status = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = MountainPass
+        fields = [
+            'id', 'beauty_title', 'title', 'other_titles',
+            'add_time', 'coords', 'level', 'images', 'status'
+        ]
+
+
+class MountainPassLocationSerializer(serializers.ModelSerializer):
+    """Перевал как точка на карте: без пользователя и изображений"""
+    coords = CoordsSerializer(read_only=True)
+    status = serializers.CharField(source='get_status_display', read_only=True)
+    # Есть только в выдаче ближайших перевалов
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = MountainPass
+        fields = ['id', 'beauty_title', 'title', 'status', 'coords', 'distance_km']
+
+
 class MountainPassUpdateSerializer(serializers.ModelSerializer):
     coords = CoordsSerializer(required=False)
     level = LevelSerializer(required=False)
-    images = ImageSerializer(many=True, required=False)
+    images = ImageUpdateSerializer(many=True, required=False)
 
     class Meta:
         model = MountainPass
@@ -92,6 +288,16 @@ class MountainPassUpdateSerializer(serializers.ModelSerializer):
             'coords', 'level', 'images'
         ]
 
+    def validate_images(self, images):
+        ids = {image['id'] for image in images if 'id' in image}
+        if ids:
+            unknown = ids - set(self.instance.images.filter(pk__in=ids).values_list('pk', flat=True))
+            if unknown:
+                raise serializers.ValidationError(
+                    f"Изображения не принадлежат перевалу: {', '.join(map(str, sorted(unknown)))}"
+                )
+        return images
+
     def update(self, instance, validated_data):
         coords_data = validated_data.pop('coords', None)
         level_data = validated_data.pop('level', None)
@@ -108,12 +314,83 @@ class MountainPassUpdateSerializer(serializers.ModelSerializer):
                 level_serializer.save()
 
         if images_data is not None:
-            instance.images.all().delete()
-            for image_data in images_data:
-                Image.objects.create(mountain_pass=instance, **image_data)
+            self.update_images(instance, images_data)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
 
-        return instance
\ No newline at end of file
+        return instance
+
+    def update_images(self, instance, images_data):
+        """
+        Сравнение присланного списка изображений с сохраненным
+        Изображение остается как есть, если указан его id, совпадает содержимое
+        или это повторно сжатая копия (близкий перцептивный хэш); новые добавляются,
+        отсутствующие в списке удаляются. Уже сохраненное содержимое заново не записывается
+        """
+        unmatched = {image.pk: image for image in instance.images.order_by('pk')}
+        kept = []
+        pending = []
+        seen = set()
+
+        for image_data in images_data:
+            if 'content' not in image_data and 'blob' not in image_data:
+                image = unmatched.pop(image_data['id'], None)
+                if image is not None:
+                    kept.append((image, image_data.get('title')))
+                    seen.add(image.sha256)
+                continue
+
+            digest = image_digest(image_data)
+            if digest in seen:
+                continue
+            seen.add(digest)
+            image = next((image for image in unmatched.values() if image.sha256 == digest), None)
+            if image is not None:
+                kept.append((unmatched.pop(image.pk), image_data.get('title')))
+            else:
+                pending.append(image_data)
+
+        # Повторно сжатые копии ищем, только если у перевала остались несопоставленные изображения
+        new_images = []
+        for image_data in pending:
+            phash = imaging.perceptual_hash(image_content(image_data)) if unmatched else None
+            image = self.find_copy(phash, unmatched) if phash else None
+            if image is not None:
+                kept.append((unmatched.pop(image.pk), image_data.get('title')))
+            else:
+                new_images.append({**image_data, 'phash': phash or ''})
+
+        renamed = []
+        for image, title in kept:
+            if title is not None and title != image.title:
+                image.title = title
+                renamed.append(image)
+        if renamed:
+            Image.objects.bulk_update(renamed, ['title'])
+
+        if unmatched:
+            instance.images.filter(pk__in=list(unmatched)).delete()
+
+        for image_data in new_images:
+            image_data.pop('id', None)
+            Image.objects.create(mountain_pass=instance, **image_fields(image_data))
+
+    @staticmethod
+    def find_copy(phash, candidates):
+        """Сохраненное изображение, перцептивный хэш которого ближе всего к phash (в пределах порога)"""
+        best = None
+        for image in candidates.values():
+            if not image.phash:
+                try:
+                    image.phash = imaging.perceptual_hash(image.read_content()) or ''
+                except OSError:
+                    continue
+                if image.phash:
+                    Image.objects.filter(pk=image.pk).update(phash=image.phash)
+            if image.phash:
+                distance = imaging.hash_distance(phash, image.phash)
+                if distance <= settings.IMAGE_PHASH_DISTANCE and (best is None or distance < best[0]):
+                    best = (distance, image)
+        return best[1] if best else None
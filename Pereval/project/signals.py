@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_passes
+from .documents import refresh_documents
+from .image_variants import schedule_variants
+from .models import Coords, Image, Level, MountainPass, User
+
+
+def touch_passes(queryset):
+    """Сброс кэша, пересборка документов и обновление времени изменения перевалов при изменении связанных данных"""
+    pks = list(queryset.values_list('pk', flat=True))
+    if pks:
+        MountainPass.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+        invalidate_passes(pks)
+        refresh_documents(pks)
+
+
+@receiver(post_save, sender=MountainPass)
+def mountain_pass_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_passes([instance.pk])
+    refresh_documents([instance.pk])
+
+
+@receiver(post_delete, sender=MountainPass)
+def mountain_pass_deleted(sender, instance, **kwargs):
+    invalidate_passes([instance.pk])
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def image_changed(sender, instance, **kwargs):
+    invalidate_passes([instance.mountain_pass_id])
+    refresh_documents([instance.mountain_pass_id])
+
+
+@receiver(post_save, sender=Image)
+def image_created(sender, instance, created, **kwargs):
+    if created:
+        schedule_variants([instance.pk])
+
+
+@receiver(post_save, sender=Coords)
+def coords_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch_passes(MountainPass.objects.filter(coords=instance))
+
+
+@receiver(post_save, sender=Level)
+def level_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch_passes(MountainPass.objects.filter(level=instance))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch_passes(MountainPass.objects.filter(user=instance))
@@ -0,0 +1,267 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import struct
+import tempfile
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+# Сколько первых байт файла держим в памяти для определения формата и размеров
+HEADER_SIZE = 128 * 1024
+CHUNK_SIZE = 64 * 1024
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    """Результат сохранения содержимого в хранилище: метаданные для строки Image"""
+    sha256: str
+    size: int
+    mime_type: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+    def as_fields(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def decode_base64_image(value: str) -> bytes:
+    """
+    Декодирование изображения из base64 (допускается префикс data:...;base64,)
+    Выбрасывает ValueError для некорректных данных
+    """
+    if value.startswith('data:') and ',' in value:
+        value = value.split(',', 1)[1]
+    try:
+        return base64.b64decode(''.join(value.split()), validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Некорректные данные base64: {e}")
+
+
+def sniff_image(header: bytes) -> Tuple[str, Optional[int], Optional[int]]:
+    """
+    Определение MIME-типа и размеров изображения по первым байтам файла
+    Возвращает (mime_type, width, height); размеры None, если их не удалось прочитать
+    """
+    if header.startswith(b'\x89PNG\r\n\x1a\n') and len(header) >= 24:
+        width, height = struct.unpack('>II', header[16:24])
+        return 'image/png', width, height
+
+    if header[:6] in (b'GIF87a', b'GIF89a') and len(header) >= 10:
+        width, height = struct.unpack('<HH', header[6:10])
+        return 'image/gif', width, height
+
+    if header.startswith(b'\xff\xd8'):
+        width, height = _jpeg_size(header)
+        return 'image/jpeg', width, height
+
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        width, height = _webp_size(header)
+        return 'image/webp', width, height
+
+    return 'application/octet-stream', None, None
+
+
+def _jpeg_size(header: bytes) -> Tuple[Optional[int], Optional[int]]:
+    # Идем по сегментам до маркера SOFn, в котором записаны размеры кадра
+    offset = 2
+    while offset + 9 <= len(header):
+        if header[offset] != 0xFF:
+            return None, None
+        marker = header[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        segment_length = struct.unpack('>H', header[offset + 2:offset + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', header[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + segment_length
+    return None, None
+
+
+def _webp_size(header: bytes) -> Tuple[Optional[int], Optional[int]]:
+    chunk = header[12:16]
+    if chunk == b'VP8 ' and len(header) >= 30:
+        width, height = struct.unpack('<HH', header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(header) >= 25:
+        bits = int.from_bytes(header[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(header) >= 30:
+        width = int.from_bytes(header[24:27], 'little') + 1
+        height = int.from_bytes(header[27:30], 'little') + 1
+        return width, height
+    return None, None
+
+
+class BlobWriter:
+    """
+    Потоковая запись содержимого во временный файл хранилища
+    Хэш считается по мере записи, в памяти держится только заголовок файла
+    """
+
+    def __init__(self, storage: 'FileSystemBlobStorage'):
+        self._storage = storage
+        fd, self._tmp_path = tempfile.mkstemp(dir=storage.tmp_dir, suffix='.part')
+        self._file = os.fdopen(fd, 'wb')
+        self._hash = hashlib.sha256()
+        self._header = bytearray()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if len(self._header) < HEADER_SIZE:
+            self._header += chunk[:HEADER_SIZE - len(self._header)]
+
+    def commit(self) -> StoredBlob:
+        """Завершение записи: файл переносится по адресу своего хэша"""
+        self._file.close()
+        digest = self._hash.hexdigest()
+        self._storage._commit(self._tmp_path, digest)
+        mime_type, width, height = sniff_image(bytes(self._header))
+        return StoredBlob(digest, self.size, mime_type, width, height)
+
+    def abort(self):
+        """Отмена записи с удалением временного файла"""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.abort()
+
+
+class FileSystemBlobStorage:
+    """
+    Контентно-адресуемое хранилище изображений на локальной файловой системе
+    Файл лежит по пути <location>/ab/cd/<sha256>, одинаковое содержимое хранится один раз
+    """
+
+    def __init__(self, location: str):
+        self.location = os.fspath(location)
+        self.tmp_dir = os.path.join(self.location, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        if not DIGEST_RE.match(digest):
+            raise ValueError(f"Некорректный хэш содержимого: {digest}")
+        return os.path.join(self.location, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def writer(self) -> BlobWriter:
+        return BlobWriter(self)
+
+    def save(self, content: bytes) -> StoredBlob:
+        digest = hashlib.sha256(content).hexdigest()
+        if self.touch(digest):
+            # Такое содержимое уже есть - не переписываем файл
+            mime_type, width, height = sniff_image(content[:HEADER_SIZE])
+            return StoredBlob(digest, len(content), mime_type, width, height)
+
+        with self.writer() as writer:
+            for start in range(0, len(content), CHUNK_SIZE):
+                writer.write(content[start:start + CHUNK_SIZE])
+            return writer.commit()
+
+    def save_file(self, path: str, sha256: Optional[str] = None) -> StoredBlob:
+        """
+        Перенос готового файла в хранилище без копирования (файл должен быть на той же файловой системе)
+        Хэш считается чтением по частям. Если sha256 указан и не совпал - ValueError, файл остается на месте
+        """
+        digest = hashlib.sha256()
+        header = b''
+        size = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                if len(header) < HEADER_SIZE:
+                    header += chunk[:HEADER_SIZE - len(header)]
+        if sha256 is not None and digest.hexdigest() != sha256:
+            raise ValueError(f"SHA-256 содержимого {digest.hexdigest()} не совпадает с ожидаемым {sha256}")
+        self._commit(path, digest.hexdigest())
+        mime_type, width, height = sniff_image(header)
+        return StoredBlob(digest.hexdigest(), size, mime_type, width, height)
+
+    def touch(self, digest: str) -> bool:
+        """Обновление mtime существующего файла, чтобы сборщик мусора его не тронул; False, если файла нет"""
+        try:
+            os.utime(self.path(digest))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), 'rb')
+
+    def read(self, digest: str) -> bytes:
+        with self.open(digest) as f:
+            return f.read()
+
+    def delete(self, digest: str):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def iter_blobs(self) -> Iterator[Tuple[str, float]]:
+        """Обход всех сохраненных файлов: (sha256, время последнего обращения на запись)"""
+        for root, dirs, files in os.walk(self.location):
+            if root == self.tmp_dir:
+                continue
+            for name in files:
+                if DIGEST_RE.match(name):
+                    yield name, os.path.getmtime(os.path.join(root, name))
+
+    def _commit(self, tmp_path: str, digest: str):
+        target = self.path(digest)
+        if self.touch(digest):
+            # Такое содержимое уже есть
+            os.remove(tmp_path)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+
+
+@lru_cache(maxsize=None)
+def get_image_storage() -> FileSystemBlobStorage:
+    """Хранилище изображений, настроенное в settings.IMAGE_STORAGE"""
+    config = settings.IMAGE_STORAGE
+    backend = import_string(config['BACKEND'])
+    return backend(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def _reset_image_storage(*, setting, **kwargs):
+    if setting == 'IMAGE_STORAGE':
+        get_image_storage.cache_clear()
+
+
+def store_image(content: bytes) -> StoredBlob:
+    """Сохранение изображения в хранилище"""
+    return get_image_storage().save(content)
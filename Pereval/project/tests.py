@@ -1,9 +1,70 @@
+import asyncio
+import base64
+import csv
+import gzip
+import hashlib
+import io
+import multiprocessing
 import json
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.backends.base.creation import TEST_DATABASE_PREFIX
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import User, Coords, Level, MountainPass, Image
+from rest_framework.test import APIClient, APITestCase
+from .benchmark import compare_reports, seed_perevals
+from .cache import get_cache, get_pass_payload
+from .connection_pool import ConnectionPool, PoolTimeoutError
+from .database_manager import DatabaseManager
+from .image_variants import build_variants
+from .moderation import claim_passes, transition_passes
+from .models import User, Coords, Level, MountainPass, Image, ImageVariant, IdempotencyKey, PassDocument, PassTombstone, UploadSession
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .serializers import MountainPassSerializer
+from . import events, geo, image_variants, imaging, metrics, renderers, search, upload_sessions
+from .storage import get_image_storage, sniff_image
+
+# PNG 1x1
+PNG_BASE64 = (
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+class TempImageStorageMixin:
+    """Изображения в тестах пишутся во временный каталог"""
+
+    @classmethod
+    def setUpClass(cls):
+        tmp_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp_dir.cleanup)
+        storage_override = override_settings(IMAGE_STORAGE={
+            'BACKEND': 'project.storage.FileSystemBlobStorage',
+            'OPTIONS': {'location': tmp_dir.name},
+        })
+        storage_override.enable()
+        cls.addClassCleanup(storage_override.disable)
+        super().setUpClass()
 
 
 class BasicSetupTest(TestCase):
@@ -148,4 +209,2058 @@ class MountainPassAPITests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['status'], 0)
-        self.assertIn('Не указан параметр', response.data['message'])
\ No newline at end of file
+        self.assertIn('Не указан параметр', response.data['message'])
+
+
+class ImageStorageTests(TempImageStorageMixin, APITestCase):
+    """Хранение изображений в контентно-адресуемом хранилище"""
+
+    def submit_payload(self, images):
+        return {
+            "title": "Пик Талгар",
+            "user": {"email": "storage@example.com", "fam": "Иванов", "name": "Иван", "phone": "+79990000000"},
+            "coords": {"latitude": 43.1234, "longitude": 77.5678, "height": 3500},
+            "level": {"winter": "1A", "summer": "", "autumn": "", "spring": ""},
+            "images": images,
+        }
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковое содержимое сохраняется в один файл"""
+        storage = get_image_storage()
+        first = storage.save(b"same bytes")
+        second = storage.save(b"same bytes")
+
+        self.assertEqual(first.sha256, second.sha256)
+        self.assertEqual(len(list(storage.iter_blobs())), 1)
+        self.assertEqual(storage.read(first.sha256), b"same bytes")
+
+    def test_sniff_png_dimensions(self):
+        """Определение типа и размеров по заголовку"""
+        self.assertEqual(sniff_image(base64.b64decode(PNG_BASE64)), ('image/png', 1, 1))
+
+    def test_submit_stores_metadata_in_row(self):
+        """POST /submitData/ - в строке Image только метаданные, GET отдает исходный base64"""
+        response = self.client.post(
+            reverse('submit-data'),
+            data=json.dumps(self.submit_payload([
+                {"data": PNG_BASE64, "title": "Вид 1"},
+                {"data": PNG_BASE64, "title": "Вид 2"},
+            ])),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        images = Image.objects.filter(mountain_pass_id=response.data['id'])
+        self.assertEqual(images.count(), 2)
+        self.assertEqual(len({image.sha256 for image in images}), 1)
+        self.assertEqual(images[0].mime_type, 'image/png')
+        self.assertEqual((images[0].width, images[0].height), (1, 1))
+
+        url = reverse('submit-data-detail', kwargs={'pk': response.data['id']})
+        detail = self.client.get(url)
+        self.assertEqual(detail.data['images'][0]['data'], PNG_BASE64)
+        self.assertEqual(detail.data['images'][0]['size'], len(base64.b64decode(PNG_BASE64)))
+
+    def test_submit_invalid_base64(self):
+        """POST /submitData/ - некорректный base64 отклоняется"""
+        response = self.client.post(
+            reverse('submit-data'),
+            data=json.dumps(self.submit_payload([{"data": "не base64!", "title": "Вид"}])),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.exists())
+
+
+class MultipartSubmitTests(TempImageStorageMixin, APITestCase):
+    """POST /submitData/ в формате multipart/form-data"""
+
+    metadata = {
+        "title": "Пик Талгар",
+        "user": {"email": "multipart@example.com", "fam": "Иванов", "name": "Иван", "phone": "+79990000000"},
+        "coords": {"latitude": 43.1234, "longitude": 77.5678, "height": 3500},
+        "level": {"winter": "1A", "summer": "", "autumn": "", "spring": ""},
+    }
+
+    def post_multipart(self, metadata, **files):
+        return self.client.post(
+            reverse('submit-data'),
+            data={"metadata": json.dumps(metadata), **files},
+            format='multipart'
+        )
+
+    def test_submit_with_referenced_files(self):
+        """Изображения ссылаются на файловые части по имени"""
+        content = base64.b64decode(PNG_BASE64)
+        response = self.post_multipart(
+            {**self.metadata, "images": [{"title": "Седловина", "file": "photo1"}]},
+            photo1=SimpleUploadedFile("photo1.png", content, content_type="image/png"),
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        image = Image.objects.get(mountain_pass_id=response.data['id'])
+        self.assertEqual(image.title, "Седловина")
+        self.assertEqual(image.mime_type, "image/png")
+        self.assertEqual(image.read_content(), content)
+
+    def test_submit_files_without_images_metadata(self):
+        """Без images в metadata изображениями считаются все файлы"""
+        response = self.post_multipart(
+            self.metadata,
+            photo1=SimpleUploadedFile("north.png", b"first", content_type="image/png"),
+            photo2=SimpleUploadedFile("south.png", b"second", content_type="image/png"),
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        titles = set(Image.objects.values_list('title', flat=True))
+        self.assertEqual(titles, {"north.png", "south.png"})
+
+    def test_submit_missing_file_part(self):
+        """Ссылка на несуществующую файловую часть"""
+        response = self.post_multipart({**self.metadata, "images": [{"title": "Вид", "file": "photo1"}]})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('photo1', response.data['message'])
+        self.assertFalse(MountainPass.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_submit_oversized_file(self):
+        """Файл больше IMAGE_UPLOAD_MAX_SIZE - 413, перевал не создается, даже если metadata на него не ссылается"""
+        response = self.post_multipart(
+            {**self.metadata, "images": []},
+            photo1=SimpleUploadedFile("big.png", b"x" * 4096, content_type="image/png"),
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn('photo1', response.data['message'])
+        self.assertFalse(MountainPass.objects.exists())
+
+
+class BulkSubmitTests(TempImageStorageMixin, APITestCase):
+    """POST /submitData/bulk/ - пакетное добавление перевалов"""
+
+    def make_item(self, number, email="bulk@example.com", fam="Иванов"):
+        return {
+            "title": f"Перевал {number}",
+            "user": {"email": email, "fam": fam, "name": "Иван", "phone": "+79990000000"},
+            "coords": {"latitude": 43.0 + number / 100, "longitude": 77.0, "height": 3000 + number},
+            "level": {"winter": "1A", "summer": "", "autumn": "", "spring": ""},
+            "images": [{"data": PNG_BASE64, "title": f"Вид {number}"}],
+        }
+
+    def post_bulk(self, items):
+        return self.client.post(reverse('submit-data-bulk'), data=json.dumps(items), content_type='application/json')
+
+    def test_bulk_submit_reports_each_item(self):
+        """Корректные записи сохраняются, ошибки возвращаются по каждой записи"""
+        invalid = self.make_item(2)
+        del invalid['coords']['height']
+        response = self.post_bulk([self.make_item(1), invalid, self.make_item(3, fam="Петров")])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], [200, 400, 200])
+        self.assertIn('height', results[1]['message'])
+        self.assertEqual(MountainPass.objects.count(), 2)
+        self.assertEqual(Image.objects.count(), 2)
+
+        # Один пользователь на всю пачку, данные из последней записи
+        user = User.objects.get(email="bulk@example.com")
+        self.assertEqual(user.fam, "Петров")
+        self.assertEqual(MountainPass.objects.get(pk=results[2]['id']).user, user)
+
+    def test_bulk_submit_query_count_does_not_grow(self):
+        """Число запросов не зависит от размера пачки"""
+        with CaptureQueriesContext(connection) as small:
+            self.post_bulk([self.make_item(number) for number in range(2)])
+        with CaptureQueriesContext(connection) as large:
+            self.post_bulk([self.make_item(number, email=f"u{number}@example.com") for number in range(20)])
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(MountainPass.objects.count(), 22)
+
+    def test_bulk_submit_requires_list(self):
+        """Тело запроса должно быть массивом"""
+        response = self.client.post(
+            reverse('submit-data-bulk'), data=json.dumps(self.make_item(1)), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_repeated_submit_updates_existing_user(self):
+        """POST /submitData/ - повторная отправка с тем же email обновляет пользователя"""
+        first = self.client.post(reverse('submit-data'), data=json.dumps(self.make_item(1)), content_type='application/json')
+        second = self.client.post(
+            reverse('submit-data'), data=json.dumps(self.make_item(2, fam="Петров")), content_type='application/json'
+        )
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(User.objects.get().fam, "Петров")
+
+
+class UserUpsertTests(TestCase):
+    """Создание или обновление пользователя по email одним запросом"""
+
+    def setUp(self):
+        self.profile = {"email": "upsert@example.com", "fam": "Иванов", "name": "Иван", "otc": "Иванович", "phone": "+79990000000"}
+
+    def test_statuses(self):
+        """created, затем unchanged без записи, затем updated"""
+        user_id, user_status = User.objects.upsert([self.profile])[self.profile['email']]
+        self.assertEqual(user_status, 'created')
+
+        with CaptureQueriesContext(connection) as context:
+            result = User.objects.upsert([self.profile])
+        self.assertEqual(result, {self.profile['email']: (user_id, 'unchanged')})
+        self.assertFalse([query for query in context.captured_queries if query['sql'].startswith('UPDATE')])
+
+        result = User.objects.upsert([{**self.profile, "phone": "+79991111111"}])
+        self.assertEqual(result, {self.profile['email']: (user_id, 'updated')})
+        self.assertEqual(User.objects.get().phone, "+79991111111")
+
+    def test_missing_fields_are_kept(self):
+        """Поля, которых нет в данных, не перезаписываются"""
+        User.objects.upsert([self.profile])
+        profile = {key: value for key, value in self.profile.items() if key != 'otc'}
+        result = User.objects.upsert([{**profile, "fam": "Петров"}, {**profile, "email": "new@example.com"}])
+
+        self.assertEqual(result[self.profile['email']][1], 'updated')
+        self.assertEqual(result["new@example.com"][1], 'created')
+        user = User.objects.get(email=self.profile['email'])
+        self.assertEqual((user.fam, user.otc), ("Петров", "Иванович"))
+
+    def test_repeat_submission_does_not_write_user(self):
+        """Повторная отправка с тем же профилем не обновляет пользователя и не сбрасывает кэш его перевалов"""
+        payload = {
+            "title": "Пик Талгар",
+            "user": self.profile,
+            "coords": {"latitude": 43.0, "longitude": 77.0, "height": 3000},
+            "level": {"winter": "1A", "summer": "", "autumn": "", "spring": ""},
+        }
+        self.client.post(reverse('submit-data'), data=json.dumps(payload), content_type='application/json')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('submit-data'), data=json.dumps(payload), content_type='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(User.objects.count(), 1)
+        self.assertFalse([query for query in context.captured_queries if query['sql'].startswith('UPDATE')])
+
+
+class UserUpsertConcurrencyTests(TransactionTestCase):
+    """Параллельные первые отправки с одним email"""
+
+    def test_concurrent_upserts_create_one_user(self):
+        profile = {"email": "race@example.com", "fam": "Иванов", "name": "Иван", "phone": "+79990000000"}
+        barrier = threading.Barrier(8)
+        results = []
+        errors = []
+
+        def submit():
+            try:
+                barrier.wait()
+                results.append(User.objects.upsert([profile])[profile['email']])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(len({user_id for user_id, _ in results}), 1)
+        self.assertEqual(sorted(user_status for _, user_status in results).count('created'), 1)
+
+
+class IdempotencyTests(APITestCase):
+    """POST /submitData/ с заголовком Idempotency-Key"""
+
+    payload = {
+        "title": "Перевал Повторный",
+        "user": {"email": "retry@example.com", "fam": "Иванов", "name": "Иван", "phone": "+79990000000"},
+        "coords": {"latitude": 43.1, "longitude": 77.2, "height": 3300},
+        "level": {"winter": "1A", "summer": "", "autumn": "", "spring": ""},
+    }
+
+    def submit(self, payload, key='retry-1'):
+        return self.client.post(
+            reverse('submit-data'), data=json.dumps(payload), content_type='application/json',
+            headers={'Idempotency-Key': key}
+        )
+
+    def test_retry_returns_first_response(self):
+        first = self.submit(self.payload)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Idempotent-Replayed', first.headers)
+
+        # Вставка ключа и чтение сохраненного ответа (и точка сохранения транзакции): без разбора и проверки
+        with self.assertNumQueries(4):
+            retry = self.submit(self.payload)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(MountainPass.objects.count(), 1)
+        self.assertEqual(Coords.objects.count(), 1)
+
+        # Другой ключ - новый перевал
+        self.assertNotEqual(self.submit(self.payload, key='retry-2').json()['id'], first.json()['id'])
+
+    def test_key_reused_for_other_body(self):
+        self.submit(self.payload)
+        response = self.submit({**self.payload, "title": "Другой перевал"})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(MountainPass.objects.count(), 1)
+
+    def test_validation_error_is_replayed(self):
+        payload = {**self.payload, "coords": {"latitude": 100, "longitude": 77.2, "height": 3300}}
+        first = self.submit(payload)
+        self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+        retry = self.submit(payload)
+        self.assertEqual(retry.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+
+    def test_expired_key_runs_again(self):
+        self.submit(self.payload)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL + 1))
+        # Просроченный ключ можно занять даже другим запросом
+        response = self.submit({**self.payload, "title": "Другой перевал"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+        self.assertEqual(MountainPass.objects.count(), 2)
+
+        IdempotencyKey.objects.create(scope='submit-data', key='old', fingerprint='0' * 64,
+                                      created_at=timezone.now() - timedelta(days=30))
+        call_command('purge_idempotency_keys', stdout=io.StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['retry-1'])
+
+    def test_invalid_key(self):
+        response = self.submit(self.payload, key='ключ')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(MountainPass.objects.exists())
+
+    def test_server_error_is_not_stored(self):
+        with mock.patch('project.views.create_mountain_pass', side_effect=RuntimeError("сбой")):
+            response = self.submit(self.payload)
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.submit(self.payload).status_code, status.HTTP_200_OK)
+
+    async def test_async_view_shares_keys(self):
+        headers = {'Idempotency-Key': 'async-1'}
+        first = await self.async_client.post(
+            reverse('async-submit-data'), data=self.payload, content_type='application/json', headers=headers
+        )
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        retry = await self.async_client.post(
+            reverse('submit-data'), data=self.payload, content_type='application/json', headers=headers
+        )
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(await MountainPass.objects.acount(), 1)
+
+
+@override_settings(PASS_DOCUMENTS_MODE='inline')
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    """Параллельные запросы с одним Idempotency-Key создают один перевал"""
+
+    def test_concurrent_duplicates(self):
+        barrier = threading.Barrier(6)
+        responses = []
+
+        def submit():
+            try:
+                barrier.wait()
+                responses.append(
+                    APIClient().post(
+                        reverse('submit-data'), data=IdempotencyTests.payload, format='json',
+                        headers={'Idempotency-Key': 'race-1'}
+                    )
+                )
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_200_OK] * 6)
+        self.assertEqual(len({response.json()['id'] for response in responses}), 1)
+        self.assertEqual(sum('Idempotent-Replayed' in response.headers for response in responses), 5)
+        self.assertEqual(MountainPass.objects.count(), 1)
+
+
+class SearchTests(APITestCase):
+    """Поиск перевалов по названиям"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="search@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        self.talgar = self.add_pass("Талгар", other_titles="Северный Талгар")
+        self.glacier = self.add_pass("Ледниковый", other_titles="")
+        self.kyzyl = self.add_pass("Кызыл-Арт", other_titles="Пик Ленина, Талгарская седловина")
+
+    def add_pass(self, title, other_titles):
+        return MountainPass.objects.create(
+            beauty_title="пер. ",
+            title=title,
+            other_titles=other_titles,
+            user=self.user,
+            coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+            level=Level.objects.create(winter="1A"),
+        )
+
+    def search(self, **params):
+        response = self.client.get(reverse('submit-data-search'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def titles(self, text):
+        return [item['title'] for item in self.search(q=text)['results']]
+
+    def test_word_forms_and_other_titles(self):
+        self.assertEqual(self.titles("ледниковые"), ["Ледниковый"])
+        self.assertEqual(self.titles("Ленина"), ["Кызыл-Арт"])
+
+    def test_misspelling_and_transliteration(self):
+        self.assertEqual(self.titles("Тлгар")[0], "Талгар")
+        self.assertEqual(self.titles("Talgar")[0], "Талгар")
+        self.assertEqual(self.titles("kyzyl art"), ["Кызыл-Арт"])
+
+    def test_title_ranks_above_other_titles(self):
+        results = self.search(q="Талгар")['results']
+        self.assertEqual([item['title'] for item in results][:1], ["Талгар"])
+        self.assertEqual(results, sorted(results, key=lambda item: -item['rank']))
+
+    def test_pagination(self):
+        first = self.search(q="Талгар", limit=1)
+        self.assertEqual(len(first['results']), 1)
+        self.assertIsNotNone(first['next'])
+        response = self.client.get(first['next'])
+        second = response.data
+        self.assertNotEqual(first['results'][0]['id'], second['results'][0]['id'])
+
+    def test_title_change_updates_index(self):
+        MountainPass.objects.filter(pk=self.glacier.pk).update(title="Перевал Дружбы")
+        self.assertEqual(self.titles("дружба"), ["Перевал Дружбы"])
+        self.assertEqual(self.titles("ледниковые"), [])
+
+    def test_missing_query(self):
+        response = self.client.get(reverse('submit-data-search'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_trigrams_match_database_function(self):
+        text = "Кара-Кёль, Talgar  2А"
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tsvector_to_array(pereval_trigrams(%s))", [text])
+            self.assertEqual(set(cursor.fetchone()[0]), search.trigrams(text))
+
+
+class RequestMetricsTests(APITestCase):
+    """Метрики запросов и GET /metrics"""
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.user = User.objects.create(email="metrics@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        self.mountain_pass = MountainPass.objects.create(
+            title="Пик Талгар",
+            user=self.user,
+            coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+            level=Level.objects.create(winter="1A"),
+        )
+
+    def test_request_is_recorded_per_view(self):
+        """Запросы, время БД и сериализации попадают в гистограммы представления"""
+        url = reverse('submit-data-detail', kwargs={'pk': self.mountain_pass.pk})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        queries = len(context.captured_queries)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        view = 'view="SubmitDataDetailAPIView"'
+        self.assertIn(f'pereval_request_duration_seconds_count{{{view}}} 1', text)
+        self.assertIn(f'pereval_request_db_queries_sum{{{view}}} {queries}', text)
+        self.assertIn(f'pereval_request_serializer_duration_seconds_count{{{view}}} 1', text)
+        self.assertIn(f'pereval_response_size_bytes_bucket{{{view},le="+Inf"}} 1', text)
+        self.assertIn(f'pereval_responses_total{{{view},method="GET",status="200"}} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram((1, 5, 10))
+        for value in (0, 1, 3, 7, 50):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual((histogram.count, histogram.sum), (5, 61))
+
+    @override_settings(REQUEST_QUERY_BUDGET=0)
+    def test_over_budget_request_is_logged_with_sql(self):
+        with self.assertLogs('project.metrics', 'WARNING') as logs:
+            self.client.get(reverse('submit-data-list'), {'user__email': self.user.email})
+        self.assertIn('SubmitDataListAPIView', logs.output[0])
+        self.assertIn('project_mountainpass', logs.output[0])
+
+
+@override_settings(PASS_DOCUMENTS_MODE='inline')
+class QueryCountTests(TempImageStorageMixin, APITestCase):
+    """Число запросов на чтение не зависит от количества перевалов"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="many@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+
+    def add_passes(self, count):
+        blob = get_image_storage().save(base64.b64decode(PNG_BASE64))
+        # Документы перевалов собираются после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(count):
+                mountain_pass = MountainPass.objects.create(
+                    title=f"Перевал {number}",
+                    user=self.user,
+                    coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+                    level=Level.objects.create(winter="1A"),
+                )
+                for title in ("Север", "Юг"):
+                    Image.objects.create(mountain_pass=mountain_pass, title=title, **blob.as_fields())
+
+    def count_list_queries(self):
+        url = reverse('submit-data-list') + '?user__email=many@example.com'
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries), len(response.data)
+
+    def test_list_query_count_is_constant(self):
+        """GET /submitData/list/ - один запрос к перевалам и их документам"""
+        self.add_passes(1)
+        few_queries, few_passes = self.count_list_queries()
+        self.add_passes(9)
+        many_queries, many_passes = self.count_list_queries()
+
+        self.assertEqual((few_passes, many_passes), (1, 10))
+        self.assertEqual(few_queries, 1)
+        self.assertEqual(many_queries, few_queries)
+
+    def test_detail_query_count(self):
+        """GET /submitData/<id>/ - один запрос"""
+        self.add_passes(1)
+        url = reverse('submit-data-detail', kwargs={'pk': MountainPass.objects.get().pk})
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['images']), 2)
+
+    def test_list_for_user_without_passes(self):
+        """Существующий пользователь без перевалов получает пустой список"""
+        response = self.client.get(reverse('submit-data-list') + '?user__email=many@example.com')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+
+@override_settings(PASS_DOCUMENTS_MODE='inline')
+class ModerationTests(APITestCase):
+    """Очередь модерации: выдача, взятие перевалов и массовая смена статуса"""
+
+    def setUp(self):
+        AuthUser = get_user_model()
+        self.moderator = AuthUser.objects.create_user('moderator', password='secret', is_staff=True)
+        self.other = AuthUser.objects.create_user('other', password='secret', is_staff=True)
+        user = User.objects.create(email="queue@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        self.pks = []
+        for number in range(5):
+            mountain_pass = MountainPass.objects.create(
+                title=f"Перевал {number}",
+                user=user,
+                coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+                level=Level.objects.create(winter="1A"),
+            )
+            MountainPass.objects.filter(pk=mountain_pass.pk).update(
+                add_time=datetime(2025, 7, number + 1, tzinfo=dt_timezone.utc)
+            )
+            self.pks.append(mountain_pass.pk)
+        MountainPass.objects.filter(pk=self.pks[4]).update(status='accepted')
+        self.client.force_authenticate(self.moderator)
+
+    def claim(self, user, limit):
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse('moderation-claim'), {'limit': limit}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['ids']
+
+    def transition(self, user, ids, source, target):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('moderation-transition'), {'ids': ids, 'from': source, 'to': target}, format='json'
+            )
+
+    def test_staff_only(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('moderation-queue')).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(get_user_model().objects.create_user('tourist'))
+        response = self.client.post(reverse('moderation-claim'), {'limit': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_queue_oldest_first(self):
+        """Очередь - от старых к новым, без обработанных перевалов, постранично"""
+        response = self.client.get(reverse('moderation-queue'), {'limit': 3})
+        self.assertEqual([item['id'] for item in response.data['results']], self.pks[:3])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['id'] for item in response.data['results']], self.pks[3:4])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('moderation-queue'), {'status': 'accepted'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_claim_and_transition(self):
+        """Модераторы получают разные перевалы; смена статуса только у своих и только из ожидаемого статуса"""
+        first = self.claim(self.moderator, 2)
+        second = self.claim(self.other, 2)
+        self.assertEqual(first, self.pks[:2])
+        self.assertEqual(second, self.pks[2:4])
+        self.assertEqual(self.claim(self.other, 2), [])
+
+        response = self.client.get(reverse('moderation-queue'), {'mine': '1'})
+        self.assertEqual([item['id'] for item in response.data['results']], second)
+        self.assertEqual(response.data['results'][0]['moderation']['moderator'], 'other')
+
+        # Чужие перевалы не меняются
+        response = self.transition(self.other, first, 'pending', 'accepted')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['conflicts'], first)
+
+        response = self.transition(self.moderator, first + [self.pks[4]], 'pending', 'accepted')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], first)
+        self.assertEqual(response.data['conflicts'], [self.pks[4]])
+        self.assertEqual(set(MountainPass.objects.filter(pk__in=first).values_list('status', flat=True)), {'accepted'})
+        # Документ перевала обновлен вместе со статусом
+        self.assertEqual(PassDocument.objects.get(pk=first[0]).summary['status'], 'Принят')
+
+        # Повторное решение по тем же перевалам - конфликт
+        response = self.transition(self.moderator, first, 'pending', 'rejected')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        response = self.transition(self.moderator, first, 'accepted', 'new')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_claim_is_returned_to_queue(self):
+        """Перевал, взятый без решения дольше MODERATION_CLAIM_TIMEOUT, может взять другой модератор"""
+        claimed = self.claim(self.moderator, 1)
+        MountainPass.objects.filter(pk__in=claimed).update(claimed_at=timezone.now() - timedelta(hours=1))
+        with self.settings(MODERATION_CLAIM_TIMEOUT=600):
+            self.assertEqual(self.claim(self.other, 1), claimed)
+        self.assertEqual(MountainPass.objects.get(pk=claimed[0]).moderator, self.other)
+
+
+@override_settings(PASS_DOCUMENTS_MODE='inline')
+class ModerationConcurrencyTests(TransactionTestCase):
+    """Взятие перевалов не ждет строк, заблокированных другим модератором"""
+
+    def test_claim_skips_locked_rows(self):
+        moderator = get_user_model().objects.create_user('moderator', is_staff=True)
+        user = User.objects.create(email="lock@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        pks = [
+            MountainPass.objects.create(
+                title=f"Перевал {number}", user=user,
+                coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+                level=Level.objects.create(winter="1A"),
+            ).pk
+            for number in range(3)
+        ]
+        oldest = MountainPass.objects.order_by('add_time', 'id').first().pk
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(MountainPass.objects.filter(pk=oldest).select_for_update())
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            started = time.monotonic()
+            claimed = claim_passes(moderator, 3)
+            self.assertLess(time.monotonic() - started, 5)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(sorted(claimed), sorted(set(pks) - {oldest}))
+
+
+@override_settings(PASS_DOCUMENTS_MODE='inline', IMAGE_VARIANTS_MODE='off')
+class ChangesFeedTests(TransactionTestCase):
+    """GET /submitData/changes/ - лента изменений; транзакции в тесте настоящие, как у клиентов"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.url = reverse('submit-data-changes')
+        self.user = User.objects.create(email="sync@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        self.other = User.objects.create(email="other@example.com", fam="Петров", name="Петр", phone="+79990000001")
+        self.passes = [self.create_pass(f"Перевал {number}", self.user) for number in range(3)]
+        self.foreign = self.create_pass("Чужой перевал", self.other)
+
+    @staticmethod
+    def create_pass(title, user):
+        return MountainPass.objects.create(
+            title=title, user=user,
+            coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+            level=Level.objects.create(winter="1A"),
+        )
+
+    def fetch(self, cursor=None, **params):
+        """Все страницы до has_more = false: (id измененных, id удаленных, курсор)"""
+        changed, deleted = [], []
+        while True:
+            query = {'view': 'summary', **params, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(self.url, query)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+            data = response.json()
+            changed += [item['id'] for item in data['changes']]
+            deleted += data['deleted']
+            cursor = data['cursor']
+            if not data['has_more']:
+                return changed, deleted, cursor
+
+    def test_initial_sync_and_changes_since(self):
+        changed, deleted, cursor = self.fetch(limit=3)
+        self.assertEqual(sorted(changed), sorted(p.pk for p in self.passes + [self.foreign]))
+        self.assertEqual(deleted, [])
+        self.assertEqual(self.fetch(cursor)[:2], ([], []))
+
+        edited, imaged, removed, moderated = self.passes[0], self.passes[1], self.passes[2], self.foreign
+        edited.title = "Перевал переименованный"
+        edited.save()
+        Image.objects.create(mountain_pass=imaged, title="Вид", sha256='a' * 64, size=1, mime_type='image/png')
+        removed_pk = removed.pk
+        removed.delete()
+        transition_passes([moderated.pk], 'new', 'accepted')
+
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'cursor': cursor, 'view': 'summary'})
+        data = response.json()
+        self.assertEqual([item['id'] for item in data['changes']], [edited.pk, imaged.pk, moderated.pk])
+        self.assertEqual(data['changes'][0]['title'], "Перевал переименованный")
+        self.assertEqual(len(data['changes'][1]['images']), 1)
+        self.assertEqual(data['changes'][2]['status'], "Принят")
+        self.assertEqual(data['deleted'], [removed_pk])
+
+        # Лента одного пользователя
+        changed, deleted, _ = self.fetch(cursor, user__email=self.user.email)
+        self.assertEqual((changed, deleted), ([edited.pk, imaged.pk], [removed_pk]))
+        self.assertEqual(self.fetch(user__email="nobody@example.com")[:2], ([], []))
+
+    def test_change_committed_after_read_is_not_lost(self):
+        """Транзакция, начатая до чтения ленты и закоммиченная после, попадает в следующую синхронизацию"""
+        _, _, cursor = self.fetch()
+        written, release = threading.Event(), threading.Event()
+        late = self.passes[0]
+
+        def slow_update():
+            try:
+                with transaction.atomic():
+                    MountainPass.objects.filter(pk=late.pk).update(title="Долгая транзакция")
+                    written.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_update)
+        thread.start()
+        try:
+            self.assertTrue(written.wait(10))
+            # Более поздняя транзакция коммитится первой
+            MountainPass.objects.filter(pk=self.passes[1].pk).update(title="Быстрая транзакция")
+            changed, _, cursor = self.fetch(cursor)
+            self.assertEqual(changed, [self.passes[1].pk])
+        finally:
+            release.set()
+            thread.join()
+
+        changed, _, cursor = self.fetch(cursor)
+        self.assertIn(late.pk, changed)
+        self.assertEqual(self.fetch(cursor)[:2], ([], []))
+
+    def test_invalid_and_expired_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'мусор'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        _, _, cursor = self.fetch()
+        with override_settings(CHANGES_TOMBSTONE_TTL=-1):
+            self.assertEqual(self.client.get(self.url, {'cursor': cursor}).status_code, status.HTTP_410_GONE)
+
+        self.passes[0].delete()
+        PassTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=60))
+        call_command('purge_pass_tombstones', stdout=io.StringIO())
+        self.assertFalse(PassTombstone.objects.exists())
+
+
+def parse_sse(chunk):
+    """(событие, данные) из сообщения text/event-stream"""
+    if isinstance(chunk, bytes):
+        chunk = chunk.decode('utf-8')
+    fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+    return fields.get('event'), json.loads(fields['data']) if 'data' in fields else None
+
+
+@override_settings(PASS_EVENTS_BACKEND='local')
+class PassEventsTests(TestCase):
+    """GET /async/events/ - поток событий о смене статусов перевалов пользователя"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="events@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        self.other = User.objects.create(email="quiet@example.com", fam="Петров", name="Петр", phone="+79990000001")
+        self.passes = [
+            MountainPass.objects.create(
+                title=f"Перевал {number}", user=user,
+                coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+                level=Level.objects.create(winter="1A"),
+            )
+            for number, user in enumerate([self.user, self.user, self.other])
+        ]
+        self.url = reverse('async-pass-events')
+
+    def moderate(self, pks, target):
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_passes(pks, 'new', target)
+
+    async def test_snapshot_then_status_changes(self):
+        response = await self.async_client.get(self.url, {'user__email': self.user.email})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+            event, data = parse_sse(await anext(stream))
+            self.assertEqual(event, 'snapshot')
+            self.assertEqual([(item['id'], item['status']) for item in data],
+                             [(self.passes[0].pk, 'new'), (self.passes[1].pk, 'new')])
+
+            # Перевал другого пользователя в поток не попадает
+            await sync_to_async(self.moderate)([self.passes[2].pk, self.passes[1].pk], 'accepted')
+            event, data = parse_sse(await asyncio.wait_for(anext(stream), 5))
+            self.assertEqual(event, 'status')
+            self.assertEqual((data['id'], data['status'], data['status_display']), (self.passes[1].pk, 'accepted', 'Принят'))
+            self.assertNotIn('user_id', data)
+        finally:
+            await stream.aclose()
+
+    async def test_heartbeat_and_overflow(self):
+        stream = events.event_stream(self.user.pk, heartbeat=0.01)
+        try:
+            await anext(stream)
+            await anext(stream)
+            self.assertTrue((await anext(stream)).startswith(': ping'))
+
+            # Клиент не успевает читать - вместо потерянных событий приходит снимок
+            event = {'id': self.passes[0].pk, 'user_id': self.user.pk, 'status': 'pending'}
+            events.broker.publish([event] * (events.QUEUE_SIZE + 1))
+            await asyncio.sleep(0)
+            self.assertEqual(parse_sse(await anext(stream))[0], 'snapshot')
+        finally:
+            await stream.aclose()
+        # Закрытие потока снимает подписку
+        self.assertNotIn(self.user.pk, events.broker._subscriptions)
+
+    def test_requires_asgi_and_user(self):
+        self.assertEqual(self.client.get(self.url, {'user__email': self.user.email}).status_code, 501)
+
+
+@override_settings(PASS_EVENTS_BACKEND='postgres')
+class PassEventsListenerTests(TransactionTestCase):
+    """Смена статуса в другом соединении доходит до подписчика через LISTEN/NOTIFY"""
+
+    def tearDown(self):
+        events.stop_listener()
+
+    async def subscribe(self):
+        """Пользователь с перевалом и поток его событий после подключения LISTEN: (перевал, поток, поток LISTEN)"""
+        user = await User.objects.acreate(email="listen@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        mountain_pass = await sync_to_async(MountainPass.objects.create)(
+            title="Перевал", user=user,
+            coords=await Coords.objects.acreate(latitude=43.0, longitude=77.0, height=3000),
+            level=await Level.objects.acreate(winter="1A"),
+        )
+        stream = events.event_stream(user.pk)
+        await anext(stream)
+        await anext(stream)
+        listener = events.start_listener()
+        self.assertTrue(await sync_to_async(listener.listening.wait, thread_sensitive=False)(10))
+        # После LISTEN - снимок: смены статусов до подписки на канал не теряются
+        self.assertEqual(parse_sse(await asyncio.wait_for(anext(stream), 10))[0], 'snapshot')
+        return mountain_pass, stream, listener
+
+    async def test_notify_reaches_subscriber(self):
+        mountain_pass, stream, _ = await self.subscribe()
+        try:
+            # Откат транзакции отменяет уведомление
+            def rolled_back():
+                with transaction.atomic():
+                    transition_passes([mountain_pass.pk], 'new', 'rejected')
+                    transaction.set_rollback(True)
+            await sync_to_async(rolled_back)()
+            await sync_to_async(transition_passes)([mountain_pass.pk], 'new', 'accepted')
+
+            event, data = parse_sse(await asyncio.wait_for(anext(stream), 10))
+            self.assertEqual((event, data['id'], data['status']), ('status', mountain_pass.pk, 'accepted'))
+        finally:
+            await stream.aclose()
+
+    async def test_reconnect_sends_snapshot(self):
+        """Обрыв соединения LISTEN: смена статуса доходит напрямую, после переподключения - снимок"""
+        mountain_pass, stream, listener = await self.subscribe()
+        try:
+            def drop_listener():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                        "WHERE datname = current_database() AND query = %s",
+                        [f"LISTEN {events.CHANNEL}"]
+                    )
+                    self.assertEqual(cursor.rowcount, 1)
+
+            with self.assertLogs('project.events', 'ERROR'):
+                await sync_to_async(drop_listener)()
+                for _ in range(100):
+                    if not listener.listening.is_set():
+                        break
+                    await asyncio.sleep(0.05)
+                self.assertFalse(listener.listening.is_set())
+                await sync_to_async(transition_passes)([mountain_pass.pk], 'new', 'accepted')
+
+                received = [parse_sse(await asyncio.wait_for(anext(stream), 10)) for _ in range(2)]
+            self.assertEqual(received[0], ('status', mock.ANY))
+            self.assertEqual(received[0][1]['status'], 'accepted')
+            event, data = received[1]
+            self.assertEqual(event, 'snapshot')
+            self.assertEqual([(item['id'], item['status']) for item in data], [(mountain_pass.pk, 'accepted')])
+        finally:
+            await stream.aclose()
+
+
+class KeysetPaginationTests(APITestCase):
+    """GET /submitData/ - список перевалов с фильтрами и курсором"""
+
+    def setUp(self):
+        user = User.objects.create(email="pages@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        days = [1, 2, 2, 2, 3]
+        statuses = ['new', 'accepted', 'accepted', 'new', 'rejected']
+        for number, (day, pass_status) in enumerate(zip(days, statuses)):
+            mountain_pass = MountainPass.objects.create(
+                title=f"Перевал {number}",
+                user=user,
+                coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+                level=Level.objects.create(summer="2A" if number % 2 else "1B"),
+                status=pass_status,
+            )
+            # add_time выставляется автоматически, задаем вручную (в том числе одинаковый)
+            MountainPass.objects.filter(pk=mountain_pass.pk).update(
+                add_time=datetime(2025, 7, day, 12, 0, tzinfo=dt_timezone.utc)
+            )
+
+    def fetch_all(self, query):
+        ids = []
+        url = reverse('submit-data') + query
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_all_passes_in_order(self):
+        """Курсор проходит все записи без пропусков и повторов, в том числе при одинаковом add_time"""
+        ids = self.fetch_all('?limit=2')
+        expected = list(MountainPass.objects.order_by('-add_time', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_filters(self):
+        """Фильтры по статусу, категории и датам"""
+        self.assertEqual(len(self.fetch_all('?status=accepted')), 2)
+        self.assertEqual(len(self.fetch_all('?level=2A')), 2)
+        self.assertEqual(len(self.fetch_all('?level=2A&season=winter')), 0)
+        self.assertEqual(len(self.fetch_all('?date_from=2025-07-02&date_to=2025-07-02')), 3)
+        self.assertEqual(len(self.fetch_all('?status=new&date_to=2025-07-02T00:00:00Z')), 1)
+
+    def test_invalid_parameters(self):
+        """Некорректные курсор и фильтры"""
+        for query in ('?cursor=abc', '?status=unknown', '?date_from=вчера', '?limit=0'):
+            response = self.client.get(reverse('submit-data') + query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+            self.assertEqual(response.data['status'], 0)
+
+
+class GeoQueryTests(APITestCase):
+    """Пространственные запросы: прямоугольник и ближайшие перевалы"""
+
+    points = {
+        "Талгар": (43.10, 77.30),
+        "Туюксу": (43.05, 77.08),
+        "Эльбрус": (43.35, 42.44),
+        "Чукотка": (65.00, 179.90),
+        "Аляска": (65.10, -179.80),
+    }
+
+    def setUp(self):
+        user = User.objects.create(email="geo@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        level = Level.objects.create()
+        for title, (latitude, longitude) in self.points.items():
+            MountainPass.objects.create(
+                title=title,
+                user=user,
+                coords=Coords.objects.create(latitude=latitude, longitude=longitude, height=3000),
+                level=level,
+            )
+
+    def test_geohash_encode(self):
+        """Geohash известной точки и его запись в Coords"""
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        coords = Coords.objects.get(mountainpass__title="Талгар")
+        self.assertEqual(coords.geohash, geo.encode(43.10, 77.30))
+
+    def test_bbox(self):
+        """GET /submitData/bbox/ - перевалы в прямоугольнике, в том числе через 180-й меридиан"""
+        response = self.client.get(reverse('submit-data-bbox'), {
+            'min_lat': 42.5, 'min_lon': 76.5, 'max_lat': 43.5, 'max_lon': 78.0
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({item['title'] for item in response.data['results']}, {"Талгар", "Туюксу"})
+        self.assertFalse(response.data['truncated'])
+
+        response = self.client.get(reverse('submit-data-bbox'), {
+            'min_lat': 64, 'min_lon': 179, 'max_lat': 66, 'max_lon': -179
+        })
+        self.assertEqual({item['title'] for item in response.data['results']}, {"Чукотка", "Аляска"})
+
+    def test_nearest(self):
+        """GET /submitData/nearest/ - ближайшие перевалы по возрастанию расстояния"""
+        response = self.client.get(reverse('submit-data-nearest'), {'lat': 43.2, 'lon': 76.9, 'k': 3})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['title'] for item in response.data], ["Туюксу", "Талгар", "Эльбрус"])
+        distance = geo.haversine_km(43.2, 76.9, *self.points["Туюксу"])
+        self.assertAlmostEqual(response.data[0]['distance_km'], distance)
+
+    def test_nearest_across_antimeridian(self):
+        """Ближайший перевал по другую сторону 180-го меридиана"""
+        response = self.client.get(reverse('submit-data-nearest'), {'lat': 65.0, 'lon': -179.99, 'k': 1})
+        self.assertEqual([item['title'] for item in response.data], ["Чукотка"])
+
+    def test_invalid_coordinates(self):
+        """Некорректные параметры"""
+        response = self.client.get(reverse('submit-data-nearest'), {'lat': 95, 'lon': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('submit-data-bbox'), {'min_lat': 10, 'max_lat': 0, 'min_lon': 0, 'max_lon': 1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(PASS_DOCUMENTS_MODE='inline')
+class SummaryViewTests(TempImageStorageMixin, APITestCase):
+    """view=summary - списки без содержимого изображений"""
+
+    def setUp(self):
+        user = User.objects.create(email="summary@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        self.content = base64.b64decode(PNG_BASE64)
+        blob = get_image_storage().save(self.content)
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(3):
+                mountain_pass = MountainPass.objects.create(
+                    title=f"Перевал {number}",
+                    connect="Длинное описание маршрута",
+                    user=user,
+                    coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+                    level=Level.objects.create(winter="1A"),
+                )
+                Image.objects.create(mountain_pass=mountain_pass, title="Вид", **blob.as_fields())
+
+    def test_summary_list(self):
+        """GET /submitData/list/?view=summary - метаданные и ссылки вместо base64"""
+        url = reverse('submit-data-list') + '?user__email=summary@example.com&view=summary'
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+        image = response.data[0]['images'][0]
+        self.assertNotIn('data', image)
+        self.assertEqual(image['size'], len(self.content))
+        self.assertNotIn('connect', response.data[0])
+
+        # Только краткие документы перевалов: описание и пользователь не выбираются из БД
+        self.assertEqual(len(context.captured_queries), 1)
+        for query in context.captured_queries:
+            self.assertNotIn('"connect"', query['sql'])
+            self.assertNotIn('"project_user"."fam"', query['sql'])
+
+        content = self.client.get(image['url'])
+        self.assertEqual(content.status_code, status.HTTP_200_OK)
+        self.assertEqual(content['Content-Type'], 'image/png')
+        self.assertEqual(b''.join(content.streaming_content), self.content)
+
+    def test_summary_paginated_list(self):
+        """GET /submitData/?view=summary"""
+        response = self.client.get(reverse('submit-data') + '?view=summary&limit=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIn('url', response.data['results'][0]['images'][0])
+
+    def test_image_not_modified(self):
+        """GET /images/<id>/ - 304 по ETag"""
+        image = Image.objects.first()
+        url = reverse('image-content', kwargs={'pk': image.pk})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{image.sha256}"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unknown_view(self):
+        """Некорректное значение view"""
+        response = self.client.get(reverse('submit-data-list') + '?user__email=summary@example.com&view=tiny')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTests(APITestCase):
+    """GET /submitData/export/ и команда export_perevals - выгрузка каталога потоком"""
+
+    def setUp(self):
+        self.url = reverse('submit-data-export')
+        user = User.objects.create(email="export@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        self.passes = [
+            MountainPass.objects.create(
+                title=f"Перевал {number}", user=user, status='new' if number == 4 else 'accepted',
+                connect="Строка с запятой, \"кавычками\"\nи переносом",
+                coords=Coords.objects.create(latitude=43.0 + number, longitude=77.0, height=3000),
+                level=Level.objects.create(winter="1A"),
+            )
+            for number in range(5)
+        ]
+        self.accepted = [p.pk for p in self.passes if p.status == 'accepted']
+
+    def test_ndjson(self):
+        """По умолчанию - принятые перевалы в кратком представлении, по перевалу в строке"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        # Части по EXPORT_CHUNK_SIZE перевалов
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 2)
+        items = [json.loads(line) for line in b''.join(chunks).splitlines()]
+        self.assertEqual([item['id'] for item in items], self.accepted)
+        self.assertEqual(items[0]['coords']['latitude'], 43.0)
+        self.assertNotIn('connect', items[0])
+
+        response = self.client.get(self.url, {'status': 'new'})
+        self.assertEqual([json.loads(line)['id'] for line in b''.join(response.streaming_content).splitlines()],
+                         [self.passes[4].pk])
+
+    def test_csv_gzip(self):
+        """CSV сжимается в gzip, если клиент его принимает"""
+        response = self.client.get(self.url, {'output': 'csv'}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('perevals.csv', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(b''.join(response.streaming_content)).decode('utf-8'))))
+        self.assertEqual([int(row['id']) for row in rows], self.accepted)
+        self.assertEqual(rows[0]['connect'], self.passes[0].connect)
+        self.assertEqual(rows[1]['latitude'], '44.0')
+        self.assertEqual(rows[0]['level_winter'], '1A')
+
+    def test_gzip_negotiation(self):
+        """gzip только если клиент его принимает: q=0 и похожие названия кодировок не считаются"""
+        for header, expected in (
+            ('gzip', True), ('deflate, gzip;q=0.5', True), ('*', True), ('GZIP', True),
+            ('gzip;q=0', False), ('gzip; q=0.0, deflate', False), ('x-gzip', False),
+            ('gzip;q=0, *', False), ('identity', False), ('', False),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=header)
+                body = b''.join(response.streaming_content)
+                self.assertEqual(response.get('Content-Encoding') == 'gzip', expected)
+                self.assertEqual(body[:2] == b'\x1f\x8b', expected)
+
+    def test_invalid_params(self):
+        for params in ({'output': 'xml'}, {'status': 'unknown'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command(self):
+        """export_perevals --gzip в файл"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'perevals.ndjson.gz')
+            call_command('export_perevals', status='all', gzip=True, output=path, chunk_size=3, stderr=io.StringIO())
+            with gzip.open(path) as f:
+                ids = [json.loads(line)['id'] for line in f]
+        self.assertEqual(ids, [p.pk for p in self.passes])
+
+
+@skipUnless(imaging.is_available(), "Pillow не установлен")
+@override_settings(IMAGE_VARIANTS_MODE='inline', PASS_DOCUMENTS_MODE='inline', IMAGE_VARIANTS={'thumbnail': 64, 'medium': 256})
+class ImageVariantTests(TempImageStorageMixin, APITestCase):
+    """Уменьшенные варианты изображений"""
+
+    def make_jpeg(self, width=800, height=600):
+        from PIL import Image as PILImage
+
+        picture = PILImage.new('RGB', (width, height), (200, 120, 40))
+        exif = PILImage.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90°
+        exif[0x010F] = "Camera"
+        buffer = io.BytesIO()
+        picture.save(buffer, 'JPEG', exif=exif)
+        return buffer.getvalue()
+
+    def submit(self, content, email="variants@example.com"):
+        payload = {
+            "title": "Перевал с фото",
+            "user": {"email": email, "fam": "Иванов", "name": "Иван", "phone": "+79990000000"},
+            "coords": {"latitude": 43.0, "longitude": 77.0, "height": 3000},
+            "level": {"winter": "1A", "summer": "", "autumn": "", "spring": ""},
+            "images": [{"data": base64.b64encode(content).decode('ascii'), "title": "Вид"}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('submit-data'), data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['id']
+
+    def test_variants_built_after_submit(self):
+        """После добавления перевала строятся варианты: уменьшенные, повернутые по EXIF, без EXIF"""
+        from PIL import Image as PILImage
+
+        self.submit(self.make_jpeg())
+        variants = {variant.kind: variant for variant in ImageVariant.objects.all()}
+        self.assertEqual(set(variants), {'thumbnail', 'medium'})
+        self.assertEqual((variants['medium'].width, variants['medium'].height), (192, 256))
+        self.assertEqual((variants['thumbnail'].width, variants['thumbnail'].height), (48, 64))
+
+        content = get_image_storage().read(variants['thumbnail'].sha256)
+        picture = PILImage.open(io.BytesIO(content))
+        self.assertEqual(picture.format, 'JPEG')
+        self.assertEqual(len(picture.getexif()), 0)
+        self.assertEqual(variants['thumbnail'].size, len(content))
+
+    def test_variants_served_by_read_endpoints(self):
+        """Краткий список ссылается на варианты, /images/<id>/?variant= отдает их"""
+        self.submit(self.make_jpeg())
+        response = self.client.get(reverse('submit-data-list') + '?user__email=variants@example.com&view=summary')
+        image = response.data[0]['images'][0]
+        thumbnail = image['variants']['thumbnail']
+        self.assertTrue(thumbnail['url'].endswith('?variant=thumbnail'))
+        self.assertLess(thumbnail['size'], image['size'])
+
+        response = self.client.get(thumbnail['url'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(len(b''.join(response.streaming_content)), thumbnail['size'])
+
+        response = self.client.get(image['url'] + '?variant=huge')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_variant_falls_back_to_original(self):
+        """Пока вариант не построен, отдается исходное изображение"""
+        with self.settings(IMAGE_VARIANTS_MODE='off'):
+            pk = self.submit(self.make_jpeg())
+        image = Image.objects.get(mountain_pass_id=pk)
+        response = self.client.get(reverse('image-content', kwargs={'pk': image.pk}) + '?variant=medium')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], f'"{image.sha256}"')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+
+    def test_same_content_rendered_once_in_process_pool(self):
+        """Варианты строятся в пуле процессов; для одинакового содержимого переиспользуются"""
+        content = self.make_jpeg()
+        with self.settings(IMAGE_VARIANTS_MODE='off'):
+            first = Image.objects.get(mountain_pass_id=self.submit(content))
+            second = Image.objects.get(mountain_pass_id=self.submit(content, email="other@example.com"))
+
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            self.assertEqual(build_variants([first.pk], pool), 2)
+        with mock.patch.object(imaging, 'render_variants_safely') as render:
+            self.assertEqual(build_variants([first.pk, second.pk]), 2)
+        render.assert_not_called()
+        self.assertEqual(
+            set(first.variants.values_list('sha256', flat=True)),
+            set(second.variants.values_list('sha256', flat=True))
+        )
+
+
+    def test_variants_reset_cached_detail(self):
+        """Ответ о перевале, закэшированный до построения вариантов, сбрасывается вместе с документом"""
+        with self.settings(IMAGE_VARIANTS_MODE='off'):
+            pk = self.submit(self.make_jpeg())
+        self.assertEqual(self.client.get(reverse('submit-data-detail', kwargs={'pk': pk})).status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(get_pass_payload(pk))
+
+        image = Image.objects.get(mountain_pass_id=pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(build_variants([image.pk]), 2)
+
+        self.assertIsNone(get_pass_payload(pk))
+        response = self.client.get(reverse('submit-data-list') + '?user__email=variants@example.com&view=summary')
+        self.assertEqual(set(response.data[0]['images'][0]['variants']), {'thumbnail', 'medium'})
+
+    def test_existing_variants_not_counted(self):
+        """Варианты, уже созданные параллельной сборкой, не считаются созданными"""
+        with self.settings(IMAGE_VARIANTS_MODE='off'):
+            image = Image.objects.get(mountain_pass_id=self.submit(self.make_jpeg()))
+        rows = [
+            (image.pk, kind, image.sha256, image.size, image.mime_type, 10, 10)
+            for kind in ('thumbnail', 'medium')
+        ]
+        self.assertEqual(image_variants._insert_variants(rows[:1]), [image.pk])
+        self.assertEqual(image_variants._insert_variants(rows), [image.pk])
+        self.assertEqual(image.variants.count(), 2)
+
+def make_picture(seed, size=(640, 480), quality=95):
+    """JPEG со случайными прямоугольниками: одинаковый seed дает один и тот же сюжет"""
+    import random
+    from PIL import Image as PILImage, ImageDraw
+
+    rng = random.Random(seed)
+    picture = PILImage.new('RGB', (640, 480), (128, 128, 128))
+    draw = ImageDraw.Draw(picture)
+    for _ in range(12):
+        x, y = rng.randrange(600), rng.randrange(440)
+        draw.rectangle([x, y, x + rng.randrange(40, 300), y + rng.randrange(40, 200)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    picture.resize(size).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class ImagePatchTests(TempImageStorageMixin, APITestCase):
+    """PATCH /submitData/<id>/ - изображения сравниваются с сохраненными, а не пересоздаются"""
+
+    def setUp(self):
+        self.first = base64.b64decode(PNG_BASE64)
+        self.second = b"GIF89a\x02\x00\x02\x00" + b"\x00" * 20
+        response = self.client.post(reverse('submit-data'), data=json.dumps({
+            "title": "Пик Талгар",
+            "user": {"email": "diff@example.com", "fam": "Иванов", "name": "Иван", "phone": "+79990000000"},
+            "coords": {"latitude": 43.0, "longitude": 77.0, "height": 3000},
+            "level": {"winter": "1A", "summer": "", "autumn": "", "spring": ""},
+            "images": [
+                {"data": base64.b64encode(self.first).decode('ascii'), "title": "Первое"},
+                {"data": base64.b64encode(self.second).decode('ascii'), "title": "Второе"},
+            ],
+        }), content_type='application/json')
+        self.pk = response.data['id']
+        self.url = reverse('submit-data-detail', kwargs={'pk': self.pk})
+        self.images = list(Image.objects.filter(mountain_pass_id=self.pk).order_by('pk'))
+
+    def patch_images(self, images):
+        return self.client.patch(self.url, data=json.dumps({"images": images}), content_type='application/json')
+
+    def test_unchanged_images_are_kept(self):
+        """Изображения по id и с тем же содержимым остаются, новые добавляются, содержимое не переписывается"""
+        storage = get_image_storage()
+        with mock.patch.object(storage, 'writer', wraps=storage.writer) as writer:
+            response = self.patch_images([
+                {"id": self.images[0].pk, "title": "Первое (переименовано)"},
+                {"data": base64.b64encode(self.second).decode('ascii'), "title": "Второе"},
+                {"data": base64.b64encode(b"new image bytes").decode('ascii'), "title": "Третье"},
+            ])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        images = list(Image.objects.filter(mountain_pass_id=self.pk).order_by('pk'))
+        self.assertEqual([image.pk for image in images[:2]], [image.pk for image in self.images])
+        self.assertEqual([image.title for image in images], ["Первое (переименовано)", "Второе", "Третье"])
+        # Записано только новое содержимое
+        self.assertEqual(writer.call_count, 1)
+
+    def test_missing_images_are_removed(self):
+        """Изображения, которых нет в списке, удаляются"""
+        self.patch_images([{"id": self.images[1].pk}])
+        self.assertEqual(list(Image.objects.filter(mountain_pass_id=self.pk)), [self.images[1]])
+
+        self.patch_images([])
+        self.assertFalse(Image.objects.filter(mountain_pass_id=self.pk).exists())
+
+    def test_foreign_image_id(self):
+        """id чужого изображения отклоняется"""
+        response = self.patch_images([{"id": 999999}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('999999', response.data['message'])
+        self.assertEqual(Image.objects.filter(mountain_pass_id=self.pk).count(), 2)
+
+    @skipUnless(imaging.is_available(), "Pillow не установлен")
+    def test_recompressed_copy_is_kept(self):
+        """Повторно сжатая и уменьшенная копия распознается по перцептивному хэшу"""
+        original = make_picture(seed=1)
+        self.patch_images([{"data": base64.b64encode(original).decode('ascii'), "title": "Вид"}])
+        saved = Image.objects.get(mountain_pass_id=self.pk)
+
+        copy = make_picture(seed=1, size=(320, 240), quality=60)
+        other = make_picture(seed=2)
+        self.assertNotEqual(imaging.perceptual_hash(copy), imaging.perceptual_hash(other))
+        self.patch_images([
+            {"data": base64.b64encode(copy).decode('ascii'), "title": "Вид"},
+            {"data": base64.b64encode(other).decode('ascii'), "title": "Другой вид"},
+        ])
+
+        images = list(Image.objects.filter(mountain_pass_id=self.pk).order_by('pk'))
+        self.assertEqual(images[0].pk, saved.pk)
+        self.assertEqual(images[0].sha256, saved.sha256)
+        self.assertEqual(len(images), 2)
+
+
+class UploadSessionTests(TempImageStorageMixin, APITestCase):
+    """Возобновляемая загрузка изображения частями: /submitData/<id>/uploads/ и /uploads/<id>/"""
+
+    def setUp(self):
+        user = User.objects.create(email="uploads@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        self.mountain_pass = MountainPass.objects.create(
+            title="Перевал Загрузочный", user=user,
+            coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+            level=Level.objects.create(winter="1A"),
+        )
+        self.content = base64.b64decode(PNG_BASE64) + os.urandom(300 * 1024)
+
+    def create_session(self, **fields):
+        response = self.client.post(
+            reverse('pass-upload-sessions', kwargs={'pk': self.mountain_pass.pk}),
+            data={"title": "Седловина", "size": len(self.content), **fields}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data['url']
+
+    def put_chunk(self, url, start, end):
+        return self.client.put(
+            url, data=self.content[start:end + 1], content_type='application/octet-stream',
+            headers={'Content-Range': f'bytes {start}-{end}/{len(self.content)}'}
+        )
+
+    def test_resume_and_finalize(self):
+        url = self.create_session(sha256=hashlib.sha256(self.content).hexdigest())
+        middle = len(self.content) // 2
+
+        response = self.put_chunk(url, 0, middle - 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers['Upload-Offset'], str(middle))
+
+        # Часть не с того места - 409 и текущий offset
+        response = self.put_chunk(url, 0, 99)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], middle)
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        self.assertEqual(self.client.get(url).data['offset'], middle)
+        self.assertEqual(self.put_chunk(url, middle, len(self.content) - 1).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        image = Image.objects.get(mountain_pass=self.mountain_pass)
+        self.assertEqual(response.data['image']['id'], image.pk)
+        self.assertEqual((image.title, image.size, image.mime_type), ("Седловина", len(self.content), 'image/png'))
+        self.assertEqual(image.read_content(), self.content)
+        self.assertFalse(os.path.exists(upload_sessions.session_path(UploadSession.objects.get().pk)))
+
+        # Повтор завершения возвращает то же изображение
+        self.assertEqual(self.client.post(url + 'finalize/').data['image']['id'], image.pk)
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_interrupted_chunk_keeps_received_bytes(self):
+        """Полученное до обрыва соединения сохраняется"""
+        url = self.create_session()
+        session = UploadSession.objects.get()
+
+        class BrokenStream:
+            def __init__(self, data):
+                self.stream = io.BytesIO(data)
+
+            def read(self, size):
+                chunk = self.stream.read(size)
+                if not chunk:
+                    raise OSError("соединение разорвано")
+                return chunk
+
+        with self.assertRaises(OSError):
+            upload_sessions.write_chunk(session, 0, BrokenStream(self.content[:100000]), len(self.content))
+        self.assertEqual(self.client.get(url).data['offset'], 100000)
+        self.assertEqual(self.put_chunk(url, 100000, len(self.content) - 1).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(url + 'finalize/').status_code, status.HTTP_200_OK)
+        self.assertEqual(Image.objects.get().read_content(), self.content)
+
+    def test_checksum_mismatch_restarts_upload(self):
+        url = self.create_session(sha256='0' * 64)
+        self.put_chunk(url, 0, len(self.content) - 1)
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.data['offset'], 0)
+        self.assertFalse(Image.objects.exists())
+
+    def test_invalid_requests(self):
+        sessions_url = reverse('pass-upload-sessions', kwargs={'pk': self.mountain_pass.pk})
+        for data in ({"title": "", "size": 10}, {"title": "Вид", "size": 0},
+                     {"title": "Вид", "size": settings.IMAGE_UPLOAD_MAX_SIZE + 1}, {"title": "Вид", "size": 10, "sha256": "abc"}):
+            self.assertEqual(self.client.post(sessions_url, data=data, format='json').status_code, 400, data)
+
+        url = self.create_session()
+        self.assertEqual(self.put_chunk(url, 0, len(self.content)).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put(url, data=b'12345', content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        MountainPass.objects.filter(pk=self.mountain_pass.pk).update(status='accepted')
+        response = self.client.post(sessions_url, data={"title": "Вид", "size": 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purge_expired_sessions(self):
+        url = self.create_session()
+        self.put_chunk(url, 0, 999)
+        path = upload_sessions.session_path(UploadSession.objects.get().pk)
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL + 1))
+        call_command('purge_upload_sessions', stdout=io.StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(PASS_DOCUMENTS_MODE='inline')
+class PassDocumentTests(TempImageStorageMixin, APITestCase):
+    """Документы перевалов: готовые ответы API в JSONB, обновляются вместе с перевалом"""
+
+    def setUp(self):
+        self.content = base64.b64decode(PNG_BASE64)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('submit-data'), data=json.dumps({
+                "title": "Пик Талгар",
+                "user": {"email": "doc@example.com", "fam": "Иванов", "name": "Иван", "phone": "+79990000000"},
+                "coords": {"latitude": 43.0, "longitude": 77.0, "height": 3000},
+                "level": {"winter": "1A", "summer": "", "autumn": "", "spring": ""},
+                "images": [{"data": PNG_BASE64, "title": "Вид"}],
+            }), content_type='application/json')
+        self.pk = response.data['id']
+        self.url = reverse('submit-data-detail', kwargs={'pk': self.pk})
+
+    def test_document_matches_serializer(self):
+        """Документ собирается после коммита; ответ из него совпадает с ответом сериализатора"""
+        document = PassDocument.objects.get(pk=self.pk)
+        self.assertIsNone(document.full['images'][0]['data'])
+        self.assertEqual(len(document.image_digests), 1)
+
+        response = self.client.get(self.url)
+        expected = MountainPassSerializer(MountainPass.objects.for_api().get(pk=self.pk)).data
+        self.assertEqual(json.loads(json.dumps(response.data)), json.loads(json.dumps(expected)))
+        self.assertEqual(base64.b64decode(response.data['images'][0]['data']), self.content)
+
+        summary = self.client.get(reverse('submit-data-list'), {'user__email': 'doc@example.com', 'view': 'summary'})
+        self.assertTrue(summary.data[0]['images'][0]['url'].startswith('http://testserver/'))
+
+    def test_document_follows_changes(self):
+        """PATCH и смена статуса пересобирают документ"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, data=json.dumps({"title": "Пик Талгар Южный"}), content_type='application/json')
+        self.assertEqual(PassDocument.objects.get(pk=self.pk).full['title'], "Пик Талгар Южный")
+
+        mountain_pass = MountainPass.objects.get(pk=self.pk)
+        mountain_pass.status = 'accepted'
+        with self.captureOnCommitCallbacks(execute=True):
+            mountain_pass.save()
+        document = PassDocument.objects.get(pk=self.pk)
+        self.assertEqual(document.summary['status'], mountain_pass.get_status_display())
+        self.assertEqual(document.updated_at, mountain_pass.updated_at)
+
+    def test_stale_document_is_rebuilt_on_read(self):
+        """Изменение в обход сигналов: устаревший документ пересобирается при чтении"""
+        MountainPass.objects.filter(pk=self.pk).update(title="Обход сигналов", updated_at=timezone.now())
+        response = self.client.get(reverse('submit-data-list'), {'user__email': 'doc@example.com'})
+        self.assertEqual(response.data[0]['title'], "Обход сигналов")
+        self.assertEqual(PassDocument.objects.get(pk=self.pk).full['title'], "Обход сигналов")
+
+    def test_rebuild_command(self):
+        """rebuild_pass_documents --missing собирает отсутствующие документы"""
+        PassDocument.objects.all().delete()
+        call_command('rebuild_pass_documents', missing=True, stdout=io.StringIO())
+        self.assertTrue(PassDocument.objects.filter(pk=self.pk).exists())
+
+
+class DetailCacheTests(APITestCase):
+    """Кэш GET /submitData/<id>/ и его сброс при изменениях"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(email="cache@example.com", fam="Иванов", name="Иван", phone="+79990000000")
+        self.mountain_pass = MountainPass.objects.create(
+            title="Пик Талгар",
+            user=self.user,
+            coords=Coords.objects.create(latitude=43.0, longitude=77.0, height=3000),
+            level=Level.objects.create(winter="1A"),
+        )
+        self.url = reverse('submit-data-detail', kwargs={'pk': self.mountain_pass.pk})
+
+    def test_second_read_is_served_from_cache(self):
+        """Повторный запрос не обращается к БД"""
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_conditional_requests(self):
+        """If-None-Match и If-Modified-Since дают 304"""
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_patch_invalidates_cache(self):
+        """PATCH сбрасывает кэш"""
+        first = self.client.get(self.url)
+        self.client.patch(self.url, data=json.dumps({"title": "Новое название"}), content_type='application/json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], "Новое название")
+
+    def test_status_and_related_changes_invalidate_cache(self):
+        """Смена статуса и изменение пользователя или координат (например, в админке) сбрасывают кэш"""
+        self.client.get(self.url)
+        self.mountain_pass.status = 'accepted'
+        self.mountain_pass.save()
+        self.assertEqual(self.client.get(self.url).data['status'], "Принят")
+
+        self.user.fam = "Петров"
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).data['user']['fam'], "Петров")
+
+        coords = self.mountain_pass.coords
+        coords.height = 3100
+        coords.save()
+        self.assertEqual(self.client.get(self.url).data['coords']['height'], 3100)
+
+
+class AsyncViewTests(TempImageStorageMixin, TestCase):
+    """Асинхронные варианты /submitData/ отвечают так же, как синхронные"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.payload = {
+            "title": "Перевал Дятлова",
+            "user": {"email": "async@example.com", "fam": "Иванов", "name": "Иван", "phone": "+79990000000"},
+            "coords": {"latitude": 61.75, "longitude": 59.45, "height": 1100},
+            "level": {"winter": "1A", "summer": "", "autumn": "", "spring": ""},
+            "images": [{"data": PNG_BASE64, "title": "Седловина"}],
+        }
+
+    async def test_submit_read_and_patch(self):
+        """Создание, чтение, редактирование и список через асинхронные представления"""
+        response = await self.async_client.post(
+            reverse('async-submit-data'), data=self.payload, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pk = response.json()['id']
+        detail_url = reverse('async-submit-data-detail', kwargs={'pk': pk})
+
+        response = await self.async_client.get(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sync_response = await self.async_client.get(reverse('submit-data-detail', kwargs={'pk': pk}))
+        self.assertEqual(response.json(), sync_response.json())
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        self.assertEqual(response.json()['images'][0]['data'], PNG_BASE64)
+
+        response = await self.async_client.get(detail_url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await self.async_client.patch(
+            detail_url, data={"title": "Перевал Дятлова (новое название)"}, content_type='application/json'
+        )
+        self.assertEqual(response.json(), {"state": 1, "message": "Запись успешно обновлена"})
+
+        response = await self.async_client.get(
+            reverse('async-submit-data-list'), {'user__email': "async@example.com", 'view': 'summary'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['title'] for item in response.json()], ["Перевал Дятлова (новое название)"])
+
+    async def test_errors(self):
+        """Ошибки в том же формате, что и у синхронных представлений"""
+        payload = {key: value for key, value in self.payload.items() if key != 'coords'}
+        response = await self.async_client.post(reverse('async-submit-data'), data=payload, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['message'], "Отсутствует обязательное поле: coords")
+
+        response = await self.async_client.post(reverse('async-submit-data'), data="{", content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = await self.async_client.get(reverse('async-submit-data-detail', kwargs={'pk': 999999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = await self.async_client.get(reverse('async-submit-data-list'), {'user__email': "nobody@example.com"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        mountain_pass = await MountainPass.objects.acreate(
+            title="Принятый перевал",
+            status='accepted',
+            user=await User.objects.acreate(email="async@example.com", fam="Иванов", name="Иван", phone="+79990000000"),
+            coords=await Coords.objects.acreate(latitude=61.75, longitude=59.45, height=1100),
+            level=await Level.objects.acreate(winter="1A"),
+        )
+        response = await self.async_client.patch(
+            reverse('async-submit-data-detail', kwargs={'pk': mountain_pass.pk}),
+            data={"title": "Новое название"}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['state'], 0)
+
+
+class FakeConnection:
+    """Подключение-заглушка для тестов пула"""
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.in_transaction = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, query, params=None):
+                if connection.broken:
+                    raise OSError("server closed the connection unexpectedly")
+                connection.in_transaction = True
+
+        return Cursor()
+
+    def get_transaction_status(self):
+        return 2 if self.in_transaction else 0
+
+    def rollback(self):
+        self.in_transaction = False
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Пул подключений DatabaseManager"""
+
+    def make_pool(self, **kwargs):
+        self.created = []
+
+        def connect():
+            conn = FakeConnection()
+            self.created.append(conn)
+            return conn
+
+        pool = ConnectionPool(connect, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_connections_are_reused(self):
+        """Возвращенное подключение выдается снова, незавершенная транзакция откатывается"""
+        pool = self.make_pool(min_size=1, max_size=2, health_check=False)
+        with pool.connection() as conn:
+            conn.in_transaction = True
+        with pool.connection() as again:
+            self.assertIs(again, conn)
+
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(conn.rollbacks, 1)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle'], stats['in_use'], stats['checkouts']), (1, 1, 0, 2))
+
+    def test_max_size_limits_connections(self):
+        """Сверх max_size подключение ждут, по истечении времени - PoolTimeoutError"""
+        pool = self.make_pool(min_size=0, max_size=1, timeout=0.05, health_check=False)
+        conn = pool.getconn()
+        with self.assertRaises(PoolTimeoutError):
+            pool.getconn()
+
+        # Ожидающий поток получает подключение, как только его вернут
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(pool.getconn(timeout=5)))
+        waiter.start()
+        time.sleep(0.05)
+        pool.putconn(conn)
+        waiter.join()
+
+        self.assertEqual(result, [conn])
+        stats = pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['waits'], 2)
+        self.assertGreater(stats['wait_time'], 0)
+        self.assertEqual(stats['connections_created'], 1)
+
+    def test_broken_connection_is_replaced(self):
+        """Подключение, не прошедшее проверку, закрывается и заменяется новым"""
+        pool = self.make_pool(min_size=1, max_size=1)
+        self.created[0].broken = True
+        with pool.connection() as conn:
+            self.assertIsNot(conn, self.created[0])
+
+        self.assertTrue(self.created[0].closed)
+        stats = pool.stats()
+        self.assertEqual(stats['health_check_failures'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_lifetime_and_idle_timeout(self):
+        """Старые подключения пересоздаются, лишние простаивающие закрываются"""
+        pool = self.make_pool(min_size=0, max_size=2, max_lifetime=0, health_check=False)
+        with pool.connection() as conn:
+            pass
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+        pool = self.make_pool(min_size=1, max_size=2, idle_timeout=0, health_check=False)
+        first, second = pool.getconn(), pool.getconn()
+        pool.putconn(first)
+        pool.putconn(second)
+        with pool.connection():
+            pass
+        # Сверх min_size простаивающее подключение закрыто, одно осталось
+        self.assertEqual(sum(conn.closed for conn in self.created), 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_concurrent_checkouts(self):
+        """Потоки не получают одно подключение одновременно"""
+        pool = self.make_pool(min_size=0, max_size=3, health_check=False)
+        active = set()
+        errors = []
+        lock = threading.Lock()
+
+        def work():
+            for _ in range(20):
+                with pool.connection() as conn:
+                    with lock:
+                        if id(conn) in active:
+                            errors.append(conn)
+                        active.add(id(conn))
+                    time.sleep(0.001)
+                    with lock:
+                        active.discard(id(conn))
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        stats = pool.stats()
+        self.assertLessEqual(stats['connections_created'], 3)
+        self.assertEqual(stats['checkouts'], 160)
+        self.assertEqual(stats['in_use'], 0)
+
+
+class JSONRenderingTests(SimpleTestCase):
+    """ORJSONRenderer и ORJSONParser дают тот же результат, что JSONRenderer и JSONParser DRF"""
+
+    data = {
+        'title': "Перевал «Северный» — Ашу",
+        'note': "строка\u2028разделитель\u2029абзаца",
+        'add_time': datetime(2025, 7, 1, 12, 0, 0, 123456, tzinfo=dt_timezone.utc),
+        'naive': datetime(2025, 7, 1, 12, 0),
+        'day': date(2025, 7, 1),
+        'height': Decimal('3000.50'),
+        'elapsed': timedelta(seconds=90),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'lazy': gettext_lazy("Новый"),
+        'levels': ('1A', '2B'),
+        'counts': {1: 'один'},
+        'images': [{'data': PNG_BASE64, 'size': 70, 'ratio': 1.5, 'flag': None}],
+    }
+
+    def test_render_matches_drf(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        # Отступы orjson не поддерживает - рендерит JSONRenderer
+        self.assertEqual(
+            ORJSONRenderer().render(self.data, 'application/json; indent=4'),
+            JSONRenderer().render(self.data, 'application/json; indent=4')
+        )
+        # Целое больше 64 бит orjson не записывает
+        self.assertEqual(ORJSONRenderer().render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+
+    def test_render_floats(self):
+        """Обычные float - побайтно как у DRF; в экспоненциальной записи отличается только форма, не значение"""
+        ordinary = [43.1234, -77.5678, 0.1, 1.5, 3500.0, 0.0001, 1e15, -0.0, 12345678.9]
+        self.assertEqual(ORJSONRenderer().render(ordinary), JSONRenderer().render(ordinary))
+
+        exponent = [1e16, 1e-7, 1e-05, 1.5e300]
+        if renderers.is_available():
+            self.assertEqual(ORJSONRenderer().render(exponent), b'[1e16,1e-7,0.00001,1.5e300]')
+        self.assertEqual(JSONRenderer().render(exponent), b'[1e+16,1e-07,1e-05,1.5e+300]')
+        self.assertEqual(json.loads(ORJSONRenderer().render(exponent)), exponent)
+
+    def test_parse_matches_drf(self):
+        body = JSONRenderer().render(self.data)
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+        for invalid in (b'{"title": ', b'{"height": NaN}', b'\xff'):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(invalid))
+
+    def test_without_orjson(self):
+        """Без orjson - стандартный json"""
+        body = JSONRenderer().render(self.data)
+        with mock.patch('project.renderers.orjson', None), mock.patch('project.parsers.orjson', None):
+            self.assertEqual(ORJSONRenderer().render(self.data), body)
+            self.assertEqual(ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+
+class SubmitManyTests(TransactionTestCase):
+    """
+    Пакетная загрузка в pereval_added через DatabaseManager
+    TransactionTestCase: подключения DatabaseManager идут в тестовую базу, таблица создается и удаляется только в ней
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        settings_dict = connection.settings_dict
+        # Тестовая база уже создана: в settings_dict ее имя, а не имя рабочей базы
+        test_name = settings_dict['TEST']['NAME']
+        assert (settings_dict['NAME'] == test_name if test_name
+                else settings_dict['NAME'].startswith(TEST_DATABASE_PREFIX)), settings_dict['NAME']
+        env = mock.patch.dict(os.environ, {
+            'FSTR_DB_HOST': settings_dict['HOST'],
+            'FSTR_DB_PORT': str(settings_dict['PORT']),
+            'FSTR_DB_LOGIN': settings_dict['USER'],
+            'FSTR_DB_PASS': settings_dict['PASSWORD'],
+            'FSTR_DB_NAME': settings_dict['NAME'],
+        })
+        env.start()
+        cls.addClassCleanup(env.stop)
+        cls.addClassCleanup(DatabaseManager.close_all_pools)
+
+    def setUp(self):
+        self.manager = DatabaseManager()
+        with self.manager.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE pereval_added (id serial PRIMARY KEY, date_added timestamp, raw_data jsonb, images jsonb)"
+            )
+            conn.commit()
+        self.addCleanup(self.drop_table)
+
+    def drop_table(self):
+        with self.manager.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("DROP TABLE pereval_added")
+            conn.commit()
+
+    def submission(self, title):
+        return {
+            "title": title,
+            "user": {"email": "backfill@example.com", "fam": "Иванов", "name": "Иван", "phone": "+79990000000"},
+            "coords": {"latitude": "45.3842", "longitude": "7.1525", "height": "1200"},
+            "level": {"summer": "1А"},
+        }
+
+    def stored_titles(self):
+        with self.manager.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT id, raw_data->>'title' FROM pereval_added ORDER BY id")
+            return dict(cursor.fetchall())
+
+    def test_batches_are_inserted_with_ids(self):
+        """Все записи вставлены пачками, id соответствуют записям"""
+        submissions = (self.submission(f"Перевал {i}") for i in range(7))
+        results = self.manager.submit_many(submissions, batch_size=3)
+
+        self.assertEqual([result['index'] for result in results], list(range(7)))
+        self.assertTrue(all(result['status'] == 200 for result in results))
+        stored = self.stored_titles()
+        self.assertEqual([stored[result['id']] for result in results], [f"Перевал {i}" for i in range(7)])
+        # По одному запросу вставки на пачку, без лишних подключений
+        self.assertEqual(self.manager.pool_stats()['connections_created'], 1)
+
+    def test_errors_do_not_stop_the_stream(self):
+        """Ошибки валидации и базы данных возвращаются по записи, остальные записи сохраняются"""
+        broken = self.submission("Нулевой символ \x00 не проходит в jsonb")
+        incomplete = self.submission("Без координат")
+        del incomplete['coords']
+        submissions = [self.submission("Первый"), incomplete, broken, self.submission("Последний"), "не объект"]
+
+        results = self.manager.submit_many(submissions, batch_size=4)
+
+        self.assertEqual([result['status'] for result in results], [200, 400, 500, 200, 400])
+        self.assertIn('coords', results[1]['message'])
+        self.assertIsNone(results[2]['id'])
+        self.assertEqual(sorted(self.stored_titles().values()), ["Первый", "Последний"])
+
+    def test_malformed_nested_fields(self):
+        """Вложенные поля неверного типа - ошибка 400 только у этой записи"""
+        wrong_user = self.submission("Пользователь числом")
+        wrong_user['user'] = 5
+        wrong_coords = self.submission("Координаты списком")
+        wrong_coords['coords'] = [45.3842, 7.1525, 1200]
+        submissions = [self.submission("Первый"), wrong_user, wrong_coords, self.submission("Последний")]
+
+        results = self.manager.submit_many(submissions, batch_size=10)
+
+        self.assertEqual([result['status'] for result in results], [200, 400, 400, 200])
+        self.assertIn('Некорректные данные', results[1]['message'])
+        self.assertEqual(sorted(self.stored_titles().values()), ["Первый", "Последний"])
+
+    def test_command_reports_file_lines(self):
+        """load_pereval_added: ошибки указывают строку файла, пустые строки учитываются"""
+        lines = [json.dumps(self.submission("Первый")), '', '{"title":', '', json.dumps(self.submission("Второй"))]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('load_pereval_added', f.name, batch_size=2, stdout=stdout, stderr=stderr)
+
+        self.assertIn("Загружено: 2, с ошибками: 1", stdout.getvalue())
+        self.assertEqual(stderr.getvalue().split(':')[0], "Строка 3")
+
+
+class BenchmarkTests(TempImageStorageMixin, TestCase):
+    """Тестовые данные и нагрузочный тест"""
+
+    def test_seed_perevals(self):
+        created = seed_perevals(30, images_per_pass=2, users=5, distinct_images=3, image_size=2048, batch_size=16)
+
+        self.assertEqual(created, {'passes': 30, 'images': 60, 'users': 5})
+        self.assertEqual(MountainPass.objects.count(), 30)
+        self.assertFalse(Coords.objects.filter(geohash='').exists())
+        image = Image.objects.first()
+        self.assertEqual(image.mime_type, 'image/png')
+        self.assertEqual(len(image.read_content()), image.size)
+        times = MountainPass.objects.values_list('add_time', flat=True)
+        self.assertLess(min(times), max(times))
+
+    def test_bench_api_report_and_compare(self):
+        seed_perevals(10, images_per_pass=1, users=3, distinct_images=2, image_size=1024)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'report.json')
+            call_command('bench_api', requests=3, warmup=1, concurrency=1, image_size=1, output=path, stdout=io.StringIO())
+            with open(path, encoding='utf-8') as f:
+                report = json.load(f)
+
+        self.assertEqual(set(report['scenarios']), {'submit', 'get', 'list', 'patch'})
+        for result in report['scenarios'].values():
+            self.assertEqual(result['errors'], 0)
+            self.assertGreater(result['queries_per_request'], 0)
+        self.assertEqual(compare_reports(report, report, 0.2), [])
+
+        slower = json.loads(json.dumps(report))
+        slower['scenarios']['get']['latency_ms']['p95'] = report['scenarios']['get']['latency_ms']['p95'] * 2 + 1
+        slower['scenarios']['list']['queries_per_request'] += 3
+        regressions = compare_reports(report, slower, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('get: p95'))
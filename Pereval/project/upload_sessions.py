@@ -0,0 +1,222 @@
+import fcntl
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import BinaryIO, Iterator, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Image, MountainPass, UploadSession
+from .storage import CHUNK_SIZE, DIGEST_RE, get_image_storage
+
+# Заголовок ответа с числом уже полученных байт
+OFFSET_HEADER = 'Upload-Offset'
+
+_CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+
+class OffsetMismatchError(Exception):
+    """Часть начинается не там, где остановилась загрузка (или загрузка не закончена): offset - сколько получено"""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class SessionBusyError(Exception):
+    """С файлом сессии уже работает другой запрос"""
+
+
+def sessions_dir() -> str:
+    """Каталог файлов сессий: внутри временного каталога хранилища, чтобы файл переносился в него без копирования"""
+    return os.path.join(get_image_storage().tmp_dir, 'sessions')
+
+
+def session_path(session_id) -> str:
+    return os.path.join(sessions_dir(), f'{session_id}.upload')
+
+
+def parse_content_range(value: str, size: int) -> Tuple[int, int]:
+    """
+    (начало, конец включительно) из заголовка Content-Range: bytes <начало>-<конец>/<размер>
+    Выбрасывает ValueError для некорректного заголовка
+    """
+    match = _CONTENT_RANGE_RE.fullmatch(value or '')
+    if match is None:
+        raise ValueError("Заголовок Content-Range должен иметь вид 'bytes <начало>-<конец>/<размер>'")
+    start, end, total = map(int, match.groups())
+    if total != size:
+        raise ValueError(f"Размер в Content-Range ({total}) не совпадает с размером файла сессии ({size})")
+    if start > end or end >= size:
+        raise ValueError(f"Некорректный диапазон в Content-Range: {start}-{end}")
+    return start, end
+
+
+def check_pass_editable(mountain_pass: MountainPass):
+    if mountain_pass.status != 'new':
+        raise ValueError("Добавлять изображения можно только к перевалу в статусе 'new'")
+
+
+def create_session(mountain_pass: MountainPass, data) -> UploadSession:
+    """
+    Сессия загрузки изображения перевала по данным {"title": ..., "size": <байт>, "sha256": <необязательно>}
+    Выбрасывает ValueError для некорректных данных
+    """
+    check_pass_editable(mountain_pass)
+    if not isinstance(data, dict):
+        raise ValueError("Ожидается JSON-объект с полями title, size и sha256")
+
+    title = data.get('title')
+    if not isinstance(title, str) or not title.strip() or len(title) > 255:
+        raise ValueError("Поле title должно быть непустой строкой до 255 символов")
+    size = data.get('size')
+    if not isinstance(size, int) or isinstance(size, bool) or not 0 < size <= settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise ValueError(f"Поле size должно быть целым числом от 1 до {settings.IMAGE_UPLOAD_MAX_SIZE}")
+    sha256 = data.get('sha256') or ''
+    if not isinstance(sha256, str) or sha256 and not DIGEST_RE.match(sha256.lower()):
+        raise ValueError("Поле sha256 должно содержать 64 шестнадцатеричных символа")
+
+    os.makedirs(sessions_dir(), exist_ok=True)
+    with transaction.atomic():
+        session = UploadSession.objects.create(
+            mountain_pass=mountain_pass, title=title, size=size, sha256=sha256.lower()
+        )
+        open(session_path(session.pk), 'xb').close()
+    return session
+
+
+@contextmanager
+def locked_file(session: UploadSession, mode: str) -> Iterator[BinaryIO]:
+    """
+    Файл сессии под эксклюзивной блокировкой flock: запись частей и завершение не выполняются одновременно
+    Блокировка не ждет - SessionBusyError. Транзакция БД на время передачи данных не открывается
+    """
+    with open(session_path(session.pk), mode) as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise SessionBusyError("С сессией загрузки уже работает другой запрос, повторите позже")
+        # Под блокировкой - актуальные offset и image
+        session.refresh_from_db(fields=['offset', 'image'])
+        yield f
+
+
+def write_chunk(session: UploadSession, start: int, stream, length: int) -> int:
+    """
+    Запись length байт из stream в файл сессии с позиции start (должна совпадать с offset)
+    Читается по CHUNK_SIZE; полученное до обрыва соединения сохраняется, и загрузку можно продолжить.
+    Возвращает новый offset
+    """
+    if session.image_id is not None:
+        raise ValueError("Загрузка уже завершена")
+
+    with locked_file(session, 'r+b') as f:
+        if session.image_id is not None:
+            raise ValueError("Загрузка уже завершена")
+        if start != session.offset:
+            raise OffsetMismatchError(
+                f"Часть должна начинаться с байта {session.offset}, а не {start}", session.offset
+            )
+
+        f.seek(start)
+        written = 0
+        try:
+            while written < length:
+                chunk = stream.read(min(CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+        finally:
+            f.flush()
+            os.fsync(f.fileno())
+            if written:
+                session.offset = start + written
+                UploadSession.objects.filter(pk=session.pk).update(offset=session.offset, updated_at=timezone.now())
+    return session.offset
+
+
+def finalize_session(session: UploadSession) -> Image:
+    """
+    Завершение загрузки: файл переносится в хранилище изображений (хэш считается чтением по частям,
+    без загрузки в память) и добавляется к перевалу. Повторный вызов возвращает то же изображение.
+    Если SHA-256 не совпал с заявленным, offset сбрасывается и файл нужно загрузить заново (ValueError)
+    """
+    if session.image_id is None:
+        try:
+            with locked_file(session, 'r+b') as f:
+                if session.image_id is None:
+                    return _finalize_locked(session, f)
+        except FileNotFoundError:
+            # Файл уже перенесен параллельным завершением
+            session.refresh_from_db(fields=['image'])
+            if session.image_id is None:
+                raise ValueError("Файл сессии загрузки не найден, создайте новую сессию")
+    return session.image
+
+
+def _finalize_locked(session: UploadSession, f: BinaryIO) -> Image:
+    if session.offset < session.size:
+        raise OffsetMismatchError(
+            f"Загрузка не закончена: получено {session.offset} из {session.size} байт", session.offset
+        )
+    mountain_pass = MountainPass.objects.only('status').get(pk=session.mountain_pass_id)
+    check_pass_editable(mountain_pass)
+
+    try:
+        blob = get_image_storage().save_file(session_path(session.pk), session.sha256 or None)
+    except ValueError:
+        f.truncate(0)
+        session.offset = 0
+        UploadSession.objects.filter(pk=session.pk).update(offset=0, updated_at=timezone.now())
+        raise ValueError("SHA-256 полученного файла не совпадает с заявленным, загрузите файл заново")
+
+    with transaction.atomic():
+        # Изображения входят в ответ о перевале: меняется и время его изменения (ETag, Last-Modified)
+        MountainPass.objects.filter(pk=session.mountain_pass_id).update(updated_at=timezone.now())
+        image = Image.objects.create(mountain_pass_id=session.mountain_pass_id, title=session.title, **blob.as_fields())
+        session.image = image
+        session.save(update_fields=['image', 'updated_at'])
+    return image
+
+
+def delete_session(session: UploadSession):
+    """Отмена загрузки: удаление файла и сессии (добавленное изображение остается)"""
+    try:
+        os.remove(session_path(session.pk))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def purge_expired(batch_size: int = 1000) -> int:
+    """
+    Удаление сессий без записи дольше UPLOAD_SESSION_TTL и файлов, оставшихся без сессии
+    (например, после удаления перевала). Возвращает число удаленных сессий
+    """
+    expired = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    deleted = 0
+    while True:
+        sessions = list(UploadSession.objects.filter(updated_at__lt=expired).only('pk')[:batch_size])
+        if not sessions:
+            break
+        for session in sessions:
+            delete_session(session)
+        deleted += len(sessions)
+
+    directory = sessions_dir()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            stem = name.rsplit('.', 1)[0]
+            try:
+                session_id = uuid.UUID(stem)
+            except ValueError:
+                continue
+            if os.path.getmtime(path) < expired.timestamp() and not UploadSession.objects.filter(pk=session_id).exists():
+                os.remove(path)
+    return deleted
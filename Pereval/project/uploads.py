@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from .storage import StoredBlob, get_image_storage
+
+
+class UploadedBlob:
+    """Файл из multipart-запроса, уже записанный в хранилище изображений"""
+
+    def __init__(self, name: str, content_type: str, blob: StoredBlob):
+        self.name = name
+        self.content_type = content_type
+        self.blob = blob
+        self.size = blob.size
+
+    def close(self):
+        # Вызывается Django при завершении запроса; держать открытым нечего
+        pass
+
+
+class BlobStorageUploadHandler(FileUploadHandler):
+    """
+    Обработчик загрузки, который пишет каждую часть multipart сразу в хранилище
+    В памяти находится только текущий фрагмент (chunk_size) и заголовок файла.
+    Файл больше IMAGE_UPLOAD_MAX_SIZE останавливает разбор запроса, причина - в error: представление
+    отвечает ошибкой, а не создает перевал без этого файла
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = getattr(settings, 'IMAGE_UPLOAD_MAX_SIZE', None)
+        self.writer = None
+        self.error = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.writer = get_image_storage().writer()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.writer.write(raw_data)
+        if self.max_size and self.writer.size > self.max_size:
+            self.writer.abort()
+            self.writer = None
+            self.error = f"Файл {self.field_name} больше допустимого размера {self.max_size} байт"
+            # Остаток тела запроса дочитывается, чтобы клиент получил ответ
+            raise StopUpload(connection_reset=False)
+        return None
+
+    def file_complete(self, file_size):
+        blob = self.writer.commit()
+        self.writer = None
+        return UploadedBlob(self.file_name, self.content_type, blob)
+
+    def upload_interrupted(self):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
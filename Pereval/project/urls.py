@@ -1,12 +1,49 @@
 from django.urls import path
+from .async_views import AsyncPassEventsView, AsyncSubmitDataDetailView, AsyncSubmitDataListView, AsyncSubmitDataView
 from .views import (
+    ImageContentAPIView,
+    ModerationClaimAPIView,
+    ModerationQueueAPIView,
+    ModerationTransitionAPIView,
+    PassUploadSessionsAPIView,
     SubmitDataAPIView,
+    SubmitDataBBoxAPIView,
+    SubmitDataBulkAPIView,
+    SubmitDataChangesAPIView,
+    SubmitDataExportAPIView,
+    SubmitDataNearestAPIView,
+    SubmitDataSearchAPIView,
     SubmitDataDetailAPIView,
-    SubmitDataListAPIView
+    SubmitDataListAPIView,
+    UploadSessionAPIView,
+    UploadSessionFinalizeAPIView
 )
 
 urlpatterns = [
     path('submitData/', SubmitDataAPIView.as_view(), name='submit-data'),
+    path('submitData/bulk/', SubmitDataBulkAPIView.as_view(), name='submit-data-bulk'),
+    path('submitData/bbox/', SubmitDataBBoxAPIView.as_view(), name='submit-data-bbox'),
+    path('submitData/nearest/', SubmitDataNearestAPIView.as_view(), name='submit-data-nearest'),
+    path('submitData/search/', SubmitDataSearchAPIView.as_view(), name='submit-data-search'),
+    path('submitData/changes/', SubmitDataChangesAPIView.as_view(), name='submit-data-changes'),
+    path('submitData/export/', SubmitDataExportAPIView.as_view(), name='submit-data-export'),
     path('submitData/<int:pk>/', SubmitDataDetailAPIView.as_view(), name='submit-data-detail'),
     path('submitData/list/', SubmitDataListAPIView.as_view(), name='submit-data-list'),
+    path('images/<int:pk>/', ImageContentAPIView.as_view(), name='image-content'),
+
+    # Возобновляемая загрузка изображений частями
+    path('submitData/<int:pk>/uploads/', PassUploadSessionsAPIView.as_view(), name='pass-upload-sessions'),
+    path('uploads/<uuid:pk>/', UploadSessionAPIView.as_view(), name='upload-session'),
+    path('uploads/<uuid:pk>/finalize/', UploadSessionFinalizeAPIView.as_view(), name='upload-session-finalize'),
+
+    # Модерация (только для сотрудников, is_staff)
+    path('moderation/', ModerationQueueAPIView.as_view(), name='moderation-queue'),
+    path('moderation/claim/', ModerationClaimAPIView.as_view(), name='moderation-claim'),
+    path('moderation/transition/', ModerationTransitionAPIView.as_view(), name='moderation-transition'),
+
+    # Асинхронные варианты для запуска под ASGI (uvicorn, daphne)
+    path('async/submitData/', AsyncSubmitDataView.as_view(), name='async-submit-data'),
+    path('async/submitData/<int:pk>/', AsyncSubmitDataDetailView.as_view(), name='async-submit-data-detail'),
+    path('async/submitData/list/', AsyncSubmitDataListView.as_view(), name='async-submit-data-list'),
+    path('async/events/', AsyncPassEventsView.as_view(), name='async-pass-events'),
 ]
\ No newline at end of file
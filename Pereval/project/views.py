@@ -1,76 +1,366 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.reverse import reverse
+from datetime import datetime, time, timedelta
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
+from django.db.models import F, Q
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import MountainPass, User
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
+from . import changes, export, idempotency, upload_sessions
+from .cache import get_pass_payload, store_pass_payload
+from .documents import KINDS, render_passes
+from .metrics import measure_serialization, serializer_data
+from .models import Image, ImageVariant, Level, MountainPass, UploadSession, User
+from .moderation import QUEUE_STATUSES, claim_passes, transition_passes
+from .pagination import ChangesPagination, KeysetPagination, QueuePagination, RankPagination
+from .parsers import ORJSONParser, loads
 from .serializers import (
+    ImageSummarySerializer,
     MountainPassCreateSerializer,
-    MountainPassSerializer,
+    MountainPassLocationSerializer,
     MountainPassUpdateSerializer
 )
+from .storage import get_image_storage
+from .uploads import BlobStorageUploadHandler
+
+
+def check_required_fields(data):
+    """
+    Проверка обязательных полей перевала, пользователя и координат
+    Возвращает текст ошибки или None
+    """
+    required_fields = ['title', 'user', 'coords', 'level']
+    for field in required_fields:
+        if field not in data:
+            return f"Отсутствует обязательное поле: {field}"
+
+    # Валидация пользователя
+    user_fields = ['email', 'fam', 'name', 'phone']
+    for field in user_fields:
+        if field not in data.get('user', {}):
+            return f"Отсутствует поле пользователя: {field}"
+
+    # Валидация координат
+    coord_fields = ['latitude', 'longitude', 'height']
+    for field in coord_fields:
+        if field not in data.get('coords', {}):
+            return f"Отсутствует поле координат: {field}"
+
+    return None
+
+
+def create_mountain_pass(data):
+    """
+    Проверка и создание перевала в транзакции
+    Возвращает (перевал, None) или (None, текст ошибки)
+    """
+    error = check_required_fields(data)
+    if error:
+        return None, error
+
+    with transaction.atomic():
+        serializer = MountainPassCreateSerializer(data=data)
+        if not serializer.is_valid():
+            return None, f"Ошибка валидации данных: {serializer.errors}"
+        return serializer.save(), None
+
+
+def submit_mountain_pass(data):
+    """Добавление перевала: (код ответа, тело ответа) для POST /submitData/"""
+    mountain_pass, error = create_mountain_pass(data)
+    if error:
+        return status.HTTP_400_BAD_REQUEST, {"status": 400, "message": error, "id": None}
+    return status.HTTP_200_OK, {"status": 200, "message": "Отправлено успешно", "id": mountain_pass.id}
+
+
+def update_mountain_pass(mountain_pass, data):
+    """
+    Частичное обновление перевала в транзакции
+    Редактировать можно только перевал в статусе 'new' и без изменения пользователя
+    Возвращает текст ошибки или None
+    """
+    if mountain_pass.status != 'new':
+        return "Редактирование запрещено: перевал не в статусе 'new'"
+
+    if 'user' in data:
+        return "Редактирование данных пользователя запрещено"
+
+    serializer = MountainPassUpdateSerializer(mountain_pass, data=data, partial=True)
+    if not serializer.is_valid():
+        return f"Ошибка валидации данных: {serializer.errors}"
+    with transaction.atomic():
+        serializer.save()
+    return None
+
+
+def get_multipart_data(metadata, files):
+    """
+    Сборка данных перевала из multipart-запроса
+    Изображения в metadata ссылаются на файловые части по имени: {"title": ..., "file": "photo1"}.
+    Если images в metadata не указаны, изображениями считаются все переданные файлы
+    Возвращает (data, error)
+    """
+    try:
+        data = loads(metadata)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return None, "Часть metadata должна содержать JSON с данными перевала"
+
+    if 'images' not in data:
+        data['images'] = [
+            {"title": upload.name, "data": upload}
+            for name in files
+            for upload in files.getlist(name)
+        ]
+        return data, None
+
+    for image in data['images'] if isinstance(data['images'], list) else []:
+        if isinstance(image, dict) and 'file' in image:
+            file_name = str(image.pop('file'))
+            upload = files.get(file_name)
+            if upload is None:
+                return None, f"Не найден файл изображения: {file_name}"
+            image['data'] = upload
+    return data, None
+
+
+def parse_date_param(value, name):
+    """
+    Дата или дата-время из параметра запроса
+    Возвращает (datetime, только_дата); для даты без времени - начало этого дня
+    """
+    try:
+        day = parse_date(value)
+        parsed = parse_datetime(value) if day is None else None
+    except ValueError:
+        parsed = day = None
+    if parsed is None and day is None:
+        raise ValueError(f"Некорректная дата в параметре {name}: {value}")
+    if parsed is None:
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed, day is not None
+
+
+def filter_mountain_passes(queryset, params):
+    """
+    Фильтры списка перевалов:
+    status, user__email, level (категория в любом сезоне, season - в конкретном), date_from, date_to
+    Выбрасывает ValueError для некорректных значений
+    """
+    statuses = dict(MountainPass.STATUS_CHOICES)
+    levels = dict(Level.DIFFICULTY_CHOICES)
+    seasons = ['winter', 'summer', 'autumn', 'spring']
+
+    if 'status' in params:
+        if params['status'] not in statuses:
+            raise ValueError(f"Некорректный статус: {params['status']}")
+        queryset = queryset.filter(status=params['status'])
+
+    if 'user__email' in params:
+        queryset = queryset.filter(user__email=params['user__email'])
+
+    if 'level' in params:
+        level = params['level']
+        if not level or level not in levels:
+            raise ValueError(f"Некорректная категория сложности: {level}")
+        season = params.get('season')
+        if season is not None and season not in seasons:
+            raise ValueError(f"Некорректный сезон: {season}")
+        condition = Q()
+        for field in [season] if season else seasons:
+            condition |= Q(**{f'level__{field}': level})
+        queryset = queryset.filter(condition)
+
+    if 'date_from' in params:
+        date_from, _ = parse_date_param(params['date_from'], 'date_from')
+        queryset = queryset.filter(add_time__gte=date_from)
+
+    if 'date_to' in params:
+        date_to, date_only = parse_date_param(params['date_to'], 'date_to')
+        if date_only:
+            # Дата без времени включает весь день
+            queryset = queryset.filter(add_time__lt=date_to + timedelta(days=1))
+        else:
+            queryset = queryset.filter(add_time__lte=date_to)
+
+    return queryset
+
+
+def get_list_representation(params, default='full'):
+    """
+    Представление списка перевалов по параметру view:
+    full - полное, с содержимым изображений; summary - краткое, изображения только ссылками
+    Возвращает (queryset с документами перевалов, вид представления для render_passes)
+    """
+    view = params.get('view', default)
+    if view not in KINDS:
+        raise ValueError(f"Некорректное значение параметра view: {view}")
+    return MountainPass.objects.with_document(view), view
 
 
 class SubmitDataAPIView(APIView):
     """
+    GET /submitData/ - Список перевалов с фильтрами и постраничной выдачей по курсору
     POST /submitData/ - Добавление нового перевала
+    Принимает JSON или multipart/form-data (часть metadata с JSON перевала и файлы изображений)
     """
+    parser_classes = [ORJSONParser, MultiPartParser]
+
+    def get(self, request):
+        """GET /submitData/?status=&level=&season=&date_from=&date_to=&user__email=&cursor=&limit=&view="""
+        try:
+            queryset, kind = get_list_representation(request.query_params)
+            mountain_passes = filter_mountain_passes(queryset, request.query_params)
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(mountain_passes, request, view=self)
+        except ValueError as e:
+            return Response({
+                "status": 0,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return paginator.get_paginated_response(measure_serialization(render_passes, page, kind, request))
 
     def post(self, request):
+        """
+        POST /submitData/ - Добавить перевал
+        С заголовком Idempotency-Key повтор запроса возвращает первый ответ, не создавая перевал заново
+        """
         try:
-            # Базовая валидация обязательных полей
-            required_fields = ['title', 'user', 'coords', 'level']
-            for field in required_fields:
-                if field not in request.data:
-                    return Response({
-                        "status": 400,
-                        "message": f"Отсутствует обязательное поле: {field}",
-                        "id": None
-                    }, status=status.HTTP_400_BAD_REQUEST)
+            key = idempotency.get_key(request)
+        except ValueError as e:
+            return Response({
+                "status": 400,
+                "message": str(e),
+                "id": None
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Валидация пользователя
-            user_fields = ['email', 'fam', 'name', 'phone']
-            for field in user_fields:
-                if field not in request.data.get('user', {}):
+        try:
+            if request.content_type.startswith('multipart/form-data'):
+                # Файлы пишутся в хранилище по мере чтения тела запроса, без буферизации в памяти
+                upload_handler = BlobStorageUploadHandler(request._request)
+                request.upload_handlers = [upload_handler]
+                metadata = request.data.get('metadata', '')
+                if upload_handler.error:
                     return Response({
-                        "status": 400,
-                        "message": f"Отсутствует поле пользователя: {field}",
+                        "status": 413,
+                        "message": upload_handler.error,
                         "id": None
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Валидация координат
-            coord_fields = ['latitude', 'longitude', 'height']
-            for field in coord_fields:
-                if field not in request.data.get('coords', {}):
+                    }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+                data, error = get_multipart_data(metadata, request.FILES)
+                if error:
                     return Response({
                         "status": 400,
-                        "message": f"Отсутствует поле координат: {field}",
+                        "message": error,
                         "id": None
                     }, status=status.HTTP_400_BAD_REQUEST)
+                fingerprint = idempotency.multipart_fingerprint(metadata, request.FILES) if key else None
+                submit = partial(submit_mountain_pass, data)
+            else:
+                # JSON разбирается только при первом выполнении: повтор не тратит время на разбор и проверку
+                fingerprint = idempotency.body_fingerprint(request.body) if key else None
+                submit = lambda: submit_mountain_pass(request.data)
+
+            # Проверка и создание в транзакции
+            status_code, payload, replayed = idempotency.run_once('submit-data', key, fingerprint, submit)
+            headers = {idempotency.REPLAYED_HEADER: 'true'} if replayed else None
+            return Response(payload, status=status_code, headers=headers)
+
+        except idempotency.KeyReusedError as e:
+            return Response({
+                "status": 422,
+                "message": str(e),
+                "id": None
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except Exception as e:
+            return Response({
+                "status": 500,
+                "message": f"Внутренняя ошибка сервера: {str(e)}",
+                "id": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class SubmitDataBulkAPIView(APIView):
+    """
+    POST /submitData/bulk/ - Добавление пачки перевалов (синхронизация офлайн-данных)
+    Все записи проверяются вместе, корректные сохраняются одной транзакцией,
+    по каждой записи возвращается отдельный результат
+    """
+    max_items = 500
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({
+                "status": 400,
+                "message": "Ожидается непустой массив перевалов",
+                "results": []
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Создание в транзакции
-            with transaction.atomic():
-                serializer = MountainPassCreateSerializer(data=request.data)
+        if len(items) > self.max_items:
+            return Response({
+                "status": 400,
+                "message": f"Слишком много перевалов в одном запросе: максимум {self.max_items}",
+                "results": []
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(items)
+        valid_indexes = []
+        valid_data = []
 
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                error = "Перевал должен быть объектом"
+            else:
+                error = check_required_fields(item)
+            if not error:
+                serializer = MountainPassCreateSerializer(data=item)
                 if serializer.is_valid():
-                    mountain_pass = serializer.save()
-                    return Response({
+                    valid_indexes.append(index)
+                    valid_data.append(serializer.validated_data)
+                    continue
+                error = f"Ошибка валидации данных: {serializer.errors}"
+            results[index] = {"index": index, "status": 400, "message": error, "id": None}
+
+        try:
+            if valid_data:
+                with transaction.atomic():
+                    mountain_passes = MountainPassCreateSerializer(many=True).create(valid_data)
+
+                for index, mountain_pass in zip(valid_indexes, mountain_passes):
+                    results[index] = {
+                        "index": index,
                         "status": 200,
                         "message": "Отправлено успешно",
                         "id": mountain_pass.id
-                    }, status=status.HTTP_200_OK)
-                else:
-                    return Response({
-                        "status": 400,
-                        "message": f"Ошибка валидации данных: {serializer.errors}",
-                        "id": None
-                    }, status=status.HTTP_400_BAD_REQUEST)
+                    }
+
+            return Response({
+                "status": 200,
+                "message": f"Добавлено перевалов: {len(valid_data)} из {len(items)}",
+                "results": results
+            }, status=status.HTTP_200_OK)
 
         except Exception as e:
             return Response({
                 "status": 500,
                 "message": f"Внутренняя ошибка сервера: {str(e)}",
-                "id": None
+                "results": []
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -81,54 +371,52 @@ class SubmitDataDetailAPIView(APIView):
     """
 
     def get(self, request, pk):
-        """GET /submitData/<id>/ - Получить перевал по ID"""
-        try:
-            mountain_pass = MountainPass.objects.get(pk=pk)
-            serializer = MountainPassSerializer(mountain_pass)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except MountainPass.DoesNotExist:
-            return Response({
-                "status": 0,
-                "message": f"Перевал с id {pk} не найден"
-            }, status=status.HTTP_404_NOT_FOUND)
+        """
+        GET /submitData/<id>/ - Получить перевал по ID
+        Представление берется из кэша, при промахе - из документа перевала одним запросом;
+        If-None-Match / If-Modified-Since дают 304 без сборки ответа
+        """
+        payload = get_pass_payload(pk)
+        if payload is None:
+            mountain_pass = MountainPass.objects.with_document('full').filter(pk=pk).first()
+            data = measure_serialization(render_passes, [mountain_pass], 'full') if mountain_pass else []
+            if not data:
+                return Response({
+                    "status": 0,
+                    "message": f"Перевал с id {pk} не найден"
+                }, status=status.HTTP_404_NOT_FOUND)
+            payload = store_pass_payload(pk, data[0], mountain_pass.updated_at)
+
+        headers = {
+            'ETag': payload['etag'],
+            'Last-Modified': http_date(payload['last_modified']),
+        }
+        not_modified = get_conditional_response(
+            request, etag=payload['etag'], last_modified=payload['last_modified']
+        )
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified[header] = value
+            return not_modified
+        return Response(payload['data'], status=status.HTTP_200_OK, headers=headers)
 
     def patch(self, request, pk):
         """PATCH /submitData/<id>/ - Редактировать перевал"""
         try:
-            mountain_pass = MountainPass.objects.get(pk=pk)
+            mountain_pass = MountainPass.objects.select_related('coords', 'level').get(pk=pk)
 
-            # Проверяем статус перевала
-            if mountain_pass.status != 'new':
+            # Проверяем, что редактирование разрешено, и обновляем перевал
+            error = update_mountain_pass(mountain_pass, request.data)
+            if error:
                 return Response({
                     "state": 0,
-                    "message": "Редактирование запрещено: перевал не в статусе 'new'"
+                    "message": error
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Проверяем, что не пытаются изменить данные пользователя
-            if 'user' in request.data:
-                return Response({
-                    "state": 0,
-                    "message": "Редактирование данных пользователя запрещено"
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Обновляем перевал
-            serializer = MountainPassUpdateSerializer(
-                mountain_pass,
-                data=request.data,
-                partial=True
-            )
-
-            if serializer.is_valid():
-                serializer.save()
-                return Response({
-                    "state": 1,
-                    "message": "Запись успешно обновлена"
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response({
-                    "state": 0,
-                    "message": f"Ошибка валидации данных: {serializer.errors}"
-                }, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                "state": 1,
+                "message": "Запись успешно обновлена"
+            }, status=status.HTTP_200_OK)
 
         except MountainPass.DoesNotExist:
             return Response({
@@ -142,9 +430,89 @@ class SubmitDataDetailAPIView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class SubmitDataChangesAPIView(APIView):
+    """
+    GET /submitData/changes/?cursor=&limit=&user__email=&view= - Лента изменений для синхронизации
+    Перевалы, добавленные или измененные после cursor (в т.ч. смена статуса и изображений), и id удаленных.
+    Без cursor - первая синхронизация: все перевалы. Клиент запрашивает страницы, пока has_more = true,
+    и сохраняет cursor из последнего ответа до следующей синхронизации
+    """
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            queryset, kind = get_list_representation(params)
+            cursor = changes.ChangesCursor.decode(params['cursor']) if params.get('cursor') else None
+            limit = ChangesPagination().get_page_size(request)
+        except ValueError as e:
+            return Response({
+                "status": 0,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = None
+        if params.get('user__email'):
+            # Пользователя еще нет - лента пуста, его перевалы придут при следующей синхронизации
+            user_id = User.objects.filter(email=params['user__email']).values_list('pk', flat=True).first() or 0
+
+        try:
+            changed, deleted, next_cursor, has_more = changes.changes_page(cursor, limit, user_id)
+        except changes.CursorExpiredError as e:
+            return Response({
+                "status": 0,
+                "message": str(e)
+            }, status=status.HTTP_410_GONE)
+
+        mountain_passes = {mountain_pass.pk: mountain_pass for mountain_pass in queryset.filter(pk__in=changed)}
+        # Перевал мог быть удален между запросами - он придет в deleted следующей страницы
+        page = [mountain_passes[pk] for pk in changed if pk in mountain_passes]
+        return Response({
+            "changes": measure_serialization(render_passes, page, kind, request),
+            "deleted": deleted,
+            "cursor": next_cursor.encode(),
+            "has_more": has_more,
+        })
+
+
+class SubmitDataExportAPIView(APIView):
+    """
+    GET /submitData/export/?output=ndjson|csv&status=&level=&season=&date_from=&date_to=
+    Выгрузка каталога перевалов потоком: NDJSON (краткое представление, по перевалу в строке) или CSV.
+    По умолчанию - только принятые перевалы. При Accept-Encoding: gzip ответ сжимается
+    """
+
+    def get(self, request):
+        params = request.query_params
+        output = params.get('output', 'ndjson')
+        filters = {'status': 'accepted', **params.dict()}
+        try:
+            if output not in export.FORMATS:
+                raise ValueError(f"Некорректный формат выгрузки: {output}")
+            mountain_passes = filter_mountain_passes(MountainPass.objects.all(), filters)
+        except ValueError as e:
+            return Response({
+                "status": 0,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        compress = export.accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        chunks = export.export_chunks(mountain_passes, output, compress, request=request)
+        if isinstance(request._request, ASGIRequest):
+            chunks = export.async_chunks(chunks)
+
+        content_type, extension = export.FORMATS[output]
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="perevals.{extension}"'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
 class SubmitDataListAPIView(APIView):
     """
     GET /submitData/?user__email=<email> - Список перевалов по email пользователя
+    view=summary - краткое представление без содержимого изображений
     """
 
     def get(self, request):
@@ -157,25 +525,456 @@ class SubmitDataListAPIView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # Находим пользователя
-            user = User.objects.get(email=email)
+            queryset, kind = get_list_representation(request.query_params)
+        except ValueError as e:
+            return Response({
+                "status": 0,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Перевалы пользователя со всеми связанными данными: число запросов не зависит от их количества
+            mountain_passes = list(queryset.filter(user__email=email))
 
-            # Находим перевалы пользователя
-            mountain_passes = MountainPass.objects.filter(user=user)
+            # Пустой список - либо перевалов нет, либо нет самого пользователя
+            if not mountain_passes and not User.objects.filter(email=email).exists():
+                return Response({
+                    "status": 0,
+                    "message": f"Пользователь с email {email} не найден"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            data = measure_serialization(render_passes, mountain_passes, kind, request)
+            return Response(data, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({
+                "status": 0,
+                "message": f"Ошибка при получении данных: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            if not mountain_passes.exists():
-                return Response([], status=status.HTTP_200_OK)
 
-            serializer = MountainPassSerializer(mountain_passes, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+class ImageContentAPIView(APIView):
+    """
+    GET /images/<id>/?variant= - Содержимое изображения или его уменьшенного варианта (thumbnail, medium)
+    Содержимое по id не меняется, поэтому ETag - хэш содержимого.
+    Пока вариант не построен, отдается исходное изображение с коротким временем кэширования
+    """
 
-        except User.DoesNotExist:
+    def get(self, request, pk):
+        variant = request.query_params.get('variant')
+        if variant is not None and variant not in settings.IMAGE_VARIANTS:
             return Response({
                 "status": 0,
-                "message": f"Пользователь с email {email} не найден"
+                "message": f"Некорректный вариант изображения: {variant}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        image = None
+        if variant:
+            image = ImageVariant.objects.filter(image_id=pk, kind=variant).only('sha256', 'mime_type').first()
+        max_age = 86400 if variant is None or image is not None else 60
+
+        if image is None:
+            try:
+                image = Image.objects.only('sha256', 'mime_type').get(pk=pk)
+            except Image.DoesNotExist:
+                return Response({
+                    "status": 0,
+                    "message": f"Изображение с id {pk} не найдено"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'"{image.sha256}"'
+        if request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified(headers={'ETag': etag})
+
+        response = FileResponse(get_image_storage().open(image.sha256), content_type=image.mime_type)
+        response['ETag'] = etag
+        response['Cache-Control'] = f'public, max-age={max_age}'
+        return response
+
+
+def upload_session_data(session):
+    """Состояние сессии загрузки для ответа"""
+    return {
+        "id": str(session.pk),
+        "title": session.title,
+        "size": session.size,
+        "offset": session.offset,
+        "complete": session.offset == session.size,
+        "image": session.image_id,
+    }
+
+
+def offset_headers(session):
+    return {upload_sessions.OFFSET_HEADER: str(session.offset)}
+
+
+class PassUploadSessionsAPIView(APIView):
+    """
+    POST /submitData/<id>/uploads/ - Создание сессии возобновляемой загрузки изображения перевала
+    {"title": "Седловина", "size": 8388608, "sha256": "..."} (sha256 необязателен, проверяется при завершении)
+    """
+
+    def post(self, request, pk):
+        try:
+            mountain_pass = MountainPass.objects.only('status').get(pk=pk)
+            session = upload_sessions.create_session(mountain_pass, request.data)
+        except MountainPass.DoesNotExist:
+            return Response({
+                "state": 0,
+                "message": f"Перевал с id {pk} не найден"
             }, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
+        except ValueError as e:
+            return Response({
+                "state": 0,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        url = reverse('upload-session', kwargs={'pk': session.pk}, request=request)
+        return Response({
+            "state": 1,
+            "message": "Сессия загрузки создана",
+            "url": url,
+            **upload_session_data(session)
+        }, status=status.HTTP_201_CREATED, headers={'Location': url, **offset_headers(session)})
+
+
+class UploadSessionAPIView(APIView):
+    """
+    GET (HEAD) /uploads/<id>/ - Сколько байт уже получено (offset, заголовок Upload-Offset)
+    PUT /uploads/<id>/ - Часть файла: тело - байты, заголовок Content-Range: bytes <начало>-<конец>/<размер>.
+    Начало должно совпадать с offset; после обрыва связи загрузка продолжается с offset из GET
+    DELETE /uploads/<id>/ - Отмена загрузки
+    """
+
+    def get_session(self, pk):
+        return UploadSession.objects.filter(pk=pk).first()
+
+    def not_found(self, pk):
+        return Response({
+            "state": 0,
+            "message": f"Сессия загрузки {pk} не найдена"
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    def get(self, request, pk):
+        session = self.get_session(pk)
+        if session is None:
+            return self.not_found(pk)
+        return Response(upload_session_data(session), headers={'Cache-Control': 'no-store', **offset_headers(session)})
+
+    def put(self, request, pk):
+        session = self.get_session(pk)
+        if session is None:
+            return self.not_found(pk)
+
+        try:
+            start, end = upload_sessions.parse_content_range(request.headers.get('Content-Range'), session.size)
+            length = end - start + 1
+            if int(request.headers.get('Content-Length') or 0) != length:
+                raise ValueError(f"Длина тела запроса должна совпадать с диапазоном Content-Range: {length} байт")
+            # Тело читается из потока частями, без разбора и без буферизации в памяти
+            offset = upload_sessions.write_chunk(session, start, request._request, length)
+        except upload_sessions.OffsetMismatchError as e:
+            return Response({
+                "state": 0,
+                "message": str(e),
+                "offset": e.offset
+            }, status=status.HTTP_409_CONFLICT, headers={upload_sessions.OFFSET_HEADER: str(e.offset)})
+        except upload_sessions.SessionBusyError as e:
+            return Response({
+                "state": 0,
+                "message": str(e),
+            }, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({
+                "state": 0,
+                "message": str(e),
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except OSError as e:
+            # Обрыв соединения: полученное сохранено, клиент продолжит с offset
+            return Response({
+                "state": 0,
+                "message": f"Ошибка при получении части: {str(e)}",
+                "offset": session.offset
+            }, status=status.HTTP_400_BAD_REQUEST, headers=offset_headers(session))
+
+        if offset < start + length:
+            return Response({
+                "state": 0,
+                "message": f"Получено {offset - start} из {length} байт части, продолжите с offset",
+                "offset": offset
+            }, status=status.HTTP_400_BAD_REQUEST, headers=offset_headers(session))
+
+        return Response({
+            "state": 1,
+            "message": "Часть получена",
+            **upload_session_data(session)
+        }, headers=offset_headers(session))
+
+    def delete(self, request, pk):
+        session = self.get_session(pk)
+        if session is None:
+            return self.not_found(pk)
+        upload_sessions.delete_session(session)
+        return Response({
+            "state": 1,
+            "message": "Сессия загрузки удалена"
+        })
+
+
+class UploadSessionFinalizeAPIView(APIView):
+    """
+    POST /uploads/<id>/finalize/ - Завершение загрузки: файл становится изображением перевала
+    Повторный запрос возвращает то же изображение
+    """
+
+    def post(self, request, pk):
+        session = UploadSession.objects.filter(pk=pk).first()
+        if session is None:
+            return Response({
+                "state": 0,
+                "message": f"Сессия загрузки {pk} не найдена"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            image = upload_sessions.finalize_session(session)
+        except upload_sessions.OffsetMismatchError as e:
+            return Response({
+                "state": 0,
+                "message": str(e),
+                "offset": e.offset
+            }, status=status.HTTP_409_CONFLICT, headers={upload_sessions.OFFSET_HEADER: str(e.offset)})
+        except upload_sessions.SessionBusyError as e:
+            return Response({
+                "state": 0,
+                "message": str(e),
+            }, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({
+                "state": 0,
+                "message": str(e),
+                "offset": session.offset
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        return Response({
+            "state": 1,
+            "message": "Изображение добавлено",
+            "image": ImageSummarySerializer(image, context={'request': request}).data
+        })
+
+
+def parse_float_param(params, name, min_value, max_value):
+    """Обязательный числовой параметр запроса в заданных границах"""
+    if name not in params:
+        raise ValueError(f"Не указан параметр {name}")
+    try:
+        value = float(params[name])
+    except ValueError:
+        raise ValueError(f"Некорректное значение параметра {name}: {params[name]}")
+    if not min_value <= value <= max_value:
+        raise ValueError(f"Параметр {name} должен быть в диапазоне [{min_value}, {max_value}]")
+    return value
+
+
+class SubmitDataBBoxAPIView(APIView):
+    """
+    GET /submitData/bbox/?min_lat=&min_lon=&max_lat=&max_lon= - Перевалы в прямоугольнике координат
+    min_lon > max_lon - прямоугольник через 180-й меридиан. Поддерживаются фильтры списка перевалов
+    """
+    default_limit = 500
+    max_limit = 5000
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            min_lat = parse_float_param(params, 'min_lat', -90.0, 90.0)
+            max_lat = parse_float_param(params, 'max_lat', -90.0, 90.0)
+            min_lon = parse_float_param(params, 'min_lon', -180.0, 180.0)
+            max_lon = parse_float_param(params, 'max_lon', -180.0, 180.0)
+            if min_lat > max_lat:
+                raise ValueError("min_lat больше max_lat")
+            limit = int(parse_float_param(params, 'limit', 1, self.max_limit)) if 'limit' in params else self.default_limit
+
+            mountain_passes = filter_mountain_passes(
+                MountainPass.objects.select_related('coords'), params
+            ).in_bbox(min_lat, min_lon, max_lat, max_lon)
+        except ValueError as e:
             return Response({
                 "status": 0,
-                "message": f"Ошибка при получении данных: {str(e)}"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        mountain_passes = list(mountain_passes[:limit + 1])
+        serializer = MountainPassLocationSerializer(mountain_passes[:limit], many=True)
+        return Response({
+            "truncated": len(mountain_passes) > limit,
+            "results": serializer_data(serializer)
+        }, status=status.HTTP_200_OK)
+
+
+class SubmitDataNearestAPIView(APIView):
+    """
+    GET /submitData/nearest/?lat=&lon=&k= - k ближайших к точке перевалов с расстоянием в км
+    Поддерживаются фильтры списка перевалов
+    """
+    default_k = 10
+    max_k = 100
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            latitude = parse_float_param(params, 'lat', -90.0, 90.0)
+            longitude = parse_float_param(params, 'lon', -180.0, 180.0)
+            k = int(parse_float_param(params, 'k', 1, self.max_k)) if 'k' in params else self.default_k
+
+            mountain_passes = filter_mountain_passes(
+                MountainPass.objects.select_related('coords'), params
+            ).nearest(latitude, longitude, k)
+        except ValueError as e:
+            return Response({
+                "status": 0,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = MountainPassLocationSerializer(mountain_passes, many=True)
+        return Response(serializer_data(serializer), status=status.HTTP_200_OK)
+
+
+class SubmitDataSearchAPIView(APIView):
+    """
+    GET /submitData/search/?q= - Поиск перевалов по названию, другим названиям и beauty_title
+    Находит словоформы, написание с опечатками и транслитерацию; результаты по убыванию
+    релевантности (поле rank), постранично по курсору. По умолчанию краткое представление (view=summary).
+    Поддерживаются фильтры списка перевалов
+    """
+
+    def get(self, request):
+        params = request.query_params
+        text = params.get('q', '').strip()
+        if not text:
+            return Response({
+                "status": 0,
+                "message": "Не указан параметр q"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            queryset, kind = get_list_representation(params, default='summary')
+            mountain_passes = filter_mountain_passes(queryset, params).search(text)
+            paginator = RankPagination()
+            page = paginator.paginate_queryset(mountain_passes, request, view=self)
+        except ValueError as e:
+            return Response({
+                "status": 0,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        data = measure_serialization(render_passes, page, kind, request)
+        ranks = {mountain_pass.pk: mountain_pass.search_rank for mountain_pass in page}
+        for item in data:
+            item['rank'] = round(ranks[item['id']], 4)
+        return paginator.get_paginated_response(data)
+
+
+class ModerationQueueAPIView(APIView):
+    """
+    GET /moderation/?status=&mine=&view=&cursor=&limit= - Очередь модерации: перевалы в статусах new и pending,
+    сначала давно ожидающие. mine=1 - только взятые текущим модератором. Поддерживаются фильтры списка перевалов,
+    по умолчанию краткое представление; у каждого перевала поле moderation - модератор и время, когда перевал взят
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            if 'status' in params and params['status'] not in QUEUE_STATUSES:
+                raise ValueError(f"Статус {params['status']} не относится к очереди модерации")
+            queryset, kind = get_list_representation(params, default='summary')
+            queryset = filter_mountain_passes(queryset.filter(status__in=QUEUE_STATUSES), params).annotate(
+                moderator_name=F(f'moderator__{get_user_model().USERNAME_FIELD}'),
+                claimed=F('claimed_at'),
+            )
+            if params.get('mine') in ('1', 'true'):
+                queryset = queryset.filter(moderator=request.user)
+            paginator = QueuePagination()
+            page = paginator.paginate_queryset(queryset, request, view=self)
+        except ValueError as e:
+            return Response({
+                "status": 0,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        data = measure_serialization(render_passes, page, kind, request)
+        passes = {mountain_pass.pk: mountain_pass for mountain_pass in page}
+        for item in data:
+            mountain_pass = passes[item['id']]
+            item['moderation'] = {'moderator': mountain_pass.moderator_name, 'claimed_at': mountain_pass.claimed}
+        return paginator.get_paginated_response(data)
+
+
+class ModerationClaimAPIView(APIView):
+    """
+    POST /moderation/claim/ - Взять перевалы из очереди на модерацию: {"limit": 20}
+    Перевалы переходят в статус pending и закрепляются за модератором; одновременные запросы
+    разных модераторов получают разные перевалы. Перевал без решения дольше MODERATION_CLAIM_TIMEOUT
+    снова попадает в выдачу
+    """
+    permission_classes = [IsAdminUser]
+    max_limit = 100
+
+    def post(self, request):
+        limit = request.data.get('limit', 20) if isinstance(request.data, dict) else None
+        if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= self.max_limit:
+            return Response({
+                "state": 0,
+                "message": f"limit должен быть целым числом от 1 до {self.max_limit}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        pks = claim_passes(request.user, limit)
+        return Response({
+            "state": 1,
+            "message": f"Взято перевалов: {len(pks)}",
+            "ids": pks
+        }, status=status.HTTP_200_OK)
+
+
+class ModerationTransitionAPIView(APIView):
+    """
+    POST /moderation/transition/ - Смена статуса пачки перевалов: {"ids": [...], "from": "pending", "to": "accepted"}
+    Меняются только перевалы, которые все еще в статусе from (и, кроме суперпользователя, взяты этим модератором);
+    остальные возвращаются в conflicts. Если не изменился ни один перевал - 409
+    """
+    permission_classes = [IsAdminUser]
+    max_items = 500
+
+    def post(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        ids = data.get('ids')
+        if (
+            not isinstance(ids, list) or not ids
+            or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)
+        ):
+            return Response({
+                "state": 0,
+                "message": "ids должен быть непустым массивом id перевалов"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.max_items:
+            return Response({
+                "state": 0,
+                "message": f"Слишком много перевалов в одном запросе: максимум {self.max_items}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        claimed_by = None if request.user.is_superuser else request.user.pk
+        try:
+            updated = transition_passes(ids, data.get('from'), data.get('to'), request.user, claimed_by=claimed_by)
+        except ValueError as e:
+            return Response({
+                "state": 0,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        requested = set(ids)
+        return Response({
+            "state": 1 if updated else 0,
+            "message": f"Статус изменен у перевалов: {len(updated)} из {len(requested)}",
+            "updated": updated,
+            "conflicts": sorted(requested - set(updated))
+        }, status=status.HTTP_200_OK if updated else status.HTTP_409_CONFLICT)